@@ -0,0 +1 @@
+"""AlphaCouncil 核心包：多智能体分析委员会的调度与数据服务 (不依赖 Streamlit)。"""
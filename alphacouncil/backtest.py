@@ -0,0 +1,110 @@
+"""决策回测：把决策库 (decisions.py) 里的全部决策一次性回放到本地日K上，按 智能体 / provider / model 汇总命中率、盈亏与回撤。
+
+全部向量化：所有标的的日K按日期对齐成矩阵，每条决策按 (下一交易日, 标的列) 定位，
+用滑动窗口视图一次取出持有期内的 开 / 高 / 低 / 收，不逐行循环。
+
+规则 (持有期 horizon 个交易日，决策后的下一交易日开盘入场)：
+- 买入：盘中最低触及止损即按止损离场 (跳空低开按开盘价)，同日先看止损；最高触及卖出区间下沿即止盈 (跳空高开按开盘价)；否则持有期末收盘离场。
+- 卖出：按持有期末收盘计算回避的跌幅 (收益 = 入场价 / 期末价 - 1 的反向)。
+- 观望：不计盈亏；持有期内涨跌幅在 ±HOLD_BAND 以内算命中。
+盈亏按建议仓位加权 (未给仓位按满仓)，回撤为按决策时间累加加权收益后的最大回落。
+只用已存的日K (不联网，refresh=True 时先增量更新)；分时数据不落盘，无法回放盘中细节。
+"""
+import numpy as np
+
+from .decisions import ACTIONS, get_decision_store
+from .kline_store import align_bars, get_kline_store, to_secid
+
+DEFAULT_HORIZON = 10  # 交易日
+HOLD_BAND = 0.02
+GROUP_KEYS = ("agent", "provider", "model")
+
+
+def _load_bars(symbols, refresh=False):
+    """本地日K (读入内存，回测期间其他会话仍可更新文件)；refresh 时先增量更新，取不到的为 None"""
+    from .data import DataError
+    store = get_kline_store()
+    bars = []
+    for symbol in symbols:
+        secid = to_secid(symbol)
+        if refresh:
+            try:
+                bars.append(store.update(secid))
+                continue
+            except DataError: pass
+        bars.append(store.load(secid))
+    return bars
+
+
+def simulate(decisions, dates, panel, columns, horizon=DEFAULT_HORIZON):
+    """decisions: DataFrame (symbol, trade_date, price, action, stop, sell_lo, position_pct)
+    dates / panel: align_bars 的结果 (open / high / low / close)，columns: {symbol: 列号}
+
+    → 每条决策加 entry / exit / exit_reason / ret / pnl / hit 列；持有期未走完或缺行情的决策丢弃
+    """
+    df = decisions.reset_index(drop=True)
+    col = df["symbol"].map(columns).fillna(-1).to_numpy(dtype=np.int64)
+    # 入场为决策日之后的第一根K线 (盘后决策同样次日入场)
+    row = np.searchsorted(dates, df["trade_date"].to_numpy(dtype="datetime64[D]"), side="right")
+    ok = (col >= 0) & (row + horizon <= len(dates))
+    df, col, row = df[ok].reset_index(drop=True), col[ok], row[ok]
+    if df.empty or horizon < 1: return df.assign(entry=[], exit=[], exit_reason=[], ret=[], pnl=[], hit=[])
+
+    # [决策, 持有期内第 k 天]
+    win = {f: np.lib.stride_tricks.sliding_window_view(panel[f], horizon, axis=0)[row, col] for f in ("open", "high", "low", "close")}
+    entry = win["open"][:, 0]
+    # 入场后停牌 (缺K线) 的决策丢弃
+    full = ~np.isnan(win["close"]).any(axis=1) & (entry > 0)
+    df, win, entry = df[full].reset_index(drop=True), {f: w[full] for f, w in win.items()}, entry[full]
+    n, idx = len(df), np.arange(full.sum())
+
+    direction = df["action"].map(ACTIONS).fillna(0).to_numpy()
+    stop = df["stop"].to_numpy(dtype=np.float64)
+    target = df["sell_lo"].to_numpy(dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        stop = np.where(stop < entry, stop, np.nan)  # 止损高于入场价视为无效
+        target = np.where(target > entry, target, np.nan)
+        stop_hit = win["low"] <= stop[:, None]
+        target_hit = win["high"] >= target[:, None]
+    first = lambda hit: np.where(hit.any(axis=1), hit.argmax(axis=1), horizon)
+    first_stop, first_target = first(stop_hit), first(target_hit)
+    day_open = lambda k: win["open"][idx, np.minimum(k, horizon - 1)]
+
+    close = win["close"][:, -1]
+    exit_price, reason = close.copy(), np.full(n, "horizon", dtype=object)
+    long = direction > 0
+    by_target = long & (first_target < first_stop)
+    by_stop = long & (first_stop < horizon) & (first_stop <= first_target)
+    exit_price[by_target] = np.maximum(target, day_open(first_target))[by_target]
+    exit_price[by_stop] = np.minimum(stop, day_open(first_stop))[by_stop]
+    reason[by_target], reason[by_stop] = "target", "stop"
+
+    move = close / entry - 1
+    ret = np.where(long, exit_price / entry - 1, np.where(direction < 0, -move, 0.0))
+    weight = np.where(long, np.nan_to_num(df["position_pct"].to_numpy(dtype=np.float64), nan=100.0) / 100, np.where(direction < 0, 1.0, 0.0))
+    hit = np.where(direction != 0, ret > 0, np.abs(move) < HOLD_BAND)
+    return df.assign(entry=entry, exit=np.where(direction < 0, close, exit_price), exit_reason=reason, ret=ret, pnl=ret * weight, hit=hit)
+
+
+def summarize(trades):
+    """按 智能体 / provider / model 汇总：决策数、命中率、平均收益、累计加权盈亏、最大回撤、止损 / 止盈比例"""
+    import pandas as pd
+    if trades.empty: return pd.DataFrame(columns=[*GROUP_KEYS, "n", "hit_rate", "avg_ret", "pnl", "max_drawdown", "stop_rate", "target_rate"])
+    t = trades.sort_values("decided_at").fillna({k: "-" for k in GROUP_KEYS})
+    keys = list(GROUP_KEYS)
+    t["equity"] = t.groupby(keys)["pnl"].cumsum()
+    # 回撤从 0 起算：首笔即亏损也计入
+    t["drawdown"] = t["equity"] - t.groupby(keys)["equity"].cummax().clip(lower=0)
+    t["is_stop"], t["is_target"] = t["exit_reason"] == "stop", t["exit_reason"] == "target"
+    out = t.groupby(keys).agg(n=("ret", "size"), hit_rate=("hit", "mean"), avg_ret=("ret", "mean"), pnl=("pnl", "sum"),
+                              max_drawdown=("drawdown", "min"), stop_rate=("is_stop", "mean"), target_rate=("is_target", "mean"))
+    return out.reset_index().sort_values(["agent", "pnl"], ascending=[True, False], ignore_index=True)
+
+
+def run_backtest(horizon=DEFAULT_HORIZON, since=None, agents=None, refresh=False, decisions=None):
+    """读取决策库 → (逐笔结果 DataFrame, 汇总 DataFrame)；decisions 可直接传入 DataFrame (跳过决策库)"""
+    df = get_decision_store().frame(since, agents) if decisions is None else decisions
+    symbols = sorted(df["symbol"].unique()) if len(df) else []
+    dates, panel = align_bars(_load_bars(symbols, refresh), ("open", "high", "low", "close"))
+    trades = simulate(df, dates, panel, {s: i for i, s in enumerate(symbols)}, horizon)
+    return trades, summarize(trades)
@@ -0,0 +1,163 @@
+"""行情图构建 (模仿同花顺深色风格)：配色与坐标范围全部向量化，长序列先降采样再画。
+
+分时线用 WebGL (Scattergl) + LTTB 降采样；K线按桶聚合 OHLC (蜡烛图没有 WebGL 版本)。
+构建好的图按 (类型, 标的, 数据版本) 缓存，数据不变时直接复用。
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+UP_COLOR, DOWN_COLOR = '#FF3B30', '#00F0F0'  # 红涨绿跌
+MAX_LINE_POINTS = 1000
+MAX_CANDLES = 500
+FIGURE_CACHE_SIZE = 64
+
+CHART_LAYOUT = dict(
+    plot_bgcolor='#111111', paper_bgcolor='rgba(0,0,0,0)',
+    font=dict(color='#94A3B8'),
+    xaxis=dict(showgrid=True, gridcolor='#333333', zeroline=False),
+    yaxis=dict(showgrid=True, gridcolor='#333333', zeroline=False),
+    margin=dict(l=0, r=0, t=10, b=0),
+    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+)
+
+
+def lttb(y, n_out):
+    """Largest-Triangle-Three-Buckets 降采样，返回保留点的下标 (保留首尾与形状拐点)"""
+    n = len(y)
+    if n_out >= n or n_out < 3: return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    x = np.arange(n, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # 中间 n_out-2 个桶的边界
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # 下一个桶的均值点作为三角形第三个顶点
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def bucket_edges(n, n_out):
+    """把 n 个点均分成最多 n_out 个连续桶，返回各桶起点"""
+    return np.unique(np.linspace(0, n, min(n, n_out), endpoint=False).astype(np.int64))
+
+
+def aggregate_ohlc(open_, high, low, close, volume, n_out):
+    """按桶聚合 K线：开取首、收取尾、高取最大、低取最小、量求和；返回 (桶起点下标, o, h, l, c, v)"""
+    starts = bucket_edges(len(close), n_out)
+    ends = np.append(starts[1:], len(close)) - 1
+    return (starts, np.asarray(open_)[starts], np.maximum.reduceat(high, starts), np.minimum.reduceat(low, starts),
+            np.asarray(close)[ends], np.add.reduceat(volume, starts))
+
+
+def minute_figure(times, price, volume, yestend, max_points=MAX_LINE_POINTS):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    times, price, volume = np.asarray(times), np.asarray(price, dtype=np.float64), np.asarray(volume, dtype=np.float64)
+    max_diff = max(abs(price.max() - yestend), abs(price.min() - yestend))
+    if max_diff == 0: max_diff = yestend * 0.01
+    y_range = [yestend - max_diff * 1.1, yestend + max_diff * 1.1]
+    # 量柱颜色：与上一分钟比较，第一分钟与昨收比较
+    colors = np.where(price >= np.concatenate([[yestend], price[:-1]]), UP_COLOR, DOWN_COLOR)
+    if len(price) > max_points:
+        keep = lttb(price, max_points)
+        line_x, line_y = times[keep], price[keep]
+        starts = bucket_edges(len(price), max_points)
+        times, volume, colors = times[starts], np.add.reduceat(volume, starts), colors[starts]
+    else:
+        line_x, line_y = times, price
+
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.03, row_heights=[0.7, 0.3])
+    # 分时线 (亮黄色)
+    fig.add_trace(go.Scattergl(x=line_x, y=line_y, mode='lines', name='价格', line=dict(color='#FFFF00', width=1.5), fill='tozeroy', fillcolor='rgba(255, 255, 0, 0.1)'), row=1, col=1)
+    fig.add_hline(y=yestend, line_dash="dash", line_color=UP_COLOR, line_width=1, row=1, col=1)
+    fig.add_trace(go.Bar(x=times, y=volume, name='成交量', marker_color=colors), row=2, col=1)
+
+    fig.update_layout(height=420, **CHART_LAYOUT)
+    fig.update_yaxes(range=y_range, tickformat=".2f", row=1, col=1)
+    fig.update_yaxes(showticklabels=False, row=2, col=1)
+    fig.update_xaxes(showticklabels=False, row=1, col=1)
+    return fig
+
+
+def kline_figure(dates, open_, high, low, close, volume, max_candles=MAX_CANDLES):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    dates = np.asarray(dates)
+    open_, high, low, close, volume = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close, volume))
+    if len(close) > max_candles:
+        starts, open_, high, low, close, volume = aggregate_ohlc(open_, high, low, close, volume, max_candles)
+        dates = dates[starts]
+    colors = np.where(close >= open_, UP_COLOR, DOWN_COLOR)
+    pad = (high.max() - low.min()) * 0.05 if len(close) else 0
+
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.03, row_heights=[0.7, 0.3])
+    fig.add_trace(go.Candlestick(
+        x=dates, open=open_, high=high, low=low, close=close,
+        increasing_line_color=UP_COLOR, decreasing_line_color=DOWN_COLOR,
+        increasing_fillcolor=UP_COLOR, decreasing_fillcolor=DOWN_COLOR
+    ), row=1, col=1)
+    fig.add_trace(go.Bar(x=dates, y=volume, marker_color=colors), row=2, col=1)
+
+    fig.update_layout(height=420, xaxis_rangeslider_visible=False, showlegend=False, **CHART_LAYOUT)
+    if len(close): fig.update_yaxes(range=[low.min() - pad, high.max() + pad], row=1, col=1)
+    fig.update_xaxes(showticklabels=False, row=1, col=1)
+    fig.update_yaxes(showticklabels=False, row=2, col=1)
+    return fig
+
+
+def data_version(*arrays):
+    """数据版本：长度 + 末值，增量追加或尾部更新都会改变"""
+    return tuple((len(a), str(a[-1]) if len(a) else None) for a in arrays)
+
+
+_figures = OrderedDict()
+_figures_lock = threading.Lock()
+
+
+def cached_figure(key, build):
+    """按 key 复用已构建的图 (LRU)；key 中应包含数据版本"""
+    with _figures_lock:
+        if key in _figures:
+            _figures.move_to_end(key)
+            return _figures[key]
+    fig = build()
+    with _figures_lock:
+        _figures[key] = fig
+        while len(_figures) > FIGURE_CACHE_SIZE: _figures.popitem(last=False)
+    return fig
+
+
+SPAN_COLORS = {"fetch": "#38BDF8", "agent": "#A78BFA", "llm": "#FACC15", "error": "#FF3B30", "cancelled": "#475569"}
+
+
+def waterfall_figure(spans, labels=None):
+    """一次运行的时间线：每个 span 一根横条 (起点 start_ms，长度 ms)；labels 把 span 名映射为显示名"""
+    import plotly.graph_objects as go
+    labels = labels or {}
+    spans = sorted(spans, key=lambda s: (s["start_ms"], s["kind"] != "agent"))
+    def label(s):
+        if s["kind"] == "llm":
+            return f"  └ {s['name']} 调用" + (" (对冲)" if s.get("hedge") else f" (第 {s['attempt'] + 1} 次)" if s.get("attempt") else "")
+        return f"{labels.get(s['name'], s['name'])} · {s['kind']}"
+
+    colors = [SPAN_COLORS.get(s["status"]) or SPAN_COLORS.get(s["kind"], "#94A3B8") for s in spans]
+    hover = [f"{s['ms']:.0f} ms" + (f" · 首字 {s['ttft_ms']:.0f} ms" if s.get("ttft_ms") else "")
+             + (f" · 输入 {s['tokens_in']} / 输出 {s['tokens_out']} tokens" if s.get("tokens_out") else "")
+             + (f" · 提示词约 {s['prompt_tokens']} tokens" + (f" (压缩前 {s['prompt_tokens_raw']})" if s.get("prompt_tokens_raw", 0) > s["prompt_tokens"] else "")
+                if s.get("prompt_tokens") else "")
+             + (" · 缓存" if s.get("cached") or s.get("cache") == "hit" else "") for s in spans]
+    # 纵轴用序号 (同名 span 各占一行)，刻度文字再换成标签
+    rows = list(range(len(spans)))
+    fig = go.Figure(go.Bar(y=rows, x=[s["ms"] for s in spans], base=[s["start_ms"] for s in spans], orientation="h",
+                           marker_color=colors, hovertext=hover, hoverinfo="text"))
+    layout = dict(CHART_LAYOUT, yaxis=dict(autorange="reversed", showgrid=False, tickmode="array", tickvals=rows, ticktext=[label(s) for s in spans]))
+    fig.update_layout(height=max(240, 22 * len(spans)), showlegend=False, xaxis_title="ms", **layout)
+    return fig
@@ -0,0 +1,223 @@
+"""命令行批量分析：对自选股列表或指数成分股逐个运行完整的分析委员会，结果写入 JSONL (可选 Parquet)。
+
+    python -m alphacouncil --index csi300 --out runs/csi300.jsonl --jobs 4
+    python -m alphacouncil --file watchlist.txt --out runs/watch.jsonl --parquet runs/watch.parquet
+    python -m alphacouncil --market-view          # 盘前预先生成本时段的宏观 / 行业观点 (可放入定时任务)
+    python -m alphacouncil --portfolio book.csv   # 只刷新组合并打印盈亏与风险摘要；配合 --symbols 等则把组合摘要带入分析
+    python -m alphacouncil --screen --top 10 --rules ma_bull,rsi_ok --out runs/screen.jsonl   # 全市场初筛，只分析前 10 只
+    python -m alphacouncil --backtest --horizon 10   # 回放决策库中的全部决策，按智能体 / provider / model 汇总
+
+API Key 读取环境变量 GEMINI_API_KEY / DEEPSEEK_API_KEY / QWEN_API_KEY (与 Streamlit Secrets 同名)。
+同一输出文件重复运行时跳过已成功的标的，只重跑失败或未完成的 (断点续跑)。
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+from .committee import MODES, analyze_symbol, refresh_market_view
+from .data import DataError, get_index_constituents
+from .screener import RULES
+
+MODE_ALIASES = {"mixed": MODES[0], "deepseek": MODES[1]}
+
+
+def load_symbols(args, screened=()):
+    symbols = list(screened)
+    if args.symbols: symbols += [s.strip() for s in args.symbols.split(",") if s.strip()]
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            # 每行一个代码，可带名称 (以空白或逗号分隔)；# 开头为注释
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line: symbols.append(line.replace(",", " ").split()[0])
+    if args.index: symbols += [code for code, _ in get_index_constituents(args.index)]
+    return list(dict.fromkeys(symbols))
+
+
+def load_done(path):
+    """已成功完成的输入代码集合 (断点续跑)"""
+    done = set()
+    if not os.path.exists(path): return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try: record = json.loads(line)
+            except ValueError: continue  # 上次中断时可能写了半行
+            if record.get("status") == "ok": done.add(record["input"])
+    return done
+
+
+def run_one(keyword, api_keys, args, portfolio=None):
+    started = time.time()
+    record = {"input": keyword, "started_at": datetime.now().isoformat(timespec="seconds")}
+    try:
+        result = analyze_symbol(keyword, api_keys, MODE_ALIASES[args.mode], args.gemini_model, force_refresh=args.force_refresh, portfolio=portfolio)
+        quote = result.pop("quote")
+        result["quote"] = {k: quote[k] for k in ("now", "yestend", "open", "high", "low", "volume", "amount")}
+        failed = [k for k, r in result["agents"].items() if r.get("error")]
+        record.update(result, status="error" if failed else "ok", failed_agents=failed)
+    except (DataError, LookupError) as e:
+        record.update(status="error", error=str(e))
+    except Exception as e:  # 单只标的的意外错误 (如决策库 / 历史库写入失败) 不中断整批
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    record["elapsed_s"] = round(time.time() - started, 2)
+    return record
+
+
+def run_market_view(api_keys, args):
+    try:
+        results = refresh_market_view(api_keys, MODE_ALIASES[args.mode], args.gemini_model)
+    except DataError as e:
+        print(f"指数 / 板块数据获取失败: {e}", file=sys.stderr)
+        return 2
+    for key, r in results.items():
+        state = "失败" if r.get("error") else "复用" if r.get("cached") else "生成"
+        print(f"[{r.get('slot', '-')}] {key} ({r['provider']}) {state}\n{r['text']}\n")
+    return 1 if any(r.get("error") for r in results.values()) else 0
+
+
+def run_screen(args):
+    """全市场初筛并打印候选；失败返回 None"""
+    from .screener import screen, screen_text
+    rules = [r.strip() for r in (args.rules or "").split(",") if r.strip()]
+    try:
+        result = screen(args.top, args.min_amount * 1e8, rules=rules, exclude_st=not args.include_st)
+    except (DataError, ValueError) as e:
+        print(f"全市场初筛失败: {e}", file=sys.stderr)
+        return None
+    print(screen_text(result), file=sys.stderr)
+    return result
+
+
+def run_decision_backtest(args):
+    from .backtest import run_backtest
+    trades, summary = run_backtest(args.horizon, since=args.since, refresh=args.refresh_bars)
+    if trades.empty:
+        print("没有可回放的决策 (决策库为空，或持有期尚未走完 / 本地无K线，可加 --refresh-bars)", file=sys.stderr)
+        return 2
+    import pandas as pd
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:.4f}".format):
+        print(summary.to_string(index=False))
+    print(f"共 {len(trades)} 条决策，持有期 {args.horizon} 个交易日", file=sys.stderr)
+    return 0
+
+
+def write_parquet(jsonl_path, parquet_path):
+    """把 JSONL 中成功的记录展开为一行一个标的 (每位智能体一列) 写入 Parquet"""
+    import pandas as pd
+    rows = []
+    with open(jsonl_path, encoding="utf-8") as f:
+        for line in f:
+            try: record = json.loads(line)
+            except ValueError: continue
+            if record.get("status") != "ok": continue
+            row = {"symbol": record["symbol"], "name": record["name"], "started_at": record["started_at"],
+                   "change_pct": record["change_pct"], "elapsed_s": record["elapsed_s"], **record["quote"],
+                   "tokens_in": record.get("telemetry", {}).get("tokens_in"), "tokens_out": record.get("telemetry", {}).get("tokens_out")}
+            for key, agent in record["agents"].items():
+                row[key] = agent["text"]
+                row[f"{key}_provider"] = agent["provider"]
+            rows.append(row)
+    # 同一标的重复运行时保留最后一次
+    df = pd.DataFrame(rows).drop_duplicates("symbol", keep="last") if rows else pd.DataFrame()
+    df.to_parquet(parquet_path, index=False)
+    return len(df)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m alphacouncil", description="无界面批量运行股票多智能体分析委员会")
+    src = parser.add_argument_group("标的来源 (可组合)")
+    src.add_argument("--symbols", help="逗号分隔的代码/名称，如 600276,000001")
+    src.add_argument("--file", help="自选股文件，每行一个代码")
+    src.add_argument("--index", help="指数成分股：csi300 / sse50 / csi500")
+    src.add_argument("--screen", action="store_true", help="全市场初筛，取得分最高的 --top 只")
+    sc = parser.add_argument_group("全市场初筛")
+    sc.add_argument("--top", type=int, default=10, help="送入委员会的候选数 (默认 10)")
+    sc.add_argument("--min-amount", type=float, default=1.0, help="最低成交额 (亿元，默认 1)")
+    sc.add_argument("--rules", help="技术条件，逗号分隔：" + ",".join(RULES))
+    sc.add_argument("--include-st", action="store_true", help="不排除 ST 股")
+    parser.add_argument("--out", help="结果 JSONL 路径 (追加写入，支持断点续跑)")
+    parser.add_argument("--market-view", action="store_true", help="只运行市场层智能体 (宏观 / 行业)，生成当前时段的共享观点")
+    parser.add_argument("--portfolio", help="组合持仓 CSV (代码,成本,数量)")
+    bt = parser.add_argument_group("决策回测")
+    bt.add_argument("--backtest", action="store_true", help="回放决策库中的决策，输出各智能体 / provider / model 的命中率、盈亏与回撤")
+    bt.add_argument("--horizon", type=int, default=10, help="持有期 (交易日，默认 10)")
+    bt.add_argument("--since", help="只回放该日期 (YYYY-MM-DD) 之后的决策")
+    bt.add_argument("--refresh-bars", action="store_true", help="回测前先联网增量更新日K")
+    parser.add_argument("--parquet", help="结束后额外导出 Parquet")
+    parser.add_argument("--jobs", type=int, default=4, help="同时分析的标的数 (默认 4)")
+    parser.add_argument("--mode", choices=sorted(MODE_ALIASES), default="mixed", help="mixed=混合模式，deepseek=全 DeepSeek")
+    parser.add_argument("--gemini-model", default="gemini-2.5-flash")
+    parser.add_argument("--force-refresh", action="store_true", help="忽略响应缓存")
+    parser.add_argument("--no-resume", action="store_true", help="不跳过已成功的标的")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    api_keys = {"gemini": os.environ.get("GEMINI_API_KEY", ""), "deepseek": os.environ.get("DEEPSEEK_API_KEY", ""),
+                "qwen": os.environ.get("QWEN_API_KEY", "")}
+    if args.market_view: return run_market_view(api_keys, args)
+    if args.backtest: return run_decision_backtest(args)
+    portfolio = None
+    if args.portfolio:
+        from .portfolio import build_portfolio, load_holdings, portfolio_text
+        try:
+            portfolio = build_portfolio(load_holdings(args.portfolio))
+        except (DataError, ValueError, OSError) as e:
+            print(f"读取组合失败: {e}", file=sys.stderr)
+            return 2
+        print(portfolio_text(portfolio) + f"\n(刷新耗时 {portfolio['elapsed_ms']:.0f} ms)", file=sys.stderr)
+        if not (args.symbols or args.file or args.index or args.screen): return 0
+    screened = []
+    if args.screen:
+        result = run_screen(args)
+        if result is None: return 2
+        if not args.out: return 0
+        screened = result["candidates"]["symbol"].tolist()
+    if not args.out: parser.error("需要 --out (或使用 --market-view / --portfolio / --backtest / --screen)")
+    try:
+        symbols = load_symbols(args, screened)
+    except (DataError, ValueError, OSError) as e:
+        print(f"读取标的列表失败: {e}", file=sys.stderr)
+        return 2
+    if not symbols:
+        print("没有要分析的标的 (使用 --symbols / --file / --index / --screen)", file=sys.stderr)
+        return 2
+
+    done = set() if args.no_resume else load_done(args.out)
+    todo = [s for s in symbols if s not in done]
+    print(f"共 {len(symbols)} 个标的，已完成 {len(symbols) - len(todo)}，本次分析 {len(todo)}，并发 {args.jobs}", file=sys.stderr)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    write_lock = threading.Lock()
+    failures = 0
+    with open(args.out, "a", encoding="utf-8") as out, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.jobs), thread_name_prefix="symbol") as pool:
+        futures = {pool.submit(run_one, s, api_keys, args, portfolio): s for s in todo}
+        for i, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            record = future.result()
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+            failures += record["status"] != "ok"
+            detail = record.get("error") or ",".join(record.get("failed_agents", [])) or "ok"
+            print(f"[{i}/{len(todo)}] {record['input']} {record.get('name', '')} {record['status']} ({record['elapsed_s']}s) {detail}", file=sys.stderr)
+
+    # 运行历史与响应缓存由后台线程写入，退出前等它写完
+    from .history import get_history
+    from .llm_cache import get_response_cache
+    get_history().flush()
+    get_response_cache().flush()
+    if args.parquet:
+        try:
+            n = write_parquet(args.out, args.parquet)
+            print(f"已导出 {n} 条到 {args.parquet}", file=sys.stderr)
+        except ImportError as e:
+            print(f"导出 Parquet 需要 pyarrow: {e}", file=sys.stderr)
+    return 1 if failures else 0
@@ -0,0 +1,337 @@
+"""分析委员会：智能体配置、提示词拼装与整条分析流水线 (行情获取 → 上下文 → 按依赖图运行 10 位智能体)。
+
+不依赖 Streamlit，Web 界面 (main.py) 与命令行批量分析 (cli.py) 共用。
+"""
+import functools
+import logging
+import re
+
+from .compaction import COMPACT_ENABLED, PROMPT_TOKEN_BUDGET, compact_reports, estimate_tokens
+from .data import DataError, fetch_market_bundle, search_stock_realtime
+from .decisions import record_decisions
+from .history import save_run
+from .engine import HEDGE_ENABLED, call_agent, run_committee
+from .llm import LLMError, default_model
+from .market_view import MARKET_VIEW_ENABLED, get_market_view
+from .schemas import STRUCTURED_ENABLED, canonical, from_canonical, is_structured, json_schema, preview, structured_prompt
+from .symbols import get_symbol_index
+from .telemetry import Trace, use_trace
+
+log = logging.getLogger(__name__)
+
+MODES = ["混合模式 (推荐)", "全 DeepSeek"]
+# 备选链：主 provider 出错或缺 Key 时依次切换，"Provider" 或 "Provider:模型名" (省略模型用默认)
+DEFAULT_FALLBACK = ["DeepSeek", "Qwen", "Gemini"]
+
+# deps: 该智能体需要哪些智能体的输出 (依赖完成即启动，无阶段屏障)
+# fallback: 覆盖 DEFAULT_FALLBACK；hedge: False 时该智能体不做对冲请求 (默认开启，见 engine.race_chain)
+# scope: "market" 表示与个股无关的市场层智能体，每个时段只运行一次、所有标的共享 (见 market_view.py)
+# input: 用户任务模板，{market} 为行情上下文 (压缩模式下有依赖的智能体拿到一行简报)，{indicators} 为技术指标摘要，{reports} 为依赖智能体的报告，
+#        {overview} 为指数与板块概览 (市场层不可用时退回个股行情)，{portfolio} 为组合摘要 (组合模式，见 portfolio.py)
+AGENTS_CONFIG = {
+    "macro_analyst": {
+        "name": "宏观政策分析师", 
+        "role": "Macro Analyst",
+        "avatar": "https://randomuser.me/api/portraits/men/32.jpg",
+        "provider": "Gemini", 
+        "scope": "market",
+        "input": "{overview}",
+        "prompt": "你是资深A股宏观政策分析师。输出风格：客观、前瞻。\n任务：结合主要指数与两市成交判断当前A股宏观水位。\n输出Markdown列表(200字内)：\n- **宏观评级**：[宽松/中性/紧缩]\n- **核心结论**：(一句话狠话)\n- **政策风口**：(简述)"
+    },
+    "industry_expert": {
+        "name": "行业轮动专家", 
+        "role": "Industry Expert",
+        "avatar": "https://randomuser.me/api/portraits/women/44.jpg",
+        "provider": "Gemini",
+        "scope": "market",
+        "input": "{overview}",
+        "prompt": "你是A股行业轮动专家。输出风格：突出资金偏好。\n任务：结合行业板块涨跌与主力资金分析当前最强主线。\n输出Markdown列表(150字内)：\n- **最强主线**：(前三名)\n- **轮动预判**：(资金下一步去哪)"
+    },
+    "funds_analyst": {
+        "name": "资金流向分析师", 
+        "role": "Funds Analyst",
+        "avatar": "https://randomuser.me/api/portraits/men/85.jpg",
+        "provider": "Gemini",
+        "prompt": "你是资金流向专家。输出风格：看穿对手盘。\n任务：分析五档盘口挂单，判断主力意图。\n输出Markdown列表(200字内)：\n- **资金意图**：[吸筹/洗盘/出货/观望]\n- **盘口密码**：(重点解读买一卖一及下方五档托压单)\n- **短线合力**：[强/弱]"
+    },
+    "technical_analyst": {
+        "name": "技术分析专家", 
+        "role": "Technical Analyst",
+        "avatar": "https://randomuser.me/api/portraits/men/22.jpg",
+        "provider": "DeepSeek",
+        "input": "{market}\n{indicators}",
+        "prompt": "你是机构技术分析专家。输出风格：点位优先。\n任务：基于现价/五档盘口与技术指标(均线/MACD/RSI/BOLL/KDJ/ATR)，判断趋势。\n输出Markdown列表(200字内)：\n- **技术形态**：[多头/空头/震荡]\n- **买卖区间**：买入[价格]/卖出[价格]/止损[价格]\n- **胜率预估**：[数字]%"
+    },
+    "fundamental_analyst": {
+        "name": "基本面估值分析师", 
+        "role": "Value Analyst",
+        "avatar": "https://randomuser.me/api/portraits/women/68.jpg",
+        "provider": "DeepSeek",
+        "prompt": "你是价值投资专家。\n任务：判断估值水位。\n输出Markdown列表(150字内)：\n- **估值水位**：[低估/合理/泡沫]\n- **核心逻辑**：(一句话)"
+    },
+    "manager_fundamental": {
+        "name": "基本面研究总监", 
+        "role": "Research Director",
+        "avatar": "https://randomuser.me/api/portraits/men/50.jpg",
+        "provider": "DeepSeek",
+        "deps": ["macro_analyst", "industry_expert", "fundamental_analyst"],
+        "input": "行情:{market}\n报告:{reports}",
+        "prompt": "你是基本面总监。任务：整合报告，做出裁决。\n输出Markdown列表(200字内)：\n- **基本面总评**：[S/A/B/C/D]级\n- **核心矛盾**：(最大利好或利空)\n- **中期趋势**：[看涨/看平/看跌]"
+    },
+    "manager_momentum": {
+        "name": "市场动能总监", 
+        "role": "Momentum Director",
+        "avatar": "https://randomuser.me/api/portraits/men/46.jpg",
+        "provider": "DeepSeek",
+        "deps": ["technical_analyst", "funds_analyst"],
+        "input": "行情:{market}\n{indicators}\n报告:{reports}",
+        "prompt": "你是动能总监。任务：整合技术和资金面。\n输出Markdown列表(200字内)：\n- **动能状态**：[爆发/跟随/衰竭/死水]\n- **爆发概率**：[数字]%\n- **关键信号**：(最缺什么或最强什么)"
+    },
+    "risk_system": {
+        "name": "系统性风险总监", 
+        "role": "Risk Director",
+        "avatar": "https://randomuser.me/api/portraits/men/90.jpg",
+        "provider": "Qwen", 
+        "deps": ["macro_analyst", "industry_expert", "manager_fundamental"],
+        "input": "市场:{reports}",
+        "prompt": "你是系统风险总监。风格：偏执理性。\n任务：找出所有可能崩盘的原因。\n输出Markdown列表(200字内)：\n- **崩盘风险**：[低/中/高]\n- **最大回撤预警**：(最坏情况)"
+    },
+    "risk_portfolio": {
+        "name": "组合风险总监", 
+        "role": "Portfolio Risk",
+        "avatar": "https://randomuser.me/api/portraits/women/33.jpg",
+        "provider": "DeepSeek",
+        "deps": ["technical_analyst", "funds_analyst", "manager_momentum"],
+        "input": "市场:{reports}\n{portfolio}",
+        "prompt": "你是风控精算师。\n任务：给出具体风控指标 (提供组合信息时，结合该标的在组合中的权重、相关性与组合整体风险)。\n输出Markdown列表(200字内)：\n- **建议仓位**：[数字]%\n- **止损间距**：[数字]%\n- **流动性预警**：(成交量建议)"
+    },
+    "general_manager": {
+        "name": "投资决策总经理 (GM)", 
+        "role": "General Manager",
+        "avatar": "https://randomuser.me/api/portraits/men/1.jpg",
+        "provider": "DeepSeek",
+        "fallback": ["Qwen:qwen-max", "Gemini"],
+        "deps": ["macro_analyst", "industry_expert", "funds_analyst", "technical_analyst", "fundamental_analyst",
+                 "manager_fundamental", "manager_momentum", "risk_system", "risk_portfolio"],
+        "input": "所有报告:\n{reports}\n{portfolio}",
+        "prompt": """你是拥有唯一决策权的GM。风格：狼性、激进但克制。
+综合前9位专家报告。
+
+**核心任务：** 根据用户的【持仓成本】和【当前浮动盈亏】，给出具体的操作建议。
+- 如果用户亏损：分析是否应该补仓摊低成本（T+0），还是割肉止损？
+- 如果用户盈利：分析是否应该止盈离场，还是继续持有？
+
+【输出结构】
+### 📊 多空一致性
+(强多/偏多/中性/偏空/强空)
+### 💡 持仓操作建议 (必填)
+(针对用户的持仓成本，给出如“在61.0附近补仓做T”、“现价止盈”等具体建议)
+### 🧭 最终指令
+【🟢 买入 / 🟡 观望 / 🔴 卖出】
+### 📌 建议仓位
+【0-100%】
+### 📈 实战点位
+- **买入区间：** [价格]
+- **卖出区间：** [价格]
+### 🛑 止损红线
+- **价格：** [单一数字]
+"""
+    }
+}
+
+def resolve_provider(agent_key, mode):
+    """混合模式使用配置的模型，否则全部走 DeepSeek"""
+    return AGENTS_CONFIG[agent_key]["provider"] if "混合" in mode else "DeepSeek"
+
+def resolve_fallbacks(agent_key, mode):
+    """主 provider 之外的备选 [(provider, model 或 None), ...]；全 DeepSeek 模式只保留 DeepSeek 的其他模型 (不把提示词发给别家)"""
+    primary = resolve_provider(agent_key, mode)
+    entries = [e.partition(":") for e in AGENTS_CONFIG[agent_key].get("fallback", DEFAULT_FALLBACK)]
+    if "混合" not in mode: entries = [e for e in entries if e[0] == primary]
+    return [(p, m or None) for p, _, m in entries if p != primary or m]
+
+def build_agent_input(agent_key, context, dep_results, compact=COMPACT_ENABLED, budget=PROMPT_TOKEN_BUDGET):
+    """按模板拼装用户任务；依赖报告按配置顺序排列，失败的报告不拼入提示词，只注明缺失。
+
+    compact 时依赖报告压成所需字段 (见 compaction.py)，行情上下文换成简报。
+    """
+    cfg = AGENTS_CONFIG[agent_key]
+    deps = cfg.get("deps", [])
+    ok = {k: dep_results[k]["text"] for k in deps if not dep_results[k].get("error")}
+    if compact and deps:
+        # 结构化输出的上游直接用类型化字段
+        ok = {k: dep_results[k].get("data") or text for k, text in ok.items()}
+        reports = compact_reports(agent_key, ok, {k: AGENTS_CONFIG[k]["name"] for k in ok}, budget)
+        context = dict(context, market=context["brief"])
+    else:
+        reports = "\n".join(f"{AGENTS_CONFIG[k]['name']}: {text}" for k, text in ok.items())
+    missing = [AGENTS_CONFIG[k]['name'] for k in deps if dep_results[k].get("error")]
+    if missing: reports += f"\n(以下报告缺失，请在其余信息基础上判断：{'、'.join(missing)})"
+    return cfg.get("input", "{market}").format(reports=reports, **context)
+
+
+def agent_graph():
+    return {k: cfg.get("deps", []) for k, cfg in AGENTS_CONFIG.items()}
+
+
+def resolve_symbol(keyword):
+    """输入 (代码 / 名称 / 拼音 / 带市场前缀代码) → (symbol, 名称)；未找到返回 (None, None)
+
+    优先查本地离线索引 (取排名第一的候选)，索引未就绪或无命中时回退到新浪联想接口。
+    """
+    keyword = keyword.strip()
+    index = get_symbol_index()
+    hits = index.search(keyword, 1) if index else []
+    if hits: return hits[0].symbol, hits[0].name
+    if re.match(r'^\d{6}$', keyword): return keyword, "查询中..."
+    try:
+        symbol, name = search_stock_realtime(keyword)
+    except DataError:
+        if not re.match(r'^[a-zA-Z]{2}\d{6}$', keyword): raise
+        symbol, name = None, None
+    if not symbol and re.match(r'^[a-zA-Z]{2}\d{6}$', keyword): return keyword, "直接代码"
+    return symbol, name
+
+
+def holding_text(quote, cost_price=0.0, hold_vol=0):
+    if cost_price > 0 and hold_vol > 0:
+        profit = (quote['now'] - cost_price) * hold_vol
+        profit_pct = (quote['now'] - cost_price) / cost_price * 100
+        return f"用户持仓: 成本 {cost_price}，股数 {hold_vol}，盈亏 {profit:.2f} ({profit_pct:.2f}%)"
+    return "用户无持仓。"
+
+
+def change_pct(quote):
+    return ((quote['now'] - quote['yestend']) / quote['yestend'] * 100) if quote['yestend'] else 0
+
+
+def build_market_context(symbol, quote, holding_info):
+    # --- 拼接完整的五档盘口数据 (Fix for Funds Analyst) ---
+    # 价格保留两位，数量为整数手
+    level = lambda side, i: f"{quote[f'{side}{i}_p']:.2f}({quote[f'{side}{i}_v']:.0f})"
+    bid_ask_str = (
+        " ".join(f"卖{i}:{level('sell', i)}" for i in range(5, 0, -1)) + "\n"
+        "----------------------\n"
+        + " ".join(f"买{i}:{level('buy', i)}" for i in range(1, 6))
+    )
+
+    return f"""
+        [标的] {quote['name']}({symbol})
+        [行情] 现价:{quote['now']} 涨跌:{change_pct(quote):.2f}%
+        [五档盘口]
+        {bid_ask_str}
+        [持仓] {holding_info}
+        """
+
+
+def build_market_brief(symbol, quote, holding_info):
+    """一行行情简报，供下游总监使用 (不含五档盘口)"""
+    return f"[标的] {quote['name']}({symbol}) 现价:{quote['now']} 涨跌:{change_pct(quote):.2f}% [持仓] {holding_info}"
+
+
+def build_agent_context(symbol, bundle, holding_info, portfolio=None):
+    """行情包 → 提示词模板变量 {market, brief, indicators, overview, portfolio}；portfolio 为 portfolio.build_portfolio 的结果"""
+    min_df = bundle["minute"]
+    # 技术指标 (基于已获取的日K与分时，纯本地计算)
+    indicator_text = "[技术指标] 暂无K线数据"
+    if bundle["bars"] is not None and len(bundle["bars"]) > 1:
+        from .indicators import indicator_summary  # numpy 按需导入
+        has_min = min_df is not None and not min_df.empty
+        indicator_text = indicator_summary(bundle["bars"], min_df["Price"].values if has_min else None, min_df["Vol"].values if has_min else None)
+    market = build_market_context(symbol, bundle["quote"], holding_info)
+    portfolio_info = ""
+    if portfolio:
+        from .portfolio import portfolio_text
+        portfolio_info = portfolio_text(portfolio, focus=symbol)
+    return {"market": market, "brief": build_market_brief(symbol, bundle["quote"], holding_info), "indicators": indicator_text,
+            "overview": market,  # 市场层共享结果可用时，overview 换成指数与板块概览
+            "portfolio": portfolio_info}
+
+
+def make_agent_runner(agent_context, api_keys, mode=MODES[0], gemini_model="gemini-2.5-flash", force_refresh=False, stream=False, trace=None,
+                      compact=COMPACT_ENABLED, market_view=MARKET_VIEW_ENABLED, hedge=HEDGE_ENABLED, structured=STRUCTURED_ENABLED):
+    """返回供 run_committee 调度的协程 run_agent(agent_key, dep_results, emit)；失败以 error 字段返回，不抛出。
+
+    传入 trace (telemetry.Trace) 时，各智能体与模型调用的耗时 / token 记入该 Trace，
+    其中 prompt_tokens 为本次提示词的估算 token，prompt_tokens_raw 为不压缩时的估算 (用于对比)。
+    market_view 时 scope=market 的智能体取当前时段的共享结果 (见 market_view.py)，指数 / 板块数据取不到时退回按个股行情运行。
+    每个智能体按 resolve_fallbacks 的备选链失败切换，hedge 时慢调用并发请求备选；结果中的 provider 为实际作答的一方。
+    structured 时以 JSON 模式作答并校验 (见 schemas.py)，结果另带类型化字段 data，text 为由其渲染的 Markdown。
+    """
+    async def run_agent(agent_key, dep_results, emit):
+        cfg = AGENTS_CONFIG[agent_key]
+        target_provider = resolve_provider(agent_key, mode)
+
+        typed = structured and is_structured(agent_key)
+        system_prompt = structured_prompt(agent_key, cfg["prompt"]) if typed else cfg["prompt"]
+        # 结构化输出流式时，卡片上逐字段显示已完整输出的部分
+        on_delta = (lambda partial: emit(preview(agent_key, partial))) if typed else emit
+
+        async def ask(context):
+            prompt = build_agent_input(agent_key, context, dep_results, compact)
+            raw = build_agent_input(agent_key, context, dep_results, False) if compact and cfg.get("deps") else prompt
+            system_tokens = estimate_tokens(system_prompt)
+            with use_trace(trace):
+                res = await call_agent(agent_key, prompt, system_prompt, target_provider, api_keys, gemini_model,
+                                       force_refresh=force_refresh, on_delta=on_delta if stream else None,
+                                       fallbacks=resolve_fallbacks(agent_key, mode), hedge=hedge and cfg.get("hedge", True),
+                                       response_schema=json_schema(agent_key) if typed else None,
+                                       validate=functools.partial(canonical, agent_key) if typed else None,
+                                       prompt_tokens=system_tokens + estimate_tokens(prompt), prompt_tokens_raw=system_tokens + estimate_tokens(raw))
+            data, text = from_canonical(agent_key, res["text"]) if typed else (None, res["text"])
+            return {"text": text, "data": data, "provider": res["provider"], "model": res["model"], "cached": res["cached"],
+                    "failover": res["provider"] != target_provider or None}
+
+        try:
+            if market_view and cfg.get("scope") == "market":
+                model = default_model(target_provider, gemini_model)
+                try:
+                    with use_trace(trace):
+                        return await get_market_view().result(agent_key, target_provider, model, lambda overview: ask(dict(agent_context, overview=overview)),
+                                                              force_refresh=force_refresh, structured=typed)
+                except DataError:
+                    if "market" not in agent_context: raise
+            return await ask(agent_context)
+        except LLMError as e:
+            return {"text": str(e), "provider": target_provider, "error": type(e).__name__}
+        except Exception as e:  # 意外错误只让该智能体失败 (下游按上游缺失处理)，不中断整个委员会
+            log.exception("智能体 %s 运行出错", agent_key)
+            return {"text": f"[{type(e).__name__}] {e}", "provider": target_provider, "error": type(e).__name__}
+    return run_agent
+
+
+def refresh_market_view(api_keys, mode=MODES[0], gemini_model="gemini-2.5-flash"):
+    """只运行市场层智能体 (如盘前由定时任务调用)，结果写入当前时段供后续所有分析复用；返回 {智能体: 结果}"""
+    runner = make_agent_runner({}, api_keys, mode, gemini_model, market_view=True)
+    graph = {k: [] for k, cfg in AGENTS_CONFIG.items() if cfg.get("scope") == "market"}
+    return {k: r for event, k, r in run_committee(graph, runner) if event == "done"}
+
+
+def analyze_symbol(keyword, api_keys, mode=MODES[0], gemini_model="gemini-2.5-flash", cost_price=0.0, hold_vol=0, force_refresh=False,
+                   stream=False, compact=COMPACT_ENABLED, portfolio=None, structured=STRUCTURED_ENABLED):
+    """无界面的一次完整分析：解析代码 → 并发取行情 → 运行委员会。失败抛出 DataError / LookupError
+
+    stream=True 时走流式接口 (增量不输出)，埋点中才有各智能体的首字延迟。
+    portfolio (portfolio.build_portfolio 的结果) 提供组合摘要；未给成本时用组合中该标的的持仓。
+    GM / 技术分析 / 组合风控的结论解析后写入决策库 (decisions.py)，供回测使用；整次运行在后台写入运行历史 (history.py)。
+    """
+    symbol, name = resolve_symbol(keyword)
+    if not symbol: raise LookupError(f"未找到股票: {keyword}")
+    trace = Trace(label=symbol)
+    with use_trace(trace):
+        bundle = fetch_market_bundle(symbol)
+    quote = bundle["quote"]
+    if quote is None: raise bundle["errors"]["quote"]
+    if not (cost_price > 0 and hold_vol > 0) and portfolio:
+        from .portfolio import holding_for
+        cost_price, hold_vol = holding_for(portfolio, symbol) or (cost_price, hold_vol)
+    agent_context = build_agent_context(symbol, bundle, holding_text(quote, cost_price, hold_vol), portfolio)
+    runner = make_agent_runner(agent_context, api_keys, mode, gemini_model, force_refresh, stream=stream, trace=trace, compact=compact,
+                               structured=structured)
+    results = {k: r for event, k, r in run_committee(agent_graph(), runner) if event == "done"}
+    trace.finish()
+    record_decisions(trace.run_id, symbol, quote, results)
+    save_run(trace, symbol, quote, results, agent_context, mode, {k: str(e) for k, e in bundle["errors"].items()})
+    return {"symbol": symbol, "name": quote["name"], "quote": quote, "change_pct": change_pct(quote),
+            "data_errors": {k: str(e) for k, e in bundle["errors"].items()}, "agents": results,
+            "telemetry": {"run_id": trace.run_id, **trace.summary()}}
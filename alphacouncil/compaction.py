@@ -0,0 +1,93 @@
+"""上下文压缩：把上游智能体报告抽取成紧凑字段，下游只拿自己需要的字段，并控制在 token 预算内。
+
+各智能体的提示词都要求输出 "- **字段名**：取值" 形式的 Markdown 列表，这里按行抽取这些字段；
+下游提示词里每份报告压成一行 "名称: 字段=取值; 字段=取值"，不再整段转贴。
+结构化输出模式 (schemas.py) 下上游直接给出类型化字段，不经正则抽取；抽不到字段 (模型没按格式输出) 时退回截断后的原文。下游总监的 {market} 也换成一行行情简报 (五档盘口已由上游消化)。
+环境变量 ALPHACOUNCIL_COMPACT=0 关闭压缩 (用于对比)，ALPHACOUNCIL_PROMPT_BUDGET 调整预算。token 数为本地估算，实际用量以模型返回的 usage 为准。
+"""
+import os
+import re
+
+# 消费者 → {上游智能体: 需要的字段 (按重要性排序，超预算时从末尾裁掉)}；未列出的上游取全部字段
+FIELD_NEEDS = {
+    "risk_system": {
+        "macro_analyst": ("宏观评级", "核心结论", "政策风口"),
+        "industry_expert": ("最强主线",),
+    },
+    "risk_portfolio": {
+        "funds_analyst": ("资金意图", "短线合力"),
+    },
+    "general_manager": {
+        "macro_analyst": ("宏观评级", "核心结论"),
+        "industry_expert": ("最强主线",),
+        "funds_analyst": ("资金意图", "短线合力"),
+        "technical_analyst": ("买卖区间", "技术形态", "胜率预估"),
+        "fundamental_analyst": ("估值水位", "核心逻辑"),
+        "manager_momentum": ("动能状态", "爆发概率", "关键信号"),
+    },
+}
+COMPACT_ENABLED = os.environ.get("ALPHACOUNCIL_COMPACT", "1") != "0"
+PROMPT_TOKEN_BUDGET = int(os.environ.get("ALPHACOUNCIL_PROMPT_BUDGET", "800"))  # 依赖报告部分的上限
+MAX_VALUE_CHARS = 80
+FALLBACK_CHARS = 160
+TOKENS_PER_CJK = 0.6  # DeepSeek / Qwen 中文约 0.6 token/字；Gemini 接近 1
+CHARS_PER_ASCII_TOKEN = 4
+
+_FIELD_RE = re.compile(r"^[ \t]*(?:[-*][ \t]*)?\*\*[ \t]*([^*\n:：]{1,16}?)[ \t]*[:：]?[ \t]*\*\*[ \t]*[:：]?[ \t]*(.*)$", re.M)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：非 ASCII 字符按 TOKENS_PER_CJK，ASCII 按 CHARS_PER_ASCII_TOKEN 字符 / token"""
+    n_ascii = len(text.encode("ascii", "ignore"))
+    return round((len(text) - n_ascii) * TOKENS_PER_CJK + n_ascii / CHARS_PER_ASCII_TOKEN)
+
+
+def _clip(text, limit):
+    text = _SPACE_RE.sub(" ", text).strip()
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def extract_fields(text):
+    """报告文本 → {字段名: 取值} (保持出现顺序，同名字段取第一次)"""
+    fields = {}
+    for name, value in _FIELD_RE.findall(text or ""):
+        value = value.strip().strip("[]【】")
+        if value and name not in fields: fields[name] = _clip(value, MAX_VALUE_CHARS)
+    return fields
+
+
+def _select(fields, wanted):
+    if wanted is None: return list(fields.items())
+    return [(k, fields[k]) for k in wanted if k in fields]
+
+
+def compact_reports(consumer, reports, names, budget=PROMPT_TOKEN_BUDGET):
+    """reports: {上游: 报告文本或类型化结果 dict} (按依赖顺序) → 紧凑文本，每份报告一行。
+
+    超出 budget 时轮流从字段最多的报告末尾裁掉一个字段，仍超出再按字符截断。
+    """
+    needs = FIELD_NEEDS.get(consumer, {})
+    rows = []
+    for key, report in reports.items():
+        if isinstance(report, dict):
+            from .schemas import labeled_fields
+            fields = {k: _clip(v, MAX_VALUE_CHARS) for k, v in labeled_fields(key, report).items()}
+            rows.append([names[key], _select(fields, needs.get(key)) or list(fields.items())])
+            continue
+        selected = _select(extract_fields(report), needs.get(key))
+        # 抽不到字段时回退到截断原文，保证信息不丢
+        rows.append([names[key], selected] if selected else [names[key], [(None, _clip(report, FALLBACK_CHARS))]])
+
+    def render():
+        return "\n".join(f"{name}: " + "; ".join(v if k is None else f"{k}={v}" for k, v in items) for name, items in rows)
+
+    out = render()
+    while estimate_tokens(out) > budget:
+        row = max(rows, key=lambda r: len(r[1]))
+        if len(row[1]) <= 1: break
+        row[1].pop()
+        out = render()
+    if estimate_tokens(out) > budget:
+        out = out[:int(budget / TOKENS_PER_CJK)]
+    return out
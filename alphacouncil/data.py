@@ -0,0 +1,223 @@
+"""行情数据服务：按主机复用的 keep-alive 会话、统一超时/重试、结构化错误。"""
+import concurrent.futures
+import contextvars
+import math
+import os
+import re
+import threading
+from datetime import datetime
+
+HOSTS = {
+    "tencent": "http://qt.gtimg.cn",
+    "eastmoney": "http://push2his.eastmoney.com",
+    "eastmoney_list": "http://push2.eastmoney.com",
+    "sina": "http://suggest3.sinajs.cn",
+}
+# 可用 ALPHACOUNCIL_<HOST>_URL 覆盖 (如压测时指向 bench/ 的本地替身服务)
+HOSTS = {name: os.environ.get(f"ALPHACOUNCIL_{name.upper()}_URL", url) for name, url in HOSTS.items()}
+HOST_HEADERS = {
+    "sina": {"Referer": "https://finance.sina.com.cn/"},
+}
+
+# (连接超时, 读取超时) 秒；失败后最多重试 2 次，退避 0.2s/0.4s
+# requests/urllib3 导入较重，推迟到第一次建会话时
+TIMEOUT = (3.05, 5)
+RETRY_OPTIONS = dict(total=2, connect=2, read=2, backoff_factor=0.2,
+                     status_forcelist=(429, 500, 502, 503, 504), allowed_methods=frozenset({"GET"}))
+POOL_MAXSIZE = 32
+
+
+class DataError(Exception):
+    """数据获取失败。kind: network (网络/超时) / empty (无数据) / parse (格式异常)"""
+
+    def __init__(self, source, kind, detail=""):
+        self.source, self.kind, self.detail = source, kind, detail
+        super().__init__(f"[{source}] {kind}: {detail}" if detail else f"[{source}] {kind}")
+
+
+_session_lock = threading.Lock()
+_sessions = {}
+_fetch_pool = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="fetch")
+
+
+def get_session(host):
+    """每个主机一个进程级 Session (连接池 + 重试)"""
+    with _session_lock:
+        session = _sessions.get(host)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=Retry(**RETRY_OPTIONS))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(HOST_HEADERS.get(host, {}))
+            _sessions[host] = session
+        return session
+
+
+def _get(host, path, params=None):
+    import requests
+    try:
+        res = get_session(host).get(HOSTS[host] + path, params=params, timeout=TIMEOUT)
+        res.raise_for_status()
+        return res
+    except requests.RequestException as e:
+        raise DataError(host, "network", str(e)) from e
+
+
+def get_json(host, path, params=None):
+    """GET 并解析 JSON，解析失败抛出 DataError(parse)"""
+    res = _get(host, path, params=params)
+    try:
+        return res.json()
+    except ValueError as e:
+        raise DataError(host, "parse", str(e)) from e
+
+
+def get_text(host, path, params=None, encoding="utf-8"):
+    """GET 并按指定编码解码 (腾讯、新浪接口为 GBK)"""
+    return _get(host, path, params=params).content.decode(encoding, "ignore")
+
+
+def to_tencent_code(symbol):
+    code = symbol.lower()
+    if not (code.startswith('sh') or code.startswith('sz')):
+        if code.startswith('6'): code = f"sh{code}"
+        elif code.startswith('0') or code.startswith('3'): code = f"sz{code}"
+    return code
+
+
+def to_secid(symbol):
+    clean_code = re.sub(r"[^0-9]", "", symbol)
+    market = "1" if symbol.startswith("sh") or clean_code.startswith("6") else "0"
+    return f"{market}.{clean_code}"
+
+
+def search_stock_realtime(keyword):
+    """实时搜索；未找到返回 (None, None)，网络异常抛出 DataError"""
+    res = _get("sina", f"/suggest/type=&key={keyword}&name=suggestdata_{int(datetime.now().timestamp())}")
+    content = res.content.decode('gbk', 'ignore')
+    if '=""' in content: return None, None
+    try:
+        data_str = content.split('="')[1].split('";')[0]
+    except IndexError as e:
+        raise DataError("sina", "parse", content[:80]) from e
+    parts = data_str.split(',')
+    if len(parts) > 5: return parts[5], parts[4]
+    return None, None
+
+
+def get_realtime_data_tencent(symbol):
+    """腾讯财经接口 - 获取完整五档数据 (dict，盘口价格/数量为 float)"""
+    from .quotes import get_quotes, quote_to_dict
+    quotes = get_quotes([symbol])
+    if not len(quotes): raise DataError("tencent", "empty", "无数据")
+    quote = quote_to_dict(quotes[0])
+    # 批量解析时无法转换的字段记为 NaN；单只分析需要有效的现价与昨收
+    if math.isnan(quote["now"]) or math.isnan(quote["yestend"]): raise DataError("tencent", "parse", "现价 / 昨收无效")
+    return quote
+
+
+def get_kline_data_eastmoney(symbol, limit=120):
+    """日K (前复权)，取自本地增量K线库，只下载上次之后的新K线"""
+    from .kline_store import get_kline_store
+    return get_kline_store().load_frame(symbol, limit)
+
+
+def get_min_data_eastmoney(symbol):
+    import numpy as np
+    import pandas as pd
+    # f51 时间 / f53 价格 / f56 成交量(手) / f58 均价
+    params = {"secid": to_secid(symbol), "fields1": "f1,f2,f3,f4,f5,f6,f7,f8", "fields2": "f51,f53,f56,f58"}
+    data = get_json("eastmoney", "/api/qt/stock/trends2/get", params=params)
+    if not (data and data.get("data") and data["data"].get("trends")): raise DataError("eastmoney", "empty", "无分时数据")
+    trends = data["data"]["trends"]
+    try:
+        # 整批切分：时间列取 "HH:MM"，数值列一次性转 float
+        rows = [t.split(',') for t in trends]
+        values = np.array([r[1:4] for r in rows], dtype=np.float64)
+    except ValueError as e:
+        raise DataError("eastmoney", "parse", str(e)) from e
+    return pd.DataFrame({"Time": [r[0][-5:] for r in rows], "Price": values[:, 0], "Vol": values[:, 1], "Avg": values[:, 2]})
+
+
+# 东方财富板块代码
+INDEX_BOARDS = {"csi300": "b:BK0500", "sse50": "b:BK0611", "csi500": "b:BK0701"}
+LIST_PAGE_SIZE = 100
+
+
+def get_index_constituents(index):
+    """指数成分股 [(代码, 名称), ...]，index 取 INDEX_BOARDS 的键"""
+    fs = INDEX_BOARDS.get(index.lower())
+    if fs is None: raise ValueError(f"未知指数: {index}，可选 {', '.join(INDEX_BOARDS)}")
+    members, page = [], 1
+    while True:
+        params = {"pn": page, "pz": LIST_PAGE_SIZE, "po": "1", "np": "1", "fltt": "2", "invt": "2", "fid": "f12", "fs": fs, "fields": "f12,f14"}
+        data = (get_json("eastmoney_list", "/api/qt/clist/get", params=params) or {}).get("data") or {}
+        rows = data.get("diff") or []
+        members += [(row["f12"], row["f14"]) for row in rows]
+        if not rows or len(members) >= data.get("total", 0): break
+        page += 1
+    if not members: raise DataError("eastmoney_list", "empty", f"{index} 无成分股数据")
+    return members
+
+
+# 东方财富板块列表：行业 / 概念
+SECTOR_BOARDS = {"industry": "m:90+t:2", "concept": "m:90+t:3"}
+
+
+def _num(v):
+    return float(v) if isinstance(v, (int, float)) else None  # 停牌 / 无数据时接口返回 "-"
+
+
+def get_sector_boards(kind="industry", limit=10, ascending=False):
+    """板块涨跌排行 [{code, name, pct, net_inflow(元)}, ...]，默认涨幅前 limit 名"""
+    params = {"pn": 1, "pz": limit, "po": "0" if ascending else "1", "np": "1", "fltt": "2", "invt": "2", "fid": "f3",
+              "fs": SECTOR_BOARDS[kind], "fields": "f12,f14,f3,f62"}
+    rows = ((get_json("eastmoney_list", "/api/qt/clist/get", params=params) or {}).get("data") or {}).get("diff") or []
+    if not rows: raise DataError("eastmoney_list", "empty", f"{kind} 板块无数据")
+    return [{"code": r["f12"], "name": r["f14"], "pct": _num(r.get("f3")), "net_inflow": _num(r.get("f62"))} for r in rows]
+
+
+def _get_daily_bars(symbol):
+    from .kline_store import get_kline_store
+    return get_kline_store().load_bars(symbol)
+
+
+def _cached(kind, fetch, symbol):
+    """经进程级行情缓存获取：各会话共享结果，同一标的的并发请求只打一次上游"""
+    from .market_cache import get_market_cache
+    from .telemetry import span
+    with span("fetch", kind, symbol=symbol):
+        return get_market_cache().get(kind, to_tencent_code(symbol), lambda: fetch(symbol))
+
+
+def fetch_market_bundle(symbol, kline_limit=120):
+    """并发获取 实时五档 / 日K / 分时 (均经共享缓存)，总耗时取决于最慢的一个请求。
+
+    返回 {"quote", "bars", "kline", "minute", "errors"}：bars 为全部日K结构化数组，
+    kline 为最近 kline_limit 根的 DataFrame；失败项为 None，其 DataError 记录在 errors 中。
+    """
+    # 线程池任务带上调用方的上下文 (埋点 Trace)
+    submit = lambda *args: _fetch_pool.submit(contextvars.copy_context().run, _cached, *args)
+    jobs = {
+        "quote": submit("quote", get_realtime_data_tencent, symbol),
+        "bars": submit("bars", _get_daily_bars, symbol),
+        "minute": submit("minute", get_min_data_eastmoney, symbol),
+    }
+    bundle = {"errors": {}}
+    for name, future in jobs.items():
+        try:
+            bundle[name] = future.result()
+        except DataError as e:
+            bundle[name] = None
+            bundle["errors"][name] = e
+    if bundle["bars"] is not None:
+        from .kline_store import bars_to_frame
+        bundle["kline"] = bars_to_frame(bundle["bars"][-kline_limit:])
+    else:
+        bundle["kline"] = None
+        bundle["errors"]["kline"] = bundle["errors"].pop("bars")
+    return bundle
@@ -0,0 +1,182 @@
+"""决策记录：把 GM、技术分析与组合风控的 Markdown 输出解析成结构化决策并持久化到 SQLite，供 backtest.py 回放。
+
+每条决策记录 (运行, 标的, 决策时价格, 智能体, provider, model) 与解析出的方向、仓位、买卖区间、止损、胜率；
+同一交易日内同一标的、同一智能体的相同回答只记一次 (缓存命中不会重复计入)。原文一并保存，解析规则调整后可重新解析。
+结构化输出模式 (schemas.py) 的结果直接取类型化字段，不再解析 Markdown。
+ALPHACOUNCIL_DECISIONS_DB 指定数据库路径，设为空字符串时只保存在内存。
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from . import market_clock
+from .compaction import extract_fields
+from .paths import data_path
+
+DECISION_AGENTS = ("general_manager", "technical_analyst", "risk_portfolio")
+ACTIONS = {"buy": 1, "hold": 0, "sell": -1}
+ACTION_WORDS = (("sell", ("卖出", "清仓", "减仓", "止盈", "割肉", "空头")), ("buy", ("买入", "加仓", "补仓", "建仓", "多头")),
+                ("hold", ("观望", "持有", "震荡", "中性")))
+COLUMNS = ("run_id", "decided_at", "trade_date", "symbol", "name", "price", "agent", "provider", "model", "action",
+           "position_pct", "buy_lo", "buy_hi", "sell_lo", "sell_hi", "stop", "win_rate", "stance", "digest", "text")
+
+_NUM_RE = re.compile(r"\d+(?:\.\d+)?")
+_SECTION_RE = re.compile(r"^#{2,4}[ \t]*(.*)$", re.M)
+
+
+def _numbers(text):
+    return [float(x) for x in _NUM_RE.findall(text or "")]
+
+
+def _band(text):
+    """"61.2-62.5" / "61.2" → (下沿, 上沿)；取不到为 (None, None)"""
+    nums = [x for x in _numbers(text)[:2] if x > 0]
+    return (min(nums), max(nums)) if nums else (None, None)
+
+
+def _pct(text):
+    m = re.search(r"(\d+(?:\.\d+)?)\s*%", text or "")
+    return float(m.group(1)) if m else None
+
+
+def _action(text):
+    """文本里只出现一类方向词时返回该方向；模型照抄模板 (买入 / 观望 / 卖出 并列) 时返回 None"""
+    found = {action for action, words in ACTION_WORDS if any(w in (text or "") for w in words)}
+    return found.pop() if len(found) == 1 else None
+
+
+def sections(text):
+    """按 Markdown 标题切分 → {标题 (去掉表情与空白): 正文}"""
+    heads = list(_SECTION_RE.finditer(text or ""))
+    out = {}
+    for i, m in enumerate(heads):
+        title = re.sub(r"[^\w一-鿿]", "", m.group(1))
+        out[title] = text[m.end():heads[i + 1].start() if i + 1 < len(heads) else len(text)].strip()
+    return out
+
+
+def _section(secs, key):
+    return next((body for title, body in secs.items() if key in title), "")
+
+
+def parse_general_manager(text, price):
+    secs = sections(text)
+    fields = extract_fields(text)
+    stop = _numbers(fields.get("价格") or _section(secs, "止损"))
+    return {"action": _action(_section(secs, "最终指令")), "position_pct": _pct(_section(secs, "建议仓位")),
+            **dict(zip(("buy_lo", "buy_hi"), _band(fields.get("买入区间")))), **dict(zip(("sell_lo", "sell_hi"), _band(fields.get("卖出区间")))),
+            "stop": stop[0] if stop else None, "stance": (_section(secs, "多空一致性").strip("()（）【】 ") or None)}
+
+
+def parse_technical_analyst(text, price):
+    fields = extract_fields(text)
+    zone = fields.get("买卖区间", "")
+    price_after = lambda word: (lambda m: float(m.group(1)) if m else None)(re.search(word + r"\D{0,6}?(\d+(?:\.\d+)?)", zone))
+    buy, sell = price_after("买入"), price_after("卖出")
+    return {"action": _action(fields.get("技术形态")), "buy_lo": buy, "buy_hi": buy, "sell_lo": sell, "sell_hi": sell,
+            "stop": price_after("止损"), "win_rate": _pct(fields.get("胜率预估"))}
+
+
+def parse_risk_portfolio(text, price):
+    fields = extract_fields(text)
+    position, gap = _pct(fields.get("建议仓位")), _pct(fields.get("止损间距"))
+    return {"action": None if position is None else ("buy" if position > 0 else "hold"), "position_pct": position,
+            "stop": price * (1 - gap / 100) if gap and price else None}
+
+
+PARSERS = {"general_manager": parse_general_manager, "technical_analyst": parse_technical_analyst, "risk_portfolio": parse_risk_portfolio}
+# 类型化字段的取值 → 方向
+TYPED_ACTIONS = {"买入": "buy", "观望": "hold", "卖出": "sell", "多头": "buy", "震荡": "hold", "空头": "sell"}
+
+
+def from_typed(agent_key, data, price):
+    """结构化输出的类型化字段 (schemas.SCHEMAS) → 决策字段"""
+    if agent_key == "general_manager":
+        return {"action": TYPED_ACTIONS.get(data.get("action")), "position_pct": data.get("position"), "buy_lo": data.get("buy_low"),
+                "buy_hi": data.get("buy_high") or data.get("buy_low"), "sell_lo": data.get("sell_low"),
+                "sell_hi": data.get("sell_high") or data.get("sell_low"), "stop": data.get("stop"), "stance": data.get("stance")}
+    if agent_key == "technical_analyst":
+        return {"action": TYPED_ACTIONS.get(data.get("pattern")), "buy_lo": data.get("buy"), "buy_hi": data.get("buy"), "sell_lo": data.get("sell"),
+                "sell_hi": data.get("sell"), "stop": data.get("stop"), "win_rate": data.get("win_rate")}
+    position, gap = data.get("position"), data.get("stop_gap")
+    return {"action": None if position is None else ("buy" if position > 0 else "hold"), "position_pct": position,
+            "stop": price * (1 - gap / 100) if gap and price else None}
+
+
+def parse_decision(agent_key, text, price, data=None):
+    """智能体回答 → 决策字段 dict (解析不到的为 None)；有类型化字段 data 时直接映射；不是决策类智能体返回 None"""
+    parser = PARSERS.get(agent_key)
+    if parser is None: return None
+    return from_typed(agent_key, data, price) if data else parser(text or "", price)
+
+
+class DecisionStore:
+    """线程安全的决策库 (SQLite)"""
+
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path) if path else ":memory:", check_same_thread=False)
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS decisions (id INTEGER PRIMARY KEY, {', '.join(COLUMNS)}, "
+                         "UNIQUE (trade_date, symbol, agent, digest))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS decisions_symbol ON decisions (symbol, trade_date)")
+        self._db.commit()
+
+    def record(self, run_id, symbol, quote, results, decided_at=None):
+        """一次委员会运行的结果 {智能体: 结果} → 写入决策类智能体的解析结果 (失败的跳过)；返回新写入条数"""
+        ts = decided_at or time.time()
+        trade_date = f"{market_clock.now():%Y-%m-%d}" if decided_at is None else time.strftime("%Y-%m-%d", time.localtime(ts))
+        price = float(quote["now"]) or float(quote["yestend"])
+        rows = []
+        for agent in DECISION_AGENTS:
+            res = results.get(agent)
+            if not res or res.get("error"): continue
+            parsed = parse_decision(agent, res["text"], price, res.get("data"))
+            if parsed.get("action") is None: continue  # 方向都解析不出的回答不入库
+            digest = hashlib.sha256(res["text"].encode("utf-8")).hexdigest()[:16]
+            row = dict(parsed, run_id=run_id, decided_at=ts, trade_date=trade_date, symbol=symbol, name=str(quote["name"]), price=price,
+                       agent=agent, provider=res.get("provider"), model=res.get("model"), digest=digest, text=res["text"])
+            rows.append(tuple(row.get(c) for c in COLUMNS))
+        if not rows: return 0
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany(f"INSERT OR IGNORE INTO decisions ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+            self._db.commit()
+            return self._db.total_changes - before
+
+    def frame(self, since=None, agents=None):
+        """决策 DataFrame (按决策时间排序)；since 为 "YYYY-MM-DD"，agents 限定智能体"""
+        import pandas as pd
+        sql, args = f"SELECT {', '.join(c for c in COLUMNS if c != 'text')} FROM decisions WHERE 1=1", []
+        if since:
+            sql += " AND trade_date >= ?"
+            args.append(since)
+        if agents:
+            sql += f" AND agent IN ({', '.join('?' * len(agents))})"
+            args += list(agents)
+        with self._lock:
+            return pd.read_sql_query(sql + " ORDER BY decided_at", self._db, params=args)
+
+    def count(self):
+        with self._lock: return self._db.execute("SELECT COUNT(*) FROM decisions").fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_decision_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            path = os.environ.get("ALPHACOUNCIL_DECISIONS_DB")
+            _store = DecisionStore(data_path("decisions.sqlite") if path is None else path)
+        return _store
+
+
+def record_decisions(run_id, symbol, quote, results):
+    """写入决策库；数据库不可用时不影响分析本身，返回写入条数"""
+    try: return get_decision_store().record(run_id, symbol, quote, results)
+    except sqlite3.Error: return 0
@@ -0,0 +1,237 @@
+"""异步委员会引擎：进程级事件循环 + 每个 provider 的并发上限、令牌桶限速与抖动指数退避。
+
+所有会话的智能体调用都在同一个后台事件循环上执行，限流状态全进程共享，
+多用户同时分析时不会产生线程爆炸，也不会因各自重试而形成限流雪崩。
+
+每个智能体可配置 provider 备选链：出错或缺 Key 时按顺序切换；开启对冲时，主调用超过该 provider
+近期 p95 延迟 (流式取首字延迟) 仍未返回，就在链上下一个 provider 并发发起同一请求，先到者胜出，另一方取消。
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+
+from .llm import InvalidOutputError, LLMError, RateLimitError, PROVIDERS, agenerate, api_key_for, astream_generate, default_model
+from .llm_cache import get_response_cache, make_key, session_ttl
+from .scheduler import iter_dag_events
+from .telemetry import get_metrics, note, span
+
+# concurrency: 同时在途请求数；rate/burst: 令牌桶 (请求/秒, 突发容量)
+PROVIDER_LIMITS = {
+    "Gemini": {"concurrency": 8, "rate": 2.0, "burst": 4},
+    "DeepSeek": {"concurrency": 16, "rate": 5.0, "burst": 10},
+    "Qwen": {"concurrency": 8, "rate": 3.0, "burst": 6},
+}
+MAX_RETRIES = 4
+FAILOVER_RETRIES = 1  # 链上还有备选时，本 provider 只重试一次就切换
+BACKOFF_BASE, BACKOFF_CAP = 0.5, 16.0
+# 对冲延迟 = 该 provider 最近调用的 p95 (样本不足时用默认值)，限制在上下界内；ALPHACOUNCIL_HEDGE=0 全局关闭
+HEDGE_ENABLED = os.environ.get("ALPHACOUNCIL_HEDGE", "1") != "0"
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_DEFAULT_DELAY = 8.0
+HEDGE_MIN_DELAY, HEDGE_MAX_DELAY = 2.0, 30.0
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_loop():
+    """进程级后台事件循环 (惰性启动，守护线程)"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="alphacouncil-engine", daemon=True).start()
+        return _loop
+
+
+class TokenBucket:
+    """令牌桶；被限流时速率减半，之后每次成功按 10% 线性恢复 (AIMD)。只在引擎循环内使用"""
+
+    def __init__(self, rate, burst):
+        self.base_rate = self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_throttled(self):
+        self.rate = max(self.base_rate / 8, self.rate / 2)
+        self.tokens = 0.0
+
+    def on_success(self):
+        self.rate = min(self.base_rate, self.rate + self.base_rate * 0.1)
+
+
+class ProviderLimiter:
+    def __init__(self, concurrency, rate, burst):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate, burst)
+
+    async def run(self, make_call, retries=MAX_RETRIES):
+        """执行 make_call()，对可重试错误做抖动指数退避 (优先遵循 Retry-After)，最多重试 retries 次"""
+        for attempt in range(retries + 1):
+            async with self.semaphore:
+                await self.bucket.acquire()
+                try:
+                    result = await make_call()
+                    self.bucket.on_success()
+                    return result
+                except LLMError as e:
+                    if isinstance(e, RateLimitError): self.bucket.on_throttled()
+                    if not e.retryable or attempt == retries: raise
+                    delay = e.retry_after or random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            await asyncio.sleep(delay)
+
+
+_limiters = {}
+
+
+def get_limiter(provider):
+    """provider 对应的限流器；须在引擎循环内调用"""
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        limiter = _limiters[provider] = ProviderLimiter(**PROVIDER_LIMITS.get(provider, PROVIDER_LIMITS["DeepSeek"]))
+    return limiter
+
+
+def hedge_delay(provider, stream=False):
+    """对冲前等待的秒数：provider 近期 p95 耗时 (流式为首字延迟)"""
+    p95 = get_metrics().quantile("llm", provider, provider, HEDGE_QUANTILE, "ttft_ms" if stream else "ms", HEDGE_MIN_SAMPLES)
+    if p95 is None: return HEDGE_DEFAULT_DELAY
+    return min(max(p95 / 1000, HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
+
+
+def chain_error(chain, errors):
+    """备选链全部失败 → 单个错误原样返回；多个时合并为一个 LLMError (按链顺序逐家列出，各家错误文本已带 provider)，原因为首选的错误"""
+    ordered = [errors[i] for i in sorted(errors)]
+    if len(ordered) == 1: return ordered[0]
+    error = LLMError("；".join(str(e) for e in ordered), provider=chain[min(errors)][0])
+    error.__cause__ = ordered[0]
+    return error
+
+
+async def race_chain(chain, run_on, hedge=False, delay_for=hedge_delay):
+    """按 chain [(provider, model), ...] 依次尝试 run_on(provider, model, claim, hedged)，返回 (结果, (provider, model))。
+
+    LLMError 时换下一个 (全部失败时抛出按链顺序列出各家错误的 LLMError，原因链到首选的错误)；hedge 时当前调用超过 delay_for(provider) 秒未完成，
+    并发启动下一个，先完成者胜出，其余取消。流式调用在收到首字时调用 claim()：
+    返回 True 表示取得输出权 (其余在途调用随即取消)，False 表示已被别的调用抢先。hedged 表示该调用是对冲发起的。
+    """
+    pending, errors, owner = {}, {}, []
+    nxt = 0
+
+    def launch():
+        nonlocal nxt
+        entry = chain[nxt]
+        nxt += 1
+        task = asyncio.ensure_future(run_on(*entry, lambda: claim(task), bool(pending)))
+        pending[task] = nxt - 1
+
+    def claim(task):
+        if not owner:
+            owner.append(task)
+            for t in pending:
+                if t is not task: t.cancel()
+        return owner[0] is task
+
+    try:
+        while True:
+            if not pending:
+                if nxt >= len(chain): raise chain_error(chain, errors)
+                launch()
+            timeout = None
+            if hedge and not owner and len(pending) == 1 and nxt < len(chain):
+                timeout = delay_for(chain[next(iter(pending.values()))][0])
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                launch()  # 超过对冲延迟，备选并发出发
+                continue
+            for task in done:
+                i = pending.pop(task)
+                if task.cancelled(): continue
+                error = task.exception()
+                if error is None: return task.result(), chain[i]
+                if not isinstance(error, LLMError): raise error
+                errors[i] = error
+                if owner and owner[0] is task: owner.clear()  # 输出中途失败：交给下一个重新输出
+    finally:
+        for task in pending: task.cancel()
+
+
+async def call_agent(agent_key, prompt, system_prompt, provider, api_keys, gemini_model_name="gemini-2.5-flash",
+                     force_refresh=False, on_delta=None, fallbacks=(), hedge=False, response_schema=None, validate=None, **span_attrs):
+    """缓存 → 限流 → 调用 (可流式)，返回 {"text", "cached", "provider", "model"}；失败抛出 LLMError，失败结果不缓存。
+
+    传入 on_delta 时走流式接口，每收到一段增量就以当前累计文本回调一次 (命中缓存时回调一次完整文本)。
+    fallbacks 为备选 [(provider, model)]：未配置 Key 的直接跳过，出错时依次切换；hedge 见 race_chain。
+    span_attrs 额外记到该智能体的 agent span 上 (如提示词 token 估算)。
+    结构化输出：response_schema 让模型以 JSON 模式作答，validate(text) 返回规范化文本 (写入缓存并返回) 或抛出 InvalidOutputError；
+    不合格时带着错误向同一模型重问一次 (非流式)，仍不合格则抛出。
+    """
+    cache = get_response_cache()
+    chain = list(dict.fromkeys([(provider, default_model(provider, gemini_model_name))] + [
+        (p, m or default_model(p, gemini_model_name)) for p, m in fallbacks]))
+    # 没有 Key 的 provider 不参与 (全都没有时保留主 provider，由其报出缺 Key)
+    chain = [e for e in chain if api_key_for(e[0], api_keys)] or chain[:1]
+    keys = {e: make_key(agent_key, e[0], e[1], system_prompt, prompt) for e in chain}
+    with span("agent", agent_key, provider=chain[0][0], model=chain[0][1], **span_attrs):
+        if not force_refresh:
+            def lookup(disk):
+                return next(((e, t) for e, k in keys.items() if (t := cache.get(k, disk)) is not None), None)
+            # 先查内存；未命中且有磁盘缓存时在线程池中读 SQLite，不阻塞引擎循环
+            hit = lookup(False) or (await asyncio.to_thread(lookup, True) if cache.persistent else lookup(True))
+            if hit:
+                (p, m), text = hit
+                note(cached=True, provider=p, model=m)
+                if on_delta: on_delta(text)
+                return {"text": text, "cached": True, "provider": p, "model": m}
+
+        attempts = []
+
+        async def run_on(p, m, claim, hedged):
+            async def make_call():
+                # 每次尝试 (含退避重试、切换与对冲) 单独计一个 llm span，排队等待时间 = agent span 减去各次尝试
+                with span("llm", p, provider=p, model=m, agent=agent_key, attempt=len(attempts), hedge=hedged or None):
+                    attempts.append(1)
+                    if on_delta is None:
+                        return await agenerate(prompt, system_prompt, p, api_keys, gemini_model_name, model=m, response_schema=response_schema)
+                    text = ""
+                    async for delta in astream_generate(prompt, system_prompt, p, api_keys, gemini_model_name, model=m, response_schema=response_schema):
+                        if not text and not claim(): raise asyncio.CancelledError()
+                        text += delta
+                        on_delta(text)
+                    return text
+            return await get_limiter(p).run(make_call, FAILOVER_RETRIES if len(chain) > 1 else MAX_RETRIES)
+
+        text, (p, m) = await race_chain(chain, run_on, hedge and len(chain) > 1, lambda p: hedge_delay(p, on_delta is not None))
+        if validate:
+            try: text = validate(text)
+            except InvalidOutputError as e:
+                retry_prompt = f"{prompt}\n\n【上次输出不合格：{e}】\n{str(text or '')[:500]}\n请只输出改正后的 json 对象。"
+
+                async def reask():
+                    with span("llm", p, provider=p, model=m, agent=agent_key, attempt=len(attempts), reask=True):
+                        attempts.append(1)
+                        return await agenerate(retry_prompt, system_prompt, p, api_keys, gemini_model_name, model=m, response_schema=response_schema)
+                note(reask=True)
+                text = validate(await get_limiter(p).run(reask, FAILOVER_RETRIES))
+        note(cached=False, attempts=len(attempts), provider=p, model=m, failover=p != chain[0][0] or None)
+        cache.put(keys[(p, m)], text, session_ttl())
+        return {"text": text, "cached": False, "provider": p, "model": m}
+
+
+def run_committee(graph, fn):
+    """在引擎循环上按依赖图运行 fn(协程)，在调用线程中 yield 事件，见 scheduler.iter_dag_events"""
+    return iter_dag_events(graph, fn, get_loop())
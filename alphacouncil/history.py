@@ -0,0 +1,177 @@
+"""运行历史：每次委员会运行的输入、各智能体输出与耗时存入 SQLite，刷新页面或换人打开时直接读取，无需重跑。
+
+写入由后台线程串行完成 (save_run 只入队，不阻塞分析流程)；读取用独立连接，WAL 模式下与写入互不阻塞。
+索引覆盖 (标的, 时间) 与 (provider, model, 时间)，分页查询走索引。两次运行可按智能体逐段对比 (difflib)。
+ALPHACOUNCIL_HISTORY_DB 指定数据库路径，设为空字符串时不保存历史。
+"""
+import difflib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from .paths import data_path
+
+PAGE_SIZE = 20
+AGENT_COLUMNS = ("run_id", "agent", "provider", "model", "text", "error", "cached", "failover", "ms", "start_ms", "tokens_in", "tokens_out",
+                 "started_at", "data")
+QUOTE_KEYS = ("name", "now", "yestend", "open", "high", "low", "volume", "amount")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY, symbol TEXT NOT NULL, name TEXT, started_at REAL NOT NULL, elapsed_ms REAL,
+    mode TEXT, price REAL, change_pct REAL, quote TEXT, inputs TEXT, telemetry TEXT, spans TEXT, data_errors TEXT);
+CREATE INDEX IF NOT EXISTS runs_symbol_time ON runs (symbol, started_at DESC);
+CREATE INDEX IF NOT EXISTS runs_time ON runs (started_at DESC);
+CREATE TABLE IF NOT EXISTS agent_outputs (
+    run_id TEXT NOT NULL, agent TEXT NOT NULL, provider TEXT, model TEXT, text TEXT, error TEXT,
+    cached INTEGER, failover INTEGER, ms REAL, start_ms REAL, tokens_in INTEGER, tokens_out INTEGER, started_at REAL NOT NULL, data TEXT,
+    PRIMARY KEY (run_id, agent));
+CREATE INDEX IF NOT EXISTS agent_outputs_model ON agent_outputs (provider, model, started_at DESC);
+"""
+
+
+def _connect(path):
+    db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.row_factory = sqlite3.Row
+    return db
+
+
+def run_record(trace, symbol, quote, results, inputs=None, mode=None, data_errors=None):
+    """一次运行 → 待保存的记录 (纯数据，可跨线程传递)；inputs 为提示词模板变量 (build_agent_context 的结果)"""
+    spans = trace.snapshot()
+    agent_spans = {s["name"]: s for s in spans if s["kind"] == "agent"}
+    usage = {}
+    for s in spans:
+        if s["kind"] == "llm" and s.get("agent"):
+            u = usage.setdefault(s["agent"], [0, 0])
+            u[0] += s.get("tokens_in") or 0
+            u[1] += s.get("tokens_out") or 0
+    agents = []
+    for key, r in results.items():
+        s = agent_spans.get(key, {})
+        agents.append((trace.run_id, key, r.get("provider"), r.get("model"), r.get("text"), r.get("error"), int(bool(r.get("cached"))),
+                       int(bool(r.get("failover"))), s.get("ms"), s.get("start_ms"), *usage.get(key, (None, None)), trace.started_at,
+                       json.dumps(r["data"], ensure_ascii=False) if r.get("data") else None))
+    quote = {k: quote[k] if k == "name" else float(quote[k]) for k in QUOTE_KEYS}
+    change = (quote["now"] / quote["yestend"] - 1) * 100 if quote["yestend"] else 0.0
+    summary = trace.summary()
+    run = (trace.run_id, symbol, quote["name"], trace.started_at, summary["elapsed_ms"], mode, quote["now"], change,
+           json.dumps(quote, ensure_ascii=False), json.dumps(inputs or {}, ensure_ascii=False), json.dumps(summary, ensure_ascii=False),
+           json.dumps(spans, ensure_ascii=False, default=str), json.dumps(data_errors or {}, ensure_ascii=False))
+    return run, agents
+
+
+class RunHistory:
+    """后台写入线程 + 只读查询；path 为 None 时不保存 (查询返回空)"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._queue = queue.Queue()
+        self._read_lock = threading.Lock()
+        self._reader = None
+        self.dropped = 0
+        if path:
+            db = _connect(path)
+            db.executescript(_SCHEMA)
+            # 早期的库没有 data 列 (结构化输出的类型化字段)
+            if "data" not in {row[1] for row in db.execute("PRAGMA table_info(agent_outputs)")}:
+                db.execute("ALTER TABLE agent_outputs ADD COLUMN data TEXT")
+            db.close()
+            self._reader = _connect(path)
+            threading.Thread(target=self._writer, name="run-history", daemon=True).start()
+
+    def _writer(self):
+        db = _connect(self.path)
+        while True:
+            run, agents = self._queue.get()
+            try:
+                with db:
+                    db.execute(f"INSERT OR REPLACE INTO runs VALUES ({', '.join('?' * len(run))})", run)
+                    db.executemany(f"INSERT OR REPLACE INTO agent_outputs ({', '.join(AGENT_COLUMNS)}) VALUES ({', '.join('?' * len(AGENT_COLUMNS))})", agents)
+            except sqlite3.Error:
+                self.dropped += 1  # 历史写入失败不影响分析本身
+            finally:
+                self._queue.task_done()
+
+    def save(self, record):
+        """入队后立即返回"""
+        if self._reader is not None: self._queue.put(record)
+
+    def flush(self):
+        """等待已入队的记录写完 (命令行退出前 / 测试用)"""
+        if self._reader is not None: self._queue.join()
+
+    def _query(self, sql, args=()):
+        if self._reader is None: return []
+        with self._read_lock: return [dict(r) for r in self._reader.execute(sql, args).fetchall()]
+
+    def list_runs(self, symbol=None, provider=None, model=None, page=0, page_size=PAGE_SIZE):
+        """分页列出运行 (新的在前) → (当前页 [{run_id, symbol, name, started_at, elapsed_ms, mode, price, change_pct}], 总数)；
+        provider / model 过滤出有智能体用过该模型的运行"""
+        where, args = [], []
+        if symbol:
+            where.append("symbol = ?")
+            args.append(symbol)
+        if provider or model:
+            sub = {k: v for k, v in (("provider", provider), ("model", model)) if v}
+            where.append(f"run_id IN (SELECT run_id FROM agent_outputs WHERE {' AND '.join(k + ' = ?' for k in sub)})")
+            args += list(sub.values())
+        cond = f" WHERE {' AND '.join(where)}" if where else ""
+        total = self._query(f"SELECT COUNT(*) AS n FROM runs{cond}", args)
+        rows = self._query(f"SELECT run_id, symbol, name, started_at, elapsed_ms, mode, price, change_pct FROM runs{cond} "
+                           "ORDER BY started_at DESC LIMIT ? OFFSET ?", args + [page_size, page * page_size])
+        return rows, (total[0]["n"] if total else 0)
+
+    def load_run(self, run_id):
+        """完整运行 {run_id, symbol, ..., quote, inputs, telemetry, spans, data_errors, agents: {智能体: 结果}}；不存在返回 None"""
+        rows = self._query("SELECT * FROM runs WHERE run_id = ?", (run_id,))
+        if not rows: return None
+        run = rows[0]
+        for k in ("quote", "inputs", "telemetry", "spans", "data_errors"): run[k] = json.loads(run[k] or "null")
+        run["agents"] = {}
+        for a in self._query("SELECT * FROM agent_outputs WHERE run_id = ?", (run_id,)):
+            result = {"text": a["text"], "provider": a["provider"], "model": a["model"], "cached": bool(a["cached"]), "failover": bool(a["failover"]) or None,
+                      "ms": a["ms"], "tokens_in": a["tokens_in"], "tokens_out": a["tokens_out"]}
+            if a["error"]: result["error"] = a["error"]
+            if a["data"]: result["data"] = json.loads(a["data"])
+            run["agents"][a["agent"]] = result
+        return run
+
+    def latest(self, symbol):
+        """该标的最近一次运行 (完整内容)；没有返回 None"""
+        rows = self._query("SELECT run_id FROM runs WHERE symbol = ? ORDER BY started_at DESC LIMIT 1", (symbol,))
+        return self.load_run(rows[0]["run_id"]) if rows else None
+
+
+def diff_runs(old, new, context=1):
+    """两次运行 (load_run 的结果) → {智能体: unified diff 行列表}；输出相同的智能体不列出"""
+    out = {}
+    for key in dict.fromkeys([*old["agents"], *new["agents"]]):
+        a, b = (run["agents"].get(key, {}).get("text") or "" for run in (old, new))
+        if a == b: continue
+        when = lambda run: time.strftime("%m-%d %H:%M", time.localtime(run["started_at"]))
+        out[key] = list(difflib.unified_diff(a.splitlines(), b.splitlines(), when(old), when(new), n=context, lineterm=""))
+    return out
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history():
+    global _history
+    with _history_lock:
+        if _history is None:
+            path = os.environ.get("ALPHACOUNCIL_HISTORY_DB")
+            _history = RunHistory(data_path("history.sqlite") if path is None else path or None)
+        return _history
+
+
+def save_run(trace, symbol, quote, results, inputs=None, mode=None, data_errors=None):
+    """组装记录并交给后台线程写入；不阻塞调用方"""
+    history = get_history()
+    if history.path: history.save(run_record(trace, symbol, quote, results, inputs, mode, data_errors))
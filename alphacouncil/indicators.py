@@ -0,0 +1,179 @@
+"""NumPy 向量化技术指标。
+
+所有函数沿最后一维 (时间) 计算，输入可以是单个标的的 (T,) 数组，也可以是多个标的堆叠成的
+(N, T) 数组，一次调用算完整批标的。指标口径与国内行情软件一致 (MACD 柱 = 2*(DIF-DEA)，
+RSI/KDJ/ATR 使用 SMA(X,N,1) 即 alpha=1/N 的指数平滑)。
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+MA_WINDOWS = (5, 10, 20, 60)
+
+
+def _pad_front(values, n, total):
+    """把长度为 T-n+1 的滚动结果在前面补 NaN，对齐到长度 T"""
+    pad = np.full(values.shape[:-1] + (total - values.shape[-1],), np.nan)
+    return np.concatenate([pad, values], axis=-1)
+
+
+def sma(x, n):
+    """简单移动平均，前 n-1 个为 NaN"""
+    x = np.asarray(x, dtype=np.float64)
+    if x.shape[-1] < n: return np.full(x.shape, np.nan)
+    c = np.cumsum(x, axis=-1)
+    c = np.concatenate([np.zeros(x.shape[:-1] + (1,)), c], axis=-1)
+    return _pad_front((c[..., n:] - c[..., :-n]) / n, n, x.shape[-1])
+
+
+def rolling_std(x, n):
+    """滚动总体标准差 (BOLL 口径)"""
+    x = np.asarray(x, dtype=np.float64)
+    if x.shape[-1] < n: return np.full(x.shape, np.nan)
+    w = sliding_window_view(x, n, axis=-1)
+    return _pad_front(w.std(axis=-1), n, x.shape[-1])
+
+
+def rolling_max(x, n):
+    x = np.asarray(x, dtype=np.float64)
+    if x.shape[-1] < n: return np.full(x.shape, np.nan)
+    return _pad_front(sliding_window_view(x, n, axis=-1).max(axis=-1), n, x.shape[-1])
+
+
+def rolling_min(x, n):
+    x = np.asarray(x, dtype=np.float64)
+    if x.shape[-1] < n: return np.full(x.shape, np.nan)
+    return _pad_front(sliding_window_view(x, n, axis=-1).min(axis=-1), n, x.shape[-1])
+
+
+def ema(x, alpha, init=None):
+    """指数平滑 y[t] = (1-alpha)*y[t-1] + alpha*x[t]，y[-1] 默认取 x[0]。
+
+    分块闭式解：块内 y = beta^(t+1)*y_prev + alpha*beta^t*cumsum(x*beta^-t)，
+    块长按 beta 取值限制以免 beta^-t 溢出，Python 循环次数只有 T/块长。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    beta = 1.0 - alpha
+    if beta <= 0: return x.copy()
+    prev = x[..., 0].copy() if init is None else np.broadcast_to(np.asarray(init, dtype=np.float64), x.shape[:-1]).copy()
+    chunk = int(min(64, max(1, 250 / -np.log10(beta)))) if beta < 1 else x.shape[-1]
+    out = np.empty_like(x)
+    for start in range(0, x.shape[-1], chunk):
+        seg = x[..., start:start + chunk]
+        k = np.arange(seg.shape[-1])
+        pw = beta ** k
+        acc = np.cumsum(seg / pw, axis=-1)
+        out[..., start:start + chunk] = beta * pw * prev[..., None] + alpha * pw * acc
+        prev = out[..., start + seg.shape[-1] - 1]
+    return out
+
+
+def ema_span(x, n):
+    return ema(x, 2.0 / (n + 1))
+
+
+def _prev(x):
+    """前一期值，首期取自身"""
+    return np.concatenate([x[..., :1], x[..., :-1]], axis=-1)
+
+
+def compute_daily(open_, high, low, close, volume):
+    """一次算完日线全部指标，返回 {名称: 与输入同形状的数组}"""
+    open_, high, low, close, volume = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close, volume))
+    out = {f"ma{n}": sma(close, n) for n in MA_WINDOWS}
+
+    ema12, ema26 = ema_span(close, 12), ema_span(close, 26)
+    dif = ema12 - ema26
+    dea = ema_span(dif, 9)
+    out.update(ema12=ema12, ema26=ema26, macd_dif=dif, macd_dea=dea, macd_hist=2 * (dif - dea))
+
+    prev_close = _prev(close)
+    change = close - prev_close
+    up, down = np.maximum(change, 0), np.maximum(-change, 0)
+    for n in (6, 14):
+        avg_up, avg_down = ema(up, 1.0 / n), ema(down, 1.0 / n)
+        total = avg_up + avg_down
+        out[f"rsi{n}"] = np.divide(100 * avg_up, total, out=np.full(close.shape, 50.0), where=total > 0)
+
+    mid, std = out["ma20"], rolling_std(close, 20)
+    out.update(boll_mid=mid, boll_up=mid + 2 * std, boll_low=mid - 2 * std)
+
+    hhv, llv = rolling_max(high, 9), rolling_min(low, 9)
+    span = hhv - llv
+    rsv = np.divide(100 * (close - llv), span, out=np.full(close.shape, 50.0), where=np.nan_to_num(span) > 0)
+    k = ema(rsv, 1.0 / 3, init=50.0)
+    d = ema(k, 1.0 / 3, init=50.0)
+    out.update(kdj_k=k, kdj_d=d, kdj_j=3 * k - 2 * d)
+
+    tr = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    out["atr14"] = ema(tr, 1.0 / 14)
+
+    prev_vol5 = _pad_front(sma(volume, 5)[..., :-1], 1, volume.shape[-1]) if volume.shape[-1] > 1 else np.full(volume.shape, np.nan)
+    out["vol_ratio"] = np.divide(volume, prev_vol5, out=np.full(volume.shape, np.nan), where=np.nan_to_num(prev_vol5) > 0)
+    out["high20"], out["low20"] = rolling_max(high, 20), rolling_min(low, 20)
+    out["close"] = close
+    return out
+
+
+def compute_intraday(price, volume):
+    """分时指标：VWAP 与 价格相对 VWAP 的偏离 (%)"""
+    price, volume = np.asarray(price, dtype=np.float64), np.asarray(volume, dtype=np.float64)
+    cum_vol = np.cumsum(volume, axis=-1)
+    vwap = np.divide(np.cumsum(price * volume, axis=-1), cum_vol, out=price.copy(), where=cum_vol > 0)
+    return {"vwap": vwap, "vwap_dev": (price / vwap - 1) * 100}
+
+
+def stack_bars(bar_arrays, length):
+    """把多个标的的K线结构化数组右对齐堆叠为 (N, length) 的 OHLCV；历史不足的用首根K线补齐 (成交量补 0)"""
+    fields = ("open", "high", "low", "close", "volume")
+    stacked = {f: np.empty((len(bar_arrays), length)) for f in fields}
+    for i, bars in enumerate(bar_arrays):
+        tail = bars[-length:]
+        pad = length - len(tail)
+        for f in fields:
+            stacked[f][i, pad:] = tail[f]
+            stacked[f][i, :pad] = 0.0 if f == "volume" else (tail[f][0] if len(tail) else np.nan)
+    return stacked
+
+
+def compute_daily_batch(bar_arrays, length=250):
+    """多标的批量计算，返回 {名称: (N, length) 数组}"""
+    s = stack_bars(bar_arrays, length)
+    return compute_daily(s["open"], s["high"], s["low"], s["close"], s["volume"])
+
+
+def indicator_summary(bars, minute_price=None, minute_volume=None, length=250):
+    """单个标的：K线结构化数组 (+ 可选分时价量) → 指标摘要文本"""
+    tail = bars[-length:]
+    daily = compute_daily(tail["open"], tail["high"], tail["low"], tail["close"], tail["volume"])
+    intraday = None
+    if minute_price is not None and len(minute_price): intraday = compute_intraday(minute_price, minute_volume)
+    return summarize(daily, intraday)
+
+
+def _fmt(v, digits=2):
+    return "-" if v is None or not np.isfinite(v) else f"{v:.{digits}f}"
+
+
+def summarize(daily, intraday=None, i=-1):
+    """第 i 根K线 (默认最新) 的指标摘要文本，注入提示词用"""
+    g = lambda name: float(daily[name][..., i]) if name in daily else float("nan")
+    close = g("close")
+    mas = [g(f"ma{n}") for n in MA_WINDOWS]
+    if all(np.isfinite(mas)) and mas == sorted(mas, reverse=True): ma_state = "多头排列"
+    elif all(np.isfinite(mas)) and mas == sorted(mas): ma_state = "空头排列"
+    else: ma_state = "交织"
+    dif, dea = g("macd_dif"), g("macd_dea")
+    prev_diff = float(daily["macd_dif"][..., i - 1] - daily["macd_dea"][..., i - 1]) if daily["close"].shape[-1] > 1 else float("nan")
+    cross = "金叉" if prev_diff <= 0 < dif - dea else "死叉" if prev_diff >= 0 > dif - dea else ("DIF在上" if dif > dea else "DIF在下")
+    up, low = g("boll_up"), g("boll_low")
+    pct_b = (close - low) / (up - low) if np.isfinite(up - low) and up > low else float("nan")
+    atr = g("atr14")
+    lines = [
+        f"[技术指标] 收盘 {_fmt(close)} | " + " ".join(f"MA{n} {_fmt(v)}" for n, v in zip(MA_WINDOWS, mas)) + f" ({ma_state})",
+        f"MACD DIF {_fmt(dif, 3)} DEA {_fmt(dea, 3)} 柱 {_fmt(g('macd_hist'), 3)} ({cross}) | RSI6 {_fmt(g('rsi6'), 1)} RSI14 {_fmt(g('rsi14'), 1)}",
+        f"BOLL 上 {_fmt(up)} 中 {_fmt(g('boll_mid'))} 下 {_fmt(low)} (%B {_fmt(pct_b)}) | KDJ {_fmt(g('kdj_k'), 1)}/{_fmt(g('kdj_d'), 1)}/{_fmt(g('kdj_j'), 1)}",
+        f"ATR14 {_fmt(atr)} ({_fmt(atr / close * 100 if close else float('nan'))}%) | 量比 {_fmt(g('vol_ratio'))} | 20日高 {_fmt(g('high20'))} 低 {_fmt(g('low20'))}",
+    ]
+    if intraday is not None and intraday["vwap"].shape[-1]:
+        lines.append(f"分时 VWAP {_fmt(float(intraday['vwap'][..., -1]))} (现价偏离 {_fmt(float(intraday['vwap_dev'][..., -1]))}%)")
+    return "\n".join(lines)
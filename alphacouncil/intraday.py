@@ -0,0 +1,142 @@
+"""盘中分时增量更新：每只股票一个定长环形缓冲区，先用 trends2 全量播种，之后只用实时快照增量推进。
+
+每次轮询只取一条实时行情 (经共享行情缓存，约百字节)，按快照时间归入分钟桶，
+成交量取累计成交量的差值；出现跨日或漏掉多分钟时重新全量播种。
+"""
+import threading
+
+import numpy as np
+
+from . import market_clock
+from .data import DataError, get_min_data_eastmoney, get_realtime_data_tencent, to_tencent_code
+from .market_cache import get_market_cache
+
+MINUTES_PER_DAY = 241  # 09:30 + 上午 120 + 下午 120
+MAX_GAP_MINUTES = 3  # 相邻两次快照间隔超过 N 分钟则重新播种
+
+MINUTE_DTYPE = np.dtype([("time", "U5"), ("price", "f8"), ("volume", "f8"), ("avg", "f8")])
+
+
+class MinuteRing:
+    """定长环形缓冲区：append 追加新分钟，update_last 原地更新当前分钟"""
+
+    def __init__(self, capacity=MINUTES_PER_DAY):
+        self.buf = np.zeros(capacity, dtype=MINUTE_DTYPE)
+        self.head = 0  # 下一个写入位置
+        self.size = 0
+
+    def clear(self):
+        self.head = self.size = 0
+
+    def append(self, row):
+        self.buf[self.head] = row
+        self.head = (self.head + 1) % len(self.buf)
+        self.size = min(self.size + 1, len(self.buf))
+
+    def extend(self, rows):
+        for row in rows[-len(self.buf):]: self.append(row)
+
+    def last(self):
+        return self.buf[(self.head - 1) % len(self.buf)] if self.size else None
+
+    def update_last(self, price, volume_delta, avg):
+        i = (self.head - 1) % len(self.buf)
+        self.buf["price"][i] = price
+        self.buf["volume"][i] += volume_delta
+        self.buf["avg"][i] = avg
+
+    def view(self):
+        """按时间顺序返回副本"""
+        if self.size < len(self.buf): return self.buf[:self.size].copy()
+        return np.concatenate([self.buf[self.head:], self.buf[:self.head]])
+
+
+def minute_label(snapshot_time):
+    """行情快照时间 (YYYYmmddHHMMSS) → 分钟桶标签 HH:MM (按结束时刻归桶，午休与收盘后归入最后一根)"""
+    hh, mm, ss = int(snapshot_time[8:10]), int(snapshot_time[10:12]), int(snapshot_time[12:14])
+    minutes = hh * 60 + mm + (1 if ss else 0)
+    if minutes <= 9 * 60 + 30: minutes = 9 * 60 + 30
+    elif 11 * 60 + 30 < minutes <= 13 * 60: minutes = 11 * 60 + 30
+    elif minutes > 15 * 60: minutes = 15 * 60
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _label_minutes(label):
+    """分钟标签 → 当日交易分钟序号 (扣除午休)，用于判断是否漏掉多根"""
+    minutes = int(label[:2]) * 60 + int(label[3:])
+    return minutes - 90 if minutes > 13 * 60 else minutes
+
+
+class IntradayFeed:
+    """单只股票的分时序列；线程安全，可被多个会话共享"""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.ring = MinuteRing()
+        self.day = None
+        self.version = 0  # 每次数据变化 +1，界面据此判断是否需要重画
+        self._last_cum_volume = None
+        self._last_snapshot = ""
+        self._lock = threading.Lock()
+
+    def _seed(self, day):
+        df = get_market_cache().get("minute", to_tencent_code(self.symbol), lambda: get_min_data_eastmoney(self.symbol))
+        rows = np.zeros(len(df), dtype=MINUTE_DTYPE)
+        rows["time"], rows["price"], rows["volume"], rows["avg"] = df["Time"].values, df["Price"].values, df["Vol"].values, df["Avg"].values
+        self.ring.clear()
+        self.ring.extend(rows)
+        self.day = day
+        self._last_cum_volume = None
+        self.version += 1
+
+    def poll(self):
+        """取一条实时快照 (经共享缓存) 并推进序列，返回是否有变化"""
+        quote = get_market_cache().get("quote", to_tencent_code(self.symbol), lambda: get_realtime_data_tencent(self.symbol))
+        return self.apply_quote(quote)
+
+    def apply_quote(self, quote):
+        snapshot = quote.get("time") or ""
+        if len(snapshot) < 14: return False
+        with self._lock:
+            if snapshot <= self._last_snapshot and self.day == snapshot[:8]: return False
+            label = minute_label(snapshot)
+            last = self.ring.last()
+            if self.day != snapshot[:8] or last is None or _label_minutes(label) - _label_minutes(str(last["time"])) > MAX_GAP_MINUTES:
+                self._seed(snapshot[:8])
+                last = self.ring.last()
+            self._last_snapshot = snapshot
+            cum_volume, amount = quote["volume"], quote.get("amount", 0.0)
+            delta = 0.0 if self._last_cum_volume is None else max(cum_volume - self._last_cum_volume, 0.0)
+            self._last_cum_volume = cum_volume
+            avg = amount / (cum_volume * 100) if cum_volume else quote["now"]
+            if last is not None and label <= str(last["time"]):
+                self.ring.update_last(quote["now"], delta, avg)
+            else:
+                self.ring.append((label, quote["now"], delta, avg))
+            self.version += 1
+            return True
+
+    def series(self):
+        with self._lock:
+            return self.ring.view(), self.version
+
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+def get_intraday_feed(symbol):
+    """进程级：同一标的的所有会话共享一个分时序列"""
+    code = to_tencent_code(symbol)
+    with _feeds_lock:
+        if code not in _feeds: _feeds[code] = IntradayFeed(symbol)
+        return _feeds[code]
+
+
+def poll_live(symbol):
+    """界面定时调用：交易时段内推进并返回 (分时数组, 版本号)；行情接口失败时保留已有数据"""
+    feed = get_intraday_feed(symbol)
+    if market_clock.is_trading() or feed.day is None:
+        try: feed.poll()
+        except DataError: pass
+    return feed.series()
@@ -0,0 +1,169 @@
+"""本地日K线库：每个 secid 一个 NumPy 结构化数组文件 (.npy，可内存映射)，保存全部历史，
+每次只下载上次之后的新K线并合并。
+
+最后一根K线若在当日收盘前取得 (盘中 / 午休)，之后会重拉直到拿到收盘后的版本；取数时刻另存于同名 .fetched 文件。
+数据为前复权 (fqt=1)：除权除息后历史价格会整体改变，因此增量下载时会与已存的最后一根
+完整K线比对，不一致即判定复权基准变化并重新下载全量。
+"""
+import concurrent.futures
+import os
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from . import market_clock
+from .data import DataError, get_json, to_secid, to_tencent_code
+from .paths import data_path
+
+BAR_DTYPE = np.dtype([("date", "datetime64[D]"), ("open", "f8"), ("close", "f8"), ("high", "f8"),
+                      ("low", "f8"), ("volume", "f8"), ("amount", "f8")])
+KLINE_FIELDS = "f51,f52,f53,f54,f55,f56,f57"  # 日期,开,收,高,低,成交量(手),成交额(元)
+PRICE_RTOL = 1e-6
+
+
+def parse_klines(klines):
+    """把 "2024-01-02,10.1,10.3,10.5,10.0,12345,1.2e7" 列表一次性解析为结构化数组"""
+    n = len(klines)
+    bars = np.empty(n, dtype=BAR_DTYPE)
+    if n == 0: return bars
+    try:
+        cells = np.array(",".join(klines).split(","))
+        cells = cells.reshape(n, len(BAR_DTYPE.names))
+        bars["date"] = cells[:, 0].astype("datetime64[D]")
+        values = cells[:, 1:].astype(np.float64)
+    except ValueError as e:
+        raise DataError("eastmoney", "parse", str(e)) from e
+    for i, name in enumerate(BAR_DTYPE.names[1:]): bars[name] = values[:, i]
+    return bars
+
+
+def fetch_klines(secid, beg="0"):
+    """下载 beg (YYYYMMDD) 起的日K"""
+    params = {"secid": secid, "fields1": "f1,f2,f3,f4,f5,f6", "fields2": KLINE_FIELDS,
+              "klt": "101", "fqt": "1", "beg": beg, "end": "20500101"}
+    data = get_json("eastmoney", "/api/qt/stock/kline/get", params=params)
+    klines = (data.get("data") or {}).get("klines") if data else None
+    return parse_klines(klines or [])
+
+
+def last_final_session(ts=None):
+    """最近一个已收盘交易日 (K线不会再变的最后一天)"""
+    ts = ts or market_clock.now()
+    day = ts.date()
+    if not (market_clock.is_trading_day(ts) and market_clock.session_state(ts) == "closed"):
+        day -= timedelta(days=1)
+    while day.weekday() >= 5: day -= timedelta(days=1)
+    return np.datetime64(day, "D")
+
+
+class KlineStore:
+    def __init__(self, root=None):
+        self.root = root or data_path("kline", "_").parent
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, secid):
+        with self._locks_guard:
+            return self._locks.setdefault(secid, threading.Lock())
+
+    def _path(self, secid):
+        return os.path.join(self.root, f"{secid}.npy")
+
+    def load(self, secid, mmap=False):
+        """已存K线 (读入内存)；不存在返回 None。
+        mmap=True 时为只读内存映射，仅用于映射期间文件不会被替换的场合 (Windows 上无法替换已映射的文件)"""
+        path = self._path(secid)
+        if not os.path.exists(path): return None
+        return np.load(path, mmap_mode="r" if mmap else None)
+
+    def _save(self, secid, bars, fetched_at):
+        tmp = self._path(secid) + ".tmp"
+        with open(tmp, "wb") as f: np.save(f, bars)
+        os.replace(tmp, self._path(secid))
+        with open(self._path(secid) + ".fetched", "w") as f: f.write(fetched_at.isoformat())
+
+    def _is_final(self, secid, bars):
+        """最后一根K线是否在当日收盘之后取得 (不会再变)；没有取数时刻记录的视为未完成"""
+        try:
+            with open(self._path(secid) + ".fetched") as f: fetched_at = datetime.fromisoformat(f.read().strip())
+        except (OSError, ValueError):
+            return False
+        close = datetime.combine(bars["date"][-1].astype(object), market_clock.AFTERNOON_CLOSE, market_clock.CN_TZ)
+        return fetched_at >= close
+
+    def update(self, secid):
+        """增量更新并返回全部K线 (内存数组，不持有文件映射)"""
+        with self._lock(secid):
+            fetched_at = market_clock.now()
+            stored = self.load(secid)
+            if stored is None or len(stored) == 0:
+                bars = fetch_klines(secid)
+            else:
+                # 已有最近交易日收盘后的K线：无需联网 (盘中 / 午休取得的当日K线须重拉)
+                if stored["date"][-1] >= last_final_session() and not market_clock.is_trading() and self._is_final(secid, stored): return stored
+                # 从倒数第二根 (一定是完整K线) 开始重拉，用它校验复权基准
+                anchor = stored[-2] if len(stored) >= 2 else stored[-1]
+                fresh = fetch_klines(secid, str(anchor["date"]).replace("-", ""))
+                same_base = len(fresh) > 0 and fresh["date"][0] == anchor["date"] and np.allclose(
+                    [fresh[0][f] for f in ("open", "close", "high", "low")],
+                    [anchor[f] for f in ("open", "close", "high", "low")], rtol=PRICE_RTOL)
+                if same_base: bars = np.concatenate([stored[stored["date"] < anchor["date"]], fresh])
+                else: bars = fetch_klines(secid)
+            if len(bars) == 0: raise DataError("eastmoney", "empty", "无K线数据")
+            self._save(secid, bars, fetched_at)
+            return bars
+
+    def load_bars(self, symbol, limit=None):
+        bars = self.update(to_secid(symbol))
+        return bars[-limit:] if limit else bars
+
+    def load_frame(self, symbol, limit=None):
+        return bars_to_frame(self.load_bars(symbol, limit))
+
+
+def load_bars_batch(symbols, workers=16):
+    """并发加载多只标的的日K (经共享行情缓存，与单只分析共用)；失败的为 None"""
+    from .market_cache import get_market_cache
+    store, cache = get_kline_store(), get_market_cache()
+
+    def load(symbol):
+        try: return cache.get("bars", to_tencent_code(symbol), lambda: store.load_bars(symbol))
+        except DataError: return None
+    if not symbols: return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(symbols)), thread_name_prefix="bars") as pool:
+        return list(pool.map(load, symbols))
+
+
+def align_bars(bars_list, fields=("close",), lookback=None):
+    """多只标的的K线按日期并集对齐 → (日期, {字段: 矩阵 [日期, 标的]})；缺失 (停牌 / 未上市) 为 NaN，lookback 只取最近 N 个日期"""
+    tails = [b if lookback is None else b[-lookback:] for b in bars_list]
+    present = [t["date"] for t in tails if t is not None and len(t)]
+    dates = np.unique(np.concatenate(present)) if present else np.array([], dtype="datetime64[D]")
+    if lookback is not None: dates = dates[-lookback:]
+    panel = {f: np.full((len(dates), len(bars_list)), np.nan) for f in fields}
+    for j, tail in enumerate(tails):
+        if tail is None or not len(tail) or not len(dates): continue
+        pos = np.searchsorted(dates, tail["date"])
+        ok = (pos < len(dates)) & (dates[np.minimum(pos, len(dates) - 1)] == tail["date"])
+        for f in fields: panel[f][pos[ok], j] = tail[f][ok]
+    return dates, panel
+
+
+def bars_to_frame(bars):
+    """图表用 DataFrame：Date(str)/Open/Close/High/Low/Volume/Amount"""
+    import pandas as pd
+    return pd.DataFrame({"Date": np.datetime_as_string(bars["date"], unit="D"), "Open": bars["open"],
+                         "Close": bars["close"], "High": bars["high"], "Low": bars["low"],
+                         "Volume": bars["volume"], "Amount": bars["amount"]})
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_kline_store():
+    global _store
+    with _store_lock:
+        if _store is None: _store = KlineStore()
+        return _store
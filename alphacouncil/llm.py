@@ -0,0 +1,310 @@
+"""大模型调用：进程级客户端注册表 + 统一调用入口 + 类型化错误。
+
+客户端按 (provider, api key, base_url, model) 复用，同一 base_url 的 OpenAI 兼容客户端
+共享一个带 keep-alive 的 httpx 连接池，跨线程、跨 Streamlit 会话生效。
+异步客户端 (AsyncOpenAI / Gemini async) 只能在引擎事件循环内获取和使用，见 engine.py。
+"""
+import os
+import threading
+import time
+
+from .telemetry import note
+
+PROVIDERS = {
+    "Gemini": {"key": "gemini", "base_url": None, "model": "gemini-2.5-flash"},
+    "DeepSeek": {"key": "deepseek", "base_url": "https://api.deepseek.com", "model": "deepseek-chat"},
+    "Qwen": {"key": "qwen", "base_url": "https://dashscope.aliyuncs.com/compatible-mode/v1", "model": "qwen-plus"},
+}
+
+# 可用 ALPHACOUNCIL_<PROVIDER>_BASE_URL 覆盖接口地址 (如压测时指向 bench/ 的本地替身服务)；
+# Gemini 覆盖后改走 REST 传输
+for _name, _spec in PROVIDERS.items():
+    _spec["base_url"] = os.environ.get(f"ALPHACOUNCIL_{_name.upper()}_BASE_URL", _spec["base_url"])
+
+# 每个 base_url 一个连接池：最多 32 条连接，其中最多 16 条空闲 keep-alive，空闲 60 秒回收
+HTTP_POOL_LIMITS = {"max_connections": 32, "max_keepalive_connections": 16, "keepalive_expiry": 60.0}
+HTTP_TIMEOUT = 120.0
+
+
+class LLMError(Exception):
+    """模型调用失败；str(e) 即展示给用户的提示文本。retryable 表示可退避重试"""
+    retryable = False
+
+    def __init__(self, message, provider=None, status=None, retry_after=None):
+        super().__init__(message)
+        self.provider, self.status, self.retry_after = provider, status, retry_after
+
+
+class MissingKeyError(LLMError):
+    """未配置 API Key"""
+
+
+class RateLimitError(LLMError):
+    """被限流 (HTTP 429 / ResourceExhausted)"""
+    retryable = True
+
+
+class ProviderUnavailableError(LLMError):
+    """服务端错误 (5xx)、超时或连接失败"""
+    retryable = True
+
+
+class EmptyResponseError(LLMError):
+    """模型返回空内容 (如 content=None、内容过滤)；可重试，重试用尽后切换备选"""
+    retryable = True
+
+
+class InvalidOutputError(LLMError):
+    """结构化输出不是合法 JSON 或不符合 schema (见 schemas.py)；由引擎重问一次"""
+
+
+def _require_text(provider, text, reason=None):
+    """空回答 → EmptyResponseError (交给限流器重试与备选链切换)"""
+    if not text: raise EmptyResponseError(f"[{provider} Error] 模型返回空内容" + (f" (finish_reason={reason})" if reason else ""), provider)
+    return text
+
+
+_UNAVAILABLE_NAMES = ("Timeout", "Connection", "ServiceUnavailable", "DeadlineExceeded", "InternalServerError")
+
+
+def classify_error(provider, exc):
+    """把 SDK 抛出的异常归类为 LLMError 子类"""
+    if isinstance(exc, LLMError): return exc
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if status is None and isinstance(getattr(exc, "code", None), int): status = exc.code
+    retry_after = None
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        try: retry_after = float(headers.get("retry-after"))
+        except (TypeError, ValueError): retry_after = None
+    name = type(exc).__name__
+    message = f"[{provider} Error] {str(exc)}"
+    if status == 429 or name in ("RateLimitError", "ResourceExhausted", "TooManyRequests"):
+        return RateLimitError(message, provider, 429, retry_after)
+    if (isinstance(status, int) and status >= 500) or any(n in name for n in _UNAVAILABLE_NAMES):
+        return ProviderUnavailableError(message, provider, status, retry_after)
+    return LLMError(message, provider, status)
+
+
+class ClientRegistry:
+    """线程安全的客户端注册表，并记录 冷启动/复用 的耗时用于估算节省"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._http_pools = {}
+        self._stats = {}
+
+    def _stat(self, provider):
+        return self._stats.setdefault(provider, {"builds": 0, "reuses": 0, "build_ms": 0.0,
+                                                 "cold_calls": 0, "cold_ms": 0.0, "warm_calls": 0, "warm_ms": 0.0})
+
+    def _http_pool(self, base_url, asynchronous):
+        import httpx
+        pool = self._http_pools.get((base_url, asynchronous))
+        if pool is None:
+            limits = httpx.Limits(**HTTP_POOL_LIMITS)
+            pool_cls = httpx.AsyncClient if asynchronous else httpx.Client
+            pool = pool_cls(limits=limits, timeout=HTTP_TIMEOUT)
+            self._http_pools[(base_url, asynchronous)] = pool
+        return pool
+
+    def _build(self, provider, api_key, base_url, model, asynchronous):
+        if provider == "Gemini":
+            import google.generativeai as genai
+            from google.generativeai import client as genai_client
+            # genai.configure 是全局状态：在锁内配置后立即把底层客户端绑定到模型上，之后与全局配置无关
+            if base_url: genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": base_url})
+            else: genai.configure(api_key=api_key)
+            gmodel = genai.GenerativeModel(model)
+            if asynchronous: gmodel._async_client = genai_client.get_default_generative_async_client()
+            else: gmodel._client = genai_client.get_default_generative_client()
+            return gmodel
+        if asynchronous:
+            from openai import AsyncOpenAI
+            # 重试由引擎统一做 (带限流感知的退避)，SDK 内部不再重试
+            return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self._http_pool(base_url, True), max_retries=0)
+        from openai import OpenAI
+        return OpenAI(api_key=api_key, base_url=base_url, http_client=self._http_pool(base_url, False))
+
+    def acquire(self, provider, api_key, model=None, asynchronous=False):
+        """返回 (client, 是否新建)"""
+        spec = PROVIDERS[provider]
+        model = model or spec["model"]
+        cache_key = (provider, api_key, spec["base_url"], model, asynchronous)
+        with self._lock:
+            stat = self._stat(provider)
+            client = self._clients.get(cache_key)
+            if client is not None:
+                stat["reuses"] += 1
+                return client, False
+            t0 = time.perf_counter()
+            client = self._build(provider, api_key, spec["base_url"], model, asynchronous)
+            stat["builds"] += 1
+            stat["build_ms"] += (time.perf_counter() - t0) * 1000
+            self._clients[cache_key] = client
+            return client, True
+
+    def record_call(self, provider, elapsed_ms, fresh):
+        with self._lock:
+            stat = self._stat(provider)
+            prefix = "cold" if fresh else "warm"
+            stat[f"{prefix}_calls"] += 1
+            stat[f"{prefix}_ms"] += elapsed_ms
+
+    def savings_report(self):
+        """每个 provider 的复用统计；saving_ms = 平均建客户端耗时 + (冷调用均值 - 热调用均值)"""
+        report = {}
+        with self._lock:
+            for provider, s in self._stats.items():
+                build_ms = s["build_ms"] / s["builds"] if s["builds"] else 0.0
+                cold_ms = s["cold_ms"] / s["cold_calls"] if s["cold_calls"] else None
+                warm_ms = s["warm_ms"] / s["warm_calls"] if s["warm_calls"] else None
+                saving = None
+                if cold_ms is not None and warm_ms is not None:
+                    saving = max(build_ms + cold_ms - warm_ms, 0.0)
+                report[provider] = {"builds": s["builds"], "reuses": s["reuses"], "build_ms": build_ms,
+                                    "cold_ms": cold_ms, "warm_ms": warm_ms, "saving_ms": saving}
+        return report
+
+
+_REGISTRY = ClientRegistry()
+
+
+def get_registry():
+    return _REGISTRY
+
+
+def _resolve(provider, api_keys, gemini_model_name, model=None):
+    spec = PROVIDERS.get(provider)
+    if spec is None: raise LLMError(f"[{provider} Error] 未知模型提供方", provider)
+    api_key = api_keys.get(spec["key"])
+    if not api_key: raise MissingKeyError(f"⚠️ 缺 {provider} Key", provider)
+    return api_key, model or default_model(provider, gemini_model_name)
+
+
+def api_key_for(provider, api_keys):
+    spec = PROVIDERS.get(provider)
+    return api_keys.get(spec["key"]) if spec else None
+
+
+def default_model(provider, gemini_model_name="gemini-2.5-flash"):
+    """provider 的默认模型名 (Gemini 由界面选择)"""
+    return gemini_model_name if provider == "Gemini" else PROVIDERS.get(provider, {}).get("model")
+
+
+def _gemini_prompt(prompt, system_prompt):
+    return f"【系统指令】\n{system_prompt}\n\n【用户任务】\n{prompt}"
+
+
+def _messages(prompt, system_prompt):
+    return [{'role': 'system', 'content': system_prompt}, {'role': 'user', 'content': prompt}]
+
+
+def _note_usage(provider, source):
+    """把响应 / 流式分片上的 usage 记到当前埋点 span (没有 usage 时忽略)"""
+    if provider == "Gemini":
+        meta = getattr(source, "usage_metadata", None)
+        if meta: note(tokens_in=getattr(meta, "prompt_token_count", None), tokens_out=getattr(meta, "candidates_token_count", None))
+    else:
+        usage = getattr(source, "usage", None)
+        if usage: note(tokens_in=usage.prompt_tokens, tokens_out=usage.completion_tokens)
+
+
+# 流式请求在最后一个分片附带 usage (DeepSeek / 通义千问兼容模式均支持)
+STREAM_OPTIONS = {"include_usage": True}
+
+
+def _json_mode(provider, response_schema):
+    """结构化输出的请求参数：Gemini 用 response_schema，OpenAI 兼容接口用 json_object (schema 由提示词给出)"""
+    if response_schema is None: return {}
+    if provider == "Gemini": return {"generation_config": {"response_mime_type": "application/json", "response_schema": response_schema}}
+    return {"response_format": {"type": "json_object"}}
+
+
+def generate(prompt, system_prompt, provider, api_keys, gemini_model_name="gemini-2.5-flash", model=None, response_schema=None):
+    """调用模型并返回文本，失败抛出 LLMError；model 为空时用 provider 的默认模型，response_schema 不为空时以 JSON 模式作答"""
+    api_key, model = _resolve(provider, api_keys, gemini_model_name, model)
+    try:
+        client, fresh = _REGISTRY.acquire(provider, api_key, model)
+        t0 = time.perf_counter()
+        if provider == "Gemini":
+            resp = client.generate_content(_gemini_prompt(prompt, system_prompt), **_json_mode(provider, response_schema))
+            text = resp.text
+        else:
+            resp = client.chat.completions.create(model=model, messages=_messages(prompt, system_prompt), **_json_mode(provider, response_schema))
+            text = resp.choices[0].message.content
+        _note_usage(provider, resp)
+        _REGISTRY.record_call(provider, (time.perf_counter() - t0) * 1000, fresh)
+        return _require_text(provider, text, None if provider == "Gemini" else resp.choices[0].finish_reason)
+    except Exception as e: raise classify_error(provider, e) from e
+
+
+def stream_generate(prompt, system_prompt, provider, api_keys, gemini_model_name="gemini-2.5-flash", model=None, response_schema=None):
+    """流式调用，逐段 yield 增量文本，失败抛出 LLMError"""
+    api_key, model = _resolve(provider, api_keys, gemini_model_name, model)
+    try:
+        client, fresh = _REGISTRY.acquire(provider, api_key, model)
+        t0 = time.perf_counter()
+        first = True
+        if provider == "Gemini":
+            chunks = client.generate_content(_gemini_prompt(prompt, system_prompt), stream=True, **_json_mode(provider, response_schema))
+        else:
+            chunks = client.chat.completions.create(model=model, messages=_messages(prompt, system_prompt), stream=True, stream_options=STREAM_OPTIONS,
+                                                    **_json_mode(provider, response_schema))
+        for chunk in chunks:
+            _note_usage(provider, chunk)
+            delta = chunk.text if provider == "Gemini" else (chunk.choices[0].delta.content if chunk.choices else None)
+            if not delta: continue
+            if first: note(ttft_ms=round((time.perf_counter() - t0) * 1000, 1)); first = False
+            yield delta
+        if first: _require_text(provider, None)
+        _REGISTRY.record_call(provider, (time.perf_counter() - t0) * 1000, fresh)
+    except Exception as e: raise classify_error(provider, e) from e
+
+
+async def astream_generate(prompt, system_prompt, provider, api_keys, gemini_model_name="gemini-2.5-flash", model=None, response_schema=None):
+    """异步流式调用 (须在引擎事件循环内)，逐段 yield 增量文本，失败抛出 LLMError"""
+    api_key, model = _resolve(provider, api_keys, gemini_model_name, model)
+    try:
+        client, fresh = _REGISTRY.acquire(provider, api_key, model, asynchronous=True)
+        t0 = time.perf_counter()
+        first = True
+        if provider == "Gemini":
+            chunks = await client.generate_content_async(_gemini_prompt(prompt, system_prompt), stream=True, **_json_mode(provider, response_schema))
+        else:
+            chunks = await client.chat.completions.create(model=model, messages=_messages(prompt, system_prompt), stream=True, stream_options=STREAM_OPTIONS,
+                                                          **_json_mode(provider, response_schema))
+        async for chunk in chunks:
+            _note_usage(provider, chunk)
+            delta = chunk.text if provider == "Gemini" else (chunk.choices[0].delta.content if chunk.choices else None)
+            if not delta: continue
+            if first: note(ttft_ms=round((time.perf_counter() - t0) * 1000, 1)); first = False
+            yield delta
+        if first: _require_text(provider, None)
+        _REGISTRY.record_call(provider, (time.perf_counter() - t0) * 1000, fresh)
+    except Exception as e: raise classify_error(provider, e) from e
+
+
+async def agenerate(prompt, system_prompt, provider, api_keys, gemini_model_name="gemini-2.5-flash", model=None, response_schema=None):
+    """异步非流式调用 (须在引擎事件循环内)"""
+    api_key, model = _resolve(provider, api_keys, gemini_model_name, model)
+    try:
+        client, fresh = _REGISTRY.acquire(provider, api_key, model, asynchronous=True)
+        t0 = time.perf_counter()
+        if provider == "Gemini":
+            resp = await client.generate_content_async(_gemini_prompt(prompt, system_prompt), **_json_mode(provider, response_schema))
+            text = resp.text
+        else:
+            resp = await client.chat.completions.create(model=model, messages=_messages(prompt, system_prompt), **_json_mode(provider, response_schema))
+            text = resp.choices[0].message.content
+        _note_usage(provider, resp)
+        _REGISTRY.record_call(provider, (time.perf_counter() - t0) * 1000, fresh)
+        return _require_text(provider, text, None if provider == "Gemini" else resp.choices[0].finish_reason)
+    except Exception as e: raise classify_error(provider, e) from e
+
+
+def call_ai_api(prompt, system_prompt, provider, api_keys, gemini_model_name="gemini-2.5-flash"):
+    try: return generate(prompt, system_prompt, provider, api_keys, gemini_model_name)
+    except LLMError as e: return str(e)
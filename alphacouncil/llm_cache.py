@@ -0,0 +1,153 @@
+"""大模型响应缓存：内容寻址 (哈希键) + 按交易时段的 TTL + LRU 内存上限 + 可选 SQLite 持久化。
+
+SQLite 写入由后台线程批量提交 (put 只更新内存并入队)；磁盘读取只在内存未命中时发生，引擎在线程池中调用 get，不阻塞事件循环。
+"""
+import hashlib
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from . import market_clock
+from .paths import data_path
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+TRADING_TTL = 180  # 盘中行情变化快，缓存 3 分钟；休市时缓存到下次开盘
+ENTRY_OVERHEAD = 128
+PURGE_EVERY = 256  # 每写入 N 次清理一次磁盘上的过期条目
+
+
+def normalize_context(text):
+    """归一化上下文：压缩空白、去掉小数末尾多余的 0，使等价的行情快照得到相同的键"""
+    text = re.sub(r"(\d+\.\d*?)0+(?!\d)", r"\1", text)
+    text = re.sub(r"(\d+)\.(?!\d)", r"\1", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_key(agent_key, provider, model, system_prompt, context):
+    payload = json.dumps([agent_key, provider, model, system_prompt, normalize_context(context)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def session_ttl(ts=None):
+    """按交易时段决定 TTL (秒)"""
+    ts = ts or market_clock.now()
+    if market_clock.is_trading(ts): return TRADING_TTL
+    return max(market_clock.seconds_until(market_clock.next_open(ts), ts), TRADING_TTL)
+
+
+class ResponseCache:
+    """线程安全的 LRU 缓存；path 不为空时由后台线程写入 SQLite，重启后仍可命中"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, path=None):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (text, expires_at, nbytes)
+        self._bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self._puts = 0
+        self._db = None
+        self._queue = queue.Queue()
+        if path:
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, text TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+            threading.Thread(target=self._writer, name="llm-cache", daemon=True).start()
+
+    @property
+    def persistent(self):
+        return self._db is not None
+
+    def _writer(self):
+        """取出队列中已积压的全部写入，一次事务提交"""
+        while True:
+            rows = [self._queue.get()]
+            while True:
+                try: rows.append(self._queue.get_nowait())
+                except queue.Empty: break
+            try:
+                with self._db_lock:
+                    self._db.executemany("INSERT OR REPLACE INTO llm_cache (key, text, expires_at) VALUES (?, ?, ?)", rows)
+                    self._puts += len(rows)
+                    if self._puts >= PURGE_EVERY:
+                        self._puts = 0
+                        self._db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+                    self._db.commit()
+            except sqlite3.Error:
+                pass  # 持久化失败不影响内存缓存
+            finally:
+                for _ in rows: self._queue.task_done()
+
+    def flush(self):
+        """等待已入队的写入落盘 (退出前 / 测试用)"""
+        if self._db is not None: self._queue.join()
+
+    def _store(self, key, text, expires_at):
+        old = self._entries.pop(key, None)
+        if old: self._bytes -= old[2]
+        nbytes = len(text.encode("utf-8")) + ENTRY_OVERHEAD
+        self._entries[key] = (text, expires_at, nbytes)
+        self._bytes += nbytes
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def get(self, key, disk=True):
+        """disk=False 时只查内存 (可在事件循环中直接调用)，未命中不计数"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                self._bytes -= entry[2]
+                del self._entries[key]
+            if not disk: return None
+        row = None
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute("SELECT text, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        with self._lock:
+            if row:
+                self._store(key, row[0], row[1])
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, text, ttl):
+        """更新内存后立即返回，SQLite 写入交给后台线程；非字符串 / 空文本不缓存"""
+        if not isinstance(text, str) or not text: return
+        expires_at = time.time() + ttl
+        with self._lock: self._store(key, text, expires_at)
+        if self._db is not None: self._queue.put((key, text, expires_at))
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions, "disk": self._db is not None}
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_response_cache():
+    """进程级缓存实例；ALPHACOUNCIL_LLM_CACHE_DB 设为空字符串则只用内存"""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            path = os.environ.get("ALPHACOUNCIL_LLM_CACHE_DB")
+            if path is None: path = data_path("llm_cache.sqlite")
+            _CACHE = ResponseCache(path=path or None)
+        return _CACHE
+
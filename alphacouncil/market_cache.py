@@ -0,0 +1,99 @@
+"""进程级行情缓存：所有会话共享，按数据类型设定 TTL，并发未命中合并为一次上游请求 (single-flight)。
+
+返回的是共享对象 (dict / DataFrame / 只读数组)，调用方不要原地修改。
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from . import market_clock
+from .telemetry import note
+
+MAX_ENTRIES = 1024
+CLOSED_TTL = 300  # 休市时实时类数据基本不变
+TRADING_TTL = {"quote": 2, "minute": 60}
+MIN_BARS_TTL = 60
+
+
+def ttl_for(kind, ts=None):
+    """数据类型 → TTL (秒)：实时行情约 2s、分时 1 分钟、日K 缓存到下一次收盘"""
+    ts = ts or market_clock.now()
+    if kind == "bars": return max(market_clock.seconds_until(market_clock.next_close(ts), ts), MIN_BARS_TTL)
+    if not market_clock.is_trading(ts): return CLOSED_TTL
+    return TRADING_TTL[kind]
+
+
+class MarketDataCache:
+    """线程安全的 TTL + LRU 缓存；同一个键的并发未命中只有第一个线程真正请求，其余等待其结果"""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (kind, key) -> (value, expires_at)
+        self._inflight = {}  # (kind, key) -> Future
+        self._counters = {}  # kind -> {"hits", "misses", "coalesced", "errors"}
+
+    def _count(self, kind, name):
+        counters = self._counters.setdefault(kind, {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0})
+        counters[name] += 1
+
+    def get(self, kind, key, fetch):
+        """命中直接返回；未命中调用 fetch()。fetch 抛出的异常会传给所有等待者且不缓存"""
+        k = (kind, key)
+        with self._lock:
+            entry = self._entries.get(k)
+            if entry and entry[1] > time.monotonic():
+                self._entries.move_to_end(k)
+                self._count(kind, "hits")
+                note(cache="hit")
+                return entry[0]
+            future = self._inflight.get(k)
+            leader = future is None
+            if leader:
+                future = self._inflight[k] = Future()
+                self._count(kind, "misses")
+            else:
+                self._count(kind, "coalesced")
+        note(cache="miss" if leader else "coalesced")
+        if not leader: return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(k, None)
+                self._count(kind, "errors")
+            future.set_exception(e)
+            raise
+        expires_at = time.monotonic() + ttl_for(kind)
+        with self._lock:
+            self._entries[k] = (value, expires_at)
+            self._entries.move_to_end(k)
+            while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+            self._inflight.pop(k, None)
+        future.set_result(value)
+        return value
+
+    def invalidate(self, kind=None, key=None):
+        with self._lock:
+            for k in [k for k in self._entries if (kind is None or k[0] == kind) and (key is None or k[1] == key)]:
+                del self._entries[k]
+
+    def stats(self):
+        """{kind: {hits, misses, coalesced, errors}} 及 entries 总数"""
+        with self._lock:
+            report = {kind: dict(c) for kind, c in self._counters.items()}
+            report["entries"] = len(self._entries)
+            return report
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_market_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None: _cache = MarketDataCache()
+        return _cache
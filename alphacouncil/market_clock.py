@@ -0,0 +1,60 @@
+"""A 股交易时段判断 (北京时间，周一至周五 9:30-11:30 / 13:00-15:00，不含法定节假日)。"""
+from datetime import datetime, time, timedelta, timezone
+
+CN_TZ = timezone(timedelta(hours=8))
+MORNING_OPEN, MORNING_CLOSE = time(9, 30), time(11, 30)
+AFTERNOON_OPEN, AFTERNOON_CLOSE = time(13, 0), time(15, 0)
+
+
+def now():
+    return datetime.now(CN_TZ)
+
+
+def _at(ts, t):
+    return ts.replace(hour=t.hour, minute=t.minute, second=0, microsecond=0)
+
+
+def is_trading_day(ts):
+    return ts.weekday() < 5
+
+
+def session_state(ts=None):
+    """返回 pre_open / morning / lunch / afternoon / closed"""
+    ts = ts or now()
+    if not is_trading_day(ts): return "closed"
+    t = ts.timetz().replace(tzinfo=None)
+    if t < MORNING_OPEN: return "pre_open"
+    if t < MORNING_CLOSE: return "morning"
+    if t < AFTERNOON_OPEN: return "lunch"
+    if t < AFTERNOON_CLOSE: return "afternoon"
+    return "closed"
+
+
+def is_trading(ts=None):
+    return session_state(ts) in ("morning", "afternoon")
+
+
+def next_open(ts=None):
+    """下一次开盘 (含午后开盘) 时刻；交易中返回当前时刻"""
+    ts = ts or now()
+    state = session_state(ts)
+    if state in ("morning", "afternoon"): return ts
+    if state == "pre_open": return _at(ts, MORNING_OPEN)
+    if state == "lunch": return _at(ts, AFTERNOON_OPEN)
+    day = ts + timedelta(days=1)
+    while not is_trading_day(day): day += timedelta(days=1)
+    return _at(day, MORNING_OPEN)
+
+
+def next_close(ts=None):
+    """下一次收盘 (15:00) 时刻"""
+    ts = ts or now()
+    day = ts
+    if not is_trading_day(day) or ts >= _at(ts, AFTERNOON_CLOSE):
+        day = ts + timedelta(days=1)
+        while not is_trading_day(day): day += timedelta(days=1)
+    return _at(day, AFTERNOON_CLOSE)
+
+
+def seconds_until(target, ts=None):
+    return max((target - (ts or now())).total_seconds(), 0.0)
@@ -0,0 +1,156 @@
+"""市场层智能体 (宏观 / 行业)：与个股无关，每个刷新时段在指数与板块数据上只运行一次，结果供所有标的、所有会话复用。
+
+刷新时段默认为每个交易日 09:00 (盘前) 起每小时一次，可用 ALPHACOUNCIL_MARKET_VIEW_SLOTS 覆盖；
+当前时段的结果保存在数据目录 market_view.json，进程重启后仍可复用。
+同一时段、同一 (智能体, 模型) 的并发请求在引擎循环内合并为一次调用；ALPHACOUNCIL_MARKET_VIEW=0 关闭共享 (每次按个股运行)。
+"""
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+from datetime import time as dtime, timedelta
+
+from . import market_clock
+from .paths import data_path
+from .telemetry import span
+
+MARKET_AGENTS = ("macro_analyst", "industry_expert")
+MARKET_VIEW_ENABLED = os.environ.get("ALPHACOUNCIL_MARKET_VIEW", "1") != "0"
+REFRESH_SLOTS = tuple(sorted(dtime.fromisoformat(s.strip()) for s in
+                             os.environ.get("ALPHACOUNCIL_MARKET_VIEW_SLOTS", "09:00,10:00,11:00,13:00,14:00,15:00").split(",")))
+INDEX_SYMBOLS = {"sh000001": "上证指数", "sz399001": "深证成指", "sz399006": "创业板指", "sh000300": "沪深300", "sh000688": "科创50"}
+SECTOR_TOP, SECTOR_BOTTOM = 10, 5
+
+
+def current_slot(ts=None):
+    """ts 所属刷新时段 "YYYY-MM-DD HH:MM"：当日最近一个已过的时点；首个时点之前或非交易日归到上一交易日的最后时点"""
+    ts = ts or market_clock.now()
+    if market_clock.is_trading_day(ts):
+        passed = [s for s in REFRESH_SLOTS if ts.timetz().replace(tzinfo=None) >= s]
+        if passed: return f"{ts:%Y-%m-%d} {passed[-1]:%H:%M}"
+    day = ts - timedelta(days=1)
+    while not market_clock.is_trading_day(day): day -= timedelta(days=1)
+    return f"{day:%Y-%m-%d} {REFRESH_SLOTS[-1]:%H:%M}"
+
+
+def _yi(v):
+    return "-" if v is None else f"{v / 1e8:+.1f}亿"
+
+
+def build_market_overview():
+    """主要指数 + 行业板块涨跌排行 → 市场概览文本 (宏观 / 行业智能体的输入)。失败抛出 DataError"""
+    from .data import get_sector_boards
+    from .quotes import get_quotes
+    quotes = get_quotes(list(INDEX_SYMBOLS))
+    index_text = " ".join(f"{INDEX_SYMBOLS.get(str(q['symbol']), q['name'])} {q['now']:.2f}({(q['now'] / q['yestend'] - 1) * 100:+.2f}%)"
+                          for q in quotes if q["yestend"])
+    turnover = sum(float(q["amount"]) for q in quotes if str(q["symbol"]) in ("sh000001", "sz399001"))
+    board = lambda rows: " ".join(f"{r['name']}{r['pct']:+.2f}%(主力{_yi(r['net_inflow'])})" for r in rows if r["pct"] is not None)
+    return "\n".join([
+        f"[市场概览] {market_clock.now():%Y-%m-%d %H:%M}",
+        f"[主要指数] {index_text}",
+        f"[两市成交额] {turnover / 1e8:.0f}亿" if turnover else "[两市成交额] -",
+        f"[行业涨幅前{SECTOR_TOP}] {board(get_sector_boards('industry', SECTOR_TOP))}",
+        f"[行业跌幅前{SECTOR_BOTTOM}] {board(get_sector_boards('industry', SECTOR_BOTTOM, ascending=True))}",
+    ])
+
+
+class MarketView:
+    """当前时段的市场概览与市场层智能体结果；results 键为 "智能体|provider|model" (结构化输出另加 "|json")"""
+
+    def __init__(self, path=None):
+        self.path = path or data_path("market_view.json")
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._version = self._written = 0  # 快照序号：并发落盘时旧快照不覆盖新快照
+        self.slot, self.overview, self.results = None, None, {}
+        self._tasks = {}  # 在途计算，仅在引擎循环内访问
+        try:
+            saved = json.loads(self.path.read_text(encoding="utf-8"))
+            self.slot, self.overview, self.results = saved["slot"], saved["overview"], saved["results"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _roll(self, slot):
+        """进入新时段时清空上一时段的结果"""
+        with self._lock:
+            if self.slot != slot: self.slot, self.overview, self.results = slot, None, {}
+
+    def _snapshot(self):
+        """(序号, 当前内容的 JSON)；在锁内序列化，之后的修改不影响本次落盘"""
+        with self._lock:
+            self._version += 1
+            return self._version, json.dumps({"slot": self.slot, "overview": self.overview, "results": self.results}, ensure_ascii=False)
+
+    def _write(self, version, payload):
+        """落盘 (在线程池中执行，不阻塞引擎循环)"""
+        tmp = self.path.with_suffix(".tmp")
+        with self._write_lock:
+            if version <= self._written: return
+            try:
+                tmp.write_text(payload, encoding="utf-8")
+                tmp.replace(self.path)
+                self._written = version
+            except OSError:
+                pass  # 落盘失败只影响重启后的复用
+
+    async def _shared(self, key, make):
+        """同一 key 的并发调用共享一个 Task；调用方被取消不影响共享计算。返回 (结果, 是否为发起者)"""
+        task = self._tasks.get(key)
+        leader = task is None
+        if leader:
+            task = self._tasks[key] = asyncio.ensure_future(make())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return await asyncio.shield(task), leader
+
+    async def get_overview(self, slot):
+        if self.overview is not None: return self.overview
+
+        async def fetch():
+            ctx = contextvars.copy_context()
+            with span("fetch", "market_overview"):
+                overview = await asyncio.get_running_loop().run_in_executor(None, ctx.run, build_market_overview)
+            with self._lock:
+                if self.slot == slot: self.overview = overview
+            return overview
+        return (await self._shared((slot, "overview"), fetch))[0]
+
+    async def result(self, agent_key, provider, model, run, force_refresh=False, structured=False):
+        """当前时段 agent_key 的结果；没有则以 run(概览文本) 协程计算一次并保存。
+
+        复用他人结果时标记 cached=True；run 抛出的异常 (LLMError / DataError) 传给所有等待者，不保存。
+        force_refresh 时不取已保存的结果，重新计算后覆盖；structured 与自由文本的结果分开保存。
+        """
+        slot = current_slot()
+        self._roll(slot)
+        key = f"{agent_key}|{provider}|{model}" + ("|json" if structured else "")
+        with self._lock: stored = None if force_refresh else self.results.get(key)
+        if stored: return dict(stored, cached=True)
+
+        async def compute():
+            res = await run(await self.get_overview(slot))
+            if not res.get("error"):
+                with self._lock:
+                    if self.slot == slot: self.results[key] = dict(res, slot=slot, generated_at=time.time())
+                # 落盘交给线程池，不等待 (结果已在内存中可复用)
+                asyncio.get_running_loop().run_in_executor(None, self._write, *self._snapshot())
+            return dict(res, slot=slot)
+        res, leader = await self._shared((slot, key), compute)
+        return res if leader else dict(res, cached=True)
+
+    def status(self):
+        """{slot, agents: 已生成的结果数}"""
+        with self._lock: return {"slot": self.slot, "agents": len(self.results)}
+
+
+_view = None
+_view_lock = threading.Lock()
+
+
+def get_market_view():
+    global _view
+    with _view_lock:
+        if _view is None: _view = MarketView()
+        return _view
@@ -0,0 +1,12 @@
+"""本地数据目录 (缓存、K线库等)，可用环境变量 ALPHACOUNCIL_HOME 覆盖。"""
+import os
+from pathlib import Path
+
+DATA_DIR = Path(os.environ.get("ALPHACOUNCIL_HOME") or Path.home() / ".alphacouncil")
+
+
+def data_path(*parts):
+    """返回数据目录下的路径，并确保父目录存在"""
+    path = DATA_DIR.joinpath(*parts)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
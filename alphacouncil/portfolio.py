@@ -0,0 +1,201 @@
+"""组合模式：从 CSV 载入多只持仓，批量刷新行情，向量化计算盈亏、权重、集中度与风险 (波动 / β / 相关性)。
+
+CSV 至少包含 代码、成本、数量 三列 (中英文表头均可，见 HOLDING_COLUMNS)：
+
+    代码,名称,成本,数量
+    600276,恒瑞医药,45.2,1200
+    sz000001,平安银行,11.8,5000
+
+行情一次批量请求 (quotes.get_quotes)；日K经进程级行情缓存并发加载，之后的刷新只需一次行情请求。
+组合摘要 portfolio_text 注入 risk_portfolio 与 general_manager 的 {portfolio}。
+"""
+import time
+
+import numpy as np
+
+from .data import to_tencent_code
+
+HOLDING_COLUMNS = {
+    "symbol": ("symbol", "code", "代码", "证券代码", "股票代码"),
+    "name": ("name", "名称", "证券名称", "股票名称"),
+    "cost": ("cost", "cost_price", "成本", "成本价", "持仓成本"),
+    "volume": ("volume", "hold_vol", "shares", "数量", "股数", "持仓数量"),
+}
+BENCHMARK = ("sh000300", "沪深300")
+RISK_LOOKBACK = 250  # 交易日
+MIN_OBSERVATIONS = 60  # 少于此数的收益率样本不计算 β / 相关
+TRADING_DAYS = 252
+BARS_WORKERS = 16
+
+
+def normalize_symbol(code):
+    """600276 / SH600276 / 510300 → 带市场前缀的代码 (优先查离线索引，可识别 ETF)"""
+    code = str(code).strip().lower()
+    if code[:2] in ("sh", "sz", "bj"): return code
+    code = code.zfill(6)
+    from .symbols import get_symbol_index
+    index = get_symbol_index(refresh=False)
+    entry = index.get(code) if index else None
+    if entry: return entry.symbol
+    return "sh" + code if code.startswith("5") else to_tencent_code(code)
+
+
+def load_holdings(source):
+    """CSV 路径或文件对象 → DataFrame[symbol, name, cost, volume] (同一代码合并，成本按数量加权)；格式错误抛出 ValueError"""
+    import pandas as pd
+    df = pd.read_csv(source, dtype=str, skipinitialspace=True)
+    columns = {}
+    for col in df.columns:
+        for field, aliases in HOLDING_COLUMNS.items():
+            if str(col).strip().lower() in aliases and field not in columns.values(): columns[col] = field
+    missing = {"symbol", "cost", "volume"} - set(columns.values())
+    if missing: raise ValueError(f"持仓 CSV 缺少列: {', '.join(sorted(missing))} (可用表头见 HOLDING_COLUMNS)")
+    df = df.rename(columns=columns)[[c for c in HOLDING_COLUMNS if c in columns.values()]].dropna(subset=["symbol"])
+    df["symbol"] = [normalize_symbol(s) for s in df["symbol"]]
+    df["cost"] = pd.to_numeric(df["cost"].str.replace(",", ""), errors="coerce")
+    df["volume"] = pd.to_numeric(df["volume"].str.replace(",", ""), errors="coerce")
+    df = df[(df["volume"] > 0) & (df["cost"] >= 0)]
+    if df.empty: raise ValueError("持仓 CSV 没有有效行 (数量需大于 0)")
+    df["cost_value"] = df["cost"] * df["volume"]
+    if "name" not in df: df["name"] = ""
+    merged = df.groupby("symbol", sort=False).agg(name=("name", "first"), cost_value=("cost_value", "sum"), volume=("volume", "sum"))
+    merged["cost"] = merged["cost_value"] / merged["volume"]
+    return merged.reset_index()[["symbol", "name", "cost", "volume"]]
+
+
+def price_positions(holdings):
+    """批量行情 → 每只持仓的市值、盈亏与权重 (DataFrame)；查不到行情的持仓 price 为 NaN、不计权重"""
+    from .quotes import get_quotes
+    quotes = get_quotes(holdings["symbol"].tolist())
+    pos = holdings.copy()
+    idx = {str(s): i for i, s in enumerate(quotes["symbol"])}
+    rows = np.array([idx.get(s, -1) for s in pos["symbol"]])
+    found = rows >= 0
+    take = lambda field: np.where(found, quotes[field][np.maximum(rows, 0)] if len(quotes) else np.nan, np.nan)
+    pos["price"], pos["yestend"] = take("now"), take("yestend")
+    if len(quotes): pos.loc[found, "name"] = quotes["name"][rows[found]]
+    price = pos["price"].to_numpy()
+    # 停牌 (现价为 0) 时按昨收计
+    price = np.where(price > 0, price, pos["yestend"].to_numpy())
+    pos["price"] = price
+    pos["market_value"] = price * pos["volume"]
+    pos["cost_value"] = pos["cost"] * pos["volume"]
+    pos["pnl"] = pos["market_value"] - pos["cost_value"]
+    pos["pnl_pct"] = np.where(pos["cost_value"] > 0, pos["pnl"] / pos["cost_value"] * 100, np.nan)
+    pos["day_pnl"] = (price - pos["yestend"]) * pos["volume"]
+    pos["day_pct"] = (price / pos["yestend"] - 1) * 100
+    total = np.nansum(pos["market_value"])
+    pos["weight"] = np.nan_to_num(pos["market_value"] / total) if total else 0.0
+    return pos
+
+
+def return_matrix(bars_list, lookback=RISK_LOOKBACK):
+    """多只标的日K → (日期, 日收益率矩阵 [日期, 标的])；按日期并集对齐，停牌或缺失处为 NaN"""
+    from .kline_store import align_bars
+    dates, panel = align_bars(bars_list, ("close",), lookback + 1)
+    close = panel["close"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return dates[1:], close[1:] / close[:-1] - 1
+
+
+def masked_beta(returns, market):
+    """逐列 β = cov(r_i, r_m) / var(r_m)，只用两者都有值的日期；样本不足 MIN_OBSERVATIONS 为 NaN"""
+    valid = ~np.isnan(returns) & ~np.isnan(market)[:, None]
+    n = valid.sum(axis=0)
+    x = np.where(valid, returns, 0.0)
+    y = np.where(valid, market[:, None], 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mx, my = x.sum(axis=0) / n, y.sum(axis=0) / n
+        dx, dy = np.where(valid, x - mx, 0.0), np.where(valid, y - my, 0.0)
+        beta = (dx * dy).sum(axis=0) / (dy * dy).sum(axis=0)
+    return np.where(n >= MIN_OBSERVATIONS, beta, np.nan)
+
+
+def risk_metrics(symbols, weights, lookback=RISK_LOOKBACK):
+    """持仓风险：各标的年化波动、β、与组合的相关性，组合的波动 / β / VaR / 回撤与相关矩阵"""
+    import pandas as pd
+    from .kline_store import load_bars_batch
+    bars = load_bars_batch(list(symbols) + [BENCHMARK[0]], BARS_WORKERS)
+    dates, ret = return_matrix(bars, lookback)
+    if len(dates) < MIN_OBSERVATIONS: return None
+    ret, market = ret[:, :-1], ret[:, -1]
+    weights = np.asarray(weights, dtype=np.float64)
+    # 组合日收益：当日缺失的持仓按 0 收益计 (停牌不动)
+    port = np.nan_to_num(ret) @ weights
+    both = np.column_stack([ret, port])
+    corr = pd.DataFrame(ret, columns=list(symbols)).corr(min_periods=MIN_OBSERVATIONS)
+    with np.errstate(invalid="ignore"):
+        vol = np.nanstd(ret, axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+        corr_port = pd.DataFrame(both).corr(min_periods=MIN_OBSERVATIONS).to_numpy()[-1, :-1]
+    c = corr.to_numpy()
+    off = ~np.eye(len(weights), dtype=bool) & ~np.isnan(c)
+    ww = np.outer(weights, weights)
+    avg_corr = float((ww * np.nan_to_num(c))[off].sum() / ww[off].sum()) if off.any() and ww[off].sum() else float("nan")
+    nav = np.cumprod(1 + port)
+    return {"dates": (str(dates[0]), str(dates[-1])), "vol": vol, "beta": masked_beta(ret, market), "corr_with_portfolio": corr_port,
+            "corr": corr, "avg_corr": avg_corr, "port_vol": float(np.std(port, ddof=1) * np.sqrt(TRADING_DAYS)),
+            "port_beta": float(masked_beta(port[:, None], market)[0]), "var95": float(-np.percentile(port, 5)),
+            "max_drawdown": float((nav / np.maximum.accumulate(nav) - 1).min())}
+
+
+def build_portfolio(holdings, with_risk=True):
+    """一次完整刷新：批量行情 + (可选) 风险指标。返回 {positions, totals, risk, elapsed_ms}"""
+    t0 = time.perf_counter()
+    pos = price_positions(holdings)
+    w = pos["weight"].to_numpy()
+    mv, cv, day = np.nansum(pos["market_value"]), np.nansum(pos["cost_value"]), np.nansum(pos["day_pnl"])
+    hhi = float((w ** 2).sum())
+    totals = {"count": len(pos), "market_value": mv, "cost_value": cv, "pnl": mv - cv, "pnl_pct": (mv / cv - 1) * 100 if cv else float("nan"),
+              "day_pnl": day, "day_pct": day / (mv - day) * 100 if mv - day else float("nan"),
+              "hhi": hhi, "effective_n": 1 / hhi if hhi else float("nan"), "top5_weight": float(np.sort(w)[::-1][:5].sum()),
+              "missing_quotes": pos.loc[pos["price"].isna(), "symbol"].tolist()}
+    risk = risk_metrics(pos["symbol"].tolist(), w) if with_risk else None
+    if risk:
+        pos["vol"], pos["beta"], pos["corr_port"] = risk["vol"], risk["beta"], risk["corr_with_portfolio"]
+    return {"positions": pos, "totals": totals, "risk": risk, "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+
+def _wan(v):
+    return f"{v / 1e4:,.1f}万"
+
+
+def top_correlated(corr, n=3, min_corr=0.7):
+    """相关矩阵上三角中相关性最高的 n 对 [(a, b, ρ)]"""
+    c = corr.to_numpy()
+    iu = np.triu_indices(len(c), k=1)
+    vals = c[iu]
+    order = np.argsort(np.nan_to_num(vals, nan=-2))[::-1][:n]
+    return [(corr.index[iu[0][k]], corr.columns[iu[1][k]], float(vals[k])) for k in order if vals[k] >= min_corr]
+
+
+def portfolio_text(report, focus=None, top=5):
+    """组合摘要 (注入提示词)；focus 为当前分析的标的代码，若在组合中则附上其权重与相关性"""
+    if not report: return ""
+    pos, t, risk = report["positions"], report["totals"], report["risk"]
+    names = dict(zip(pos["symbol"], pos["name"]))
+    heavy = pos.nlargest(top, "weight")
+    lines = [f"[组合] 持仓 {t['count']} 只 · 市值 {_wan(t['market_value'])} · 浮盈 {_wan(t['pnl'])} ({t['pnl_pct']:+.1f}%) · 今日 {_wan(t['day_pnl'])} ({t['day_pct']:+.2f}%)",
+             f"[集中度] 前{top}大 {heavy['weight'].sum() * 100:.1f}% (" + "、".join(f"{r.name} {r.weight * 100:.1f}%" for r in heavy.itertuples())
+             + f") · HHI {t['hhi']:.3f} (有效持仓 {t['effective_n']:.0f} 只)"]
+    if risk:
+        lines.append(f"[风险] 年化波动 {risk['port_vol'] * 100:.1f}% · β {risk['port_beta']:.2f} ({BENCHMARK[1]}) · 日VaR95 {risk['var95'] * 100:.2f}%"
+                     f" · 最大回撤 {risk['max_drawdown'] * 100:.1f}% · 平均相关 {risk['avg_corr']:.2f}")
+        pairs = top_correlated(risk["corr"])
+        if pairs: lines.append("[高相关] " + "、".join(f"{names.get(a, a)}/{names.get(b, b)} {c:.2f}" for a, b, c in pairs))
+    if focus:
+        row = pos[pos["symbol"] == normalize_symbol(focus)]
+        if len(row):
+            r = row.iloc[0]
+            text = f"[本标的] {r['name']} 权重 {r['weight'] * 100:.1f}% · 成本 {r['cost']:.2f} · 浮盈 {r['pnl_pct']:+.1f}%"
+            if risk and np.isfinite(r.get("beta", np.nan)): text += f" · β {r['beta']:.2f} · 与组合相关 {r['corr_port']:.2f}"
+            lines.append(text)
+        else:
+            lines.append("[本标的] 不在组合中 (新开仓需考虑与现有持仓的相关性)")
+    return "\n".join(lines)
+
+
+def holding_for(report, symbol):
+    """组合中该标的的 (成本, 数量)；不在组合中返回 None"""
+    if not report: return None
+    row = report["positions"][report["positions"]["symbol"] == normalize_symbol(symbol)]
+    return (float(row.iloc[0]["cost"]), int(row.iloc[0]["volume"])) if len(row) else None
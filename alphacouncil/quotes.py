@@ -0,0 +1,88 @@
+"""批量实时行情：腾讯接口一次请求数百个代码，整批解析为 NumPy 结构化数组。
+
+每条记录包含价格、成交与五档盘口 (bid/ask 为定长 float 数组)，
+单只股票的 dict 形式由 quote_to_dict 转换，供提示词与界面沿用原有键名。
+"""
+import concurrent.futures
+
+import numpy as np
+
+from .data import get_text, to_tencent_code
+
+QUOTE_BATCH = 200  # 每次请求的代码数 (URL 约 2KB)
+
+QUOTE_DTYPE = np.dtype([
+    ("symbol", "U8"), ("name", "U16"), ("time", "U14"),
+    ("now", "f8"), ("yestend", "f8"), ("open", "f8"), ("high", "f8"), ("low", "f8"),
+    ("volume", "f8"), ("amount", "f8"), ("turnover", "f8"),
+    ("bid_p", "f8", 5), ("bid_v", "f8", 5), ("ask_p", "f8", 5), ("ask_v", "f8", 5),
+])
+
+# 腾讯 "~" 分隔字段的下标：现价/昨收/今开/成交量(手)/最高/最低/成交额(万)/换手率
+_SCALAR_FIELDS = {"now": 3, "yestend": 4, "open": 5, "volume": 6, "high": 33, "low": 34, "amount": 37, "turnover": 38}
+_BID_P, _BID_V = [9, 11, 13, 15, 17], [10, 12, 14, 16, 18]
+_ASK_P, _ASK_V = [19, 21, 23, 25, 27], [20, 22, 24, 26, 28]
+_NUMERIC = list(_SCALAR_FIELDS.values()) + _BID_P + _BID_V + _ASK_P + _ASK_V
+_MIN_FIELDS = max(_NUMERIC) + 1
+
+
+def _float(cell):
+    try: return float(cell)
+    except ValueError: return np.nan
+
+
+def parse_quotes(content):
+    """解析腾讯批量响应文本；无效代码 (v_pv_none_match) 直接跳过"""
+    codes, fields = [], []
+    for line in content.split(";"):
+        key, sep, value = line.strip().partition('="')
+        if not sep or not key.startswith("v_") or key.startswith("v_pv_none"): continue
+        parts = value.rstrip('"').split("~")
+        if len(parts) < _MIN_FIELDS: continue
+        codes.append(key[2:])
+        fields.append(parts)
+    out = np.zeros(len(fields), dtype=QUOTE_DTYPE)
+    if not fields: return out
+    out["symbol"] = codes
+    out["name"] = [f[1] for f in fields]
+    out["time"] = [f[30] for f in fields]
+    # 所有数值列一次性转 float，空串 (停牌等) 记为 NaN；个别记录有非数字字段 (如 "-") 时逐格转换，只把这些格记为 NaN，不连累整批
+    cells = [f[i] or "nan" for f in fields for i in _NUMERIC]
+    try: num = np.array(cells, dtype=np.float64)
+    except ValueError: num = np.array([_float(c) for c in cells], dtype=np.float64)
+    num = num.reshape(len(fields), -1)
+    n = len(_SCALAR_FIELDS)
+    for j, name in enumerate(_SCALAR_FIELDS): out[name] = num[:, j]
+    out["amount"] *= 10000
+    out["bid_p"], out["bid_v"] = num[:, n:n + 5], num[:, n + 5:n + 10]
+    out["ask_p"], out["ask_v"] = num[:, n + 10:n + 15], num[:, n + 15:n + 20]
+    return out
+
+
+def _fetch_chunk(codes):
+    return parse_quotes(get_text("tencent", "/q=" + ",".join(codes), encoding="gbk"))
+
+
+def get_quotes(symbols):
+    """批量获取实时行情，返回 QUOTE_DTYPE 数组 (顺序与去重后的输入一致，查无此码的不返回)"""
+    codes = list(dict.fromkeys(to_tencent_code(s) for s in symbols))
+    chunks = [codes[i:i + QUOTE_BATCH] for i in range(0, len(codes), QUOTE_BATCH)]
+    if not chunks: return np.zeros(0, dtype=QUOTE_DTYPE)
+    if len(chunks) == 1:
+        parts = [_fetch_chunk(chunks[0])]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(chunks), 8), thread_name_prefix="quotes") as pool:
+            parts = list(pool.map(_fetch_chunk, chunks))
+    quotes = np.concatenate(parts)
+    order = {code: i for i, code in enumerate(codes)}
+    return quotes[np.argsort([order.get(s, len(order)) for s in quotes["symbol"]], kind="stable")]
+
+
+def quote_to_dict(rec):
+    """单条记录 → 与旧接口兼容的 dict (盘口为 float)"""
+    quote = {"name": str(rec["name"]), "code": str(rec["symbol"])[2:], "time": str(rec["time"])}
+    quote.update({k: float(rec[k]) for k in _SCALAR_FIELDS})
+    for i in range(5):
+        quote[f"buy{i + 1}_p"], quote[f"buy{i + 1}_v"] = float(rec["bid_p"][i]), float(rec["bid_v"][i])
+        quote[f"sell{i + 1}_p"], quote[f"sell{i + 1}_v"] = float(rec["ask_p"][i]), float(rec["ask_v"][i])
+    return quote
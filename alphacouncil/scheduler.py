@@ -0,0 +1,70 @@
+"""依赖图 (DAG) 调度器：每个节点在其依赖全部完成后立即启动，无阶段屏障。
+
+节点以协程运行在引擎的共享事件循环上 (见 engine.py)；iter_dag_events 把事件桥接回调用线程。
+"""
+import asyncio
+import queue
+from collections import defaultdict
+
+
+def validate_dag(graph):
+    """检查未知依赖与环；返回一个拓扑序列表"""
+    for node, deps in graph.items():
+        unknown = [d for d in deps if d not in graph]
+        if unknown: raise ValueError(f"节点 {node} 依赖未知节点: {unknown}")
+
+    indegree = {node: len(set(deps)) for node, deps in graph.items()}
+    children = defaultdict(list)
+    for node, deps in graph.items():
+        for d in set(deps): children[d].append(node)
+
+    order = [n for n, deg in indegree.items() if deg == 0]
+    for node in order:
+        for child in children[node]:
+            indegree[child] -= 1
+            if indegree[child] == 0: order.append(child)
+    if len(order) != len(graph):
+        raise ValueError(f"依赖图存在环: {sorted(set(graph) - set(order))}")
+    return order
+
+
+async def run_dag_async(graph, fn, emit):
+    """在当前事件循环中按依赖执行。
+
+    graph: {节点: [依赖节点, ...]}
+    fn(node, dep_results, progress): 协程；dep_results 为 {依赖节点: 结果}，progress(value) 上报中间进度
+    emit(event, node, value): 事件回调，event 为 "progress" / "done"
+    返回 {节点: 结果}；任一节点抛出异常时取消其余节点并向上抛出。
+    """
+    tasks = {}
+
+    async def run_node(node):
+        dep_results = {d: await tasks[d] for d in graph[node]}
+        result = await fn(node, dep_results, lambda value: emit("progress", node, value))
+        emit("done", node, result)
+        return result
+
+    for node in validate_dag(graph):
+        tasks[node] = asyncio.ensure_future(run_node(node))
+    try:
+        await asyncio.gather(*tasks.values())
+    finally:
+        for task in tasks.values(): task.cancel()
+    return {node: task.result() for node, task in tasks.items()}
+
+
+def iter_dag_events(graph, fn, loop):
+    """在 loop (运行于后台线程) 上执行 run_dag_async，并在调用线程中按发生顺序 yield
+    ("progress", 节点, value) 与 ("done", 节点, 结果)。生成器提前关闭时取消整个运行。"""
+    events = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(run_dag_async(graph, fn, lambda *e: events.put(e)), loop)
+    future.add_done_callback(lambda f: events.put(("finished", None, f)))
+    try:
+        while True:
+            event, node, value = events.get()
+            if event == "finished":
+                value.result()
+                return
+            yield event, node, value
+    finally:
+        future.cancel()
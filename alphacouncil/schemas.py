@@ -0,0 +1,186 @@
+"""结构化输出：每位智能体一个类型化结果 schema，模型以 JSON 模式作答，校验后渲染成与原先一致的 Markdown。
+
+DeepSeek / 通义千问走 OpenAI 兼容的 response_format=json_object (提示词里给出 JSON 样例)，Gemini 走 response_schema。
+回答先直接 json.loads，失败时做一次本地修复 (去代码围栏、截取对象、去尾随逗号)；字段按类型归一 (枚举取最接近的选项，
+数字从 "62.5元" / "65%" 中取出，文本截断到上限)。仍不合格才带着错误重问一次 (engine.call_agent)。
+缓存里存的是规范化后的 JSON；下游提示词压缩与决策入库直接读类型化字段，不再从 Markdown 里正则抽取。
+环境变量 ALPHACOUNCIL_STRUCTURED=0 关闭 (模型直接输出 Markdown)。
+"""
+import json
+import os
+import re
+from collections import namedtuple
+
+from .llm import InvalidOutputError
+
+STRUCTURED_ENABLED = os.environ.get("ALPHACOUNCIL_STRUCTURED", "1") != "0"
+
+# kind: enum (choices 之一) / text (最多 limit 字) / number (价格，>0) / percent (0-100)
+# 同一 label 的多个字段渲染时合并为一项：有 prefix 时以 "/" 连接 (买入X/卖出Y/止损Z)，否则以 "-" 连接 (区间)
+Field = namedtuple("Field", "key label kind choices limit prefix", defaults=((), 40, ""))
+SCHEMAS = {
+    "macro_analyst": (Field("rating", "宏观评级", "enum", ("宽松", "中性", "紧缩")), Field("conclusion", "核心结论", "text"),
+                      Field("policy", "政策风口", "text", limit=60)),
+    "industry_expert": (Field("leaders", "最强主线", "text", limit=30), Field("rotation", "轮动预判", "text", limit=50)),
+    "funds_analyst": (Field("intent", "资金意图", "enum", ("吸筹", "洗盘", "出货", "观望")), Field("book", "盘口密码", "text", limit=80),
+                      Field("synergy", "短线合力", "enum", ("强", "弱"))),
+    "technical_analyst": (Field("pattern", "技术形态", "enum", ("多头", "空头", "震荡")), Field("buy", "买卖区间", "number", prefix="买入"),
+                          Field("sell", "买卖区间", "number", prefix="卖出"), Field("stop", "买卖区间", "number", prefix="止损"),
+                          Field("win_rate", "胜率预估", "percent")),
+    "fundamental_analyst": (Field("valuation", "估值水位", "enum", ("低估", "合理", "泡沫")), Field("logic", "核心逻辑", "text")),
+    "manager_fundamental": (Field("grade", "基本面总评", "enum", ("S", "A", "B", "C", "D")), Field("conflict", "核心矛盾", "text"),
+                            Field("trend", "中期趋势", "enum", ("看涨", "看平", "看跌"))),
+    "manager_momentum": (Field("state", "动能状态", "enum", ("爆发", "跟随", "衰竭", "死水")), Field("probability", "爆发概率", "percent"),
+                         Field("signal", "关键信号", "text")),
+    "risk_system": (Field("crash_risk", "崩盘风险", "enum", ("低", "中", "高")), Field("drawdown", "最大回撤预警", "text", limit=60)),
+    "risk_portfolio": (Field("position", "建议仓位", "percent"), Field("stop_gap", "止损间距", "percent"), Field("liquidity", "流动性预警", "text")),
+    "general_manager": (Field("stance", "多空一致性", "enum", ("强多", "偏多", "中性", "偏空", "强空")),
+                        Field("advice", "持仓操作建议", "text", limit=120), Field("action", "最终指令", "enum", ("买入", "观望", "卖出")),
+                        Field("position", "建议仓位", "percent"), Field("buy_low", "买入区间", "number"), Field("buy_high", "买入区间", "number"),
+                        Field("sell_low", "卖出区间", "number"), Field("sell_high", "卖出区间", "number"), Field("stop", "止损红线", "number")),
+}
+# 价格可以缺省 (如观望时不给买入区间)，其余字段必填
+OPTIONAL_KINDS = ("number",)
+KIND_HINTS = {"text": "文本", "number": "数字", "percent": "0-100 的数字"}
+GM_ICONS = {"买入": "🟢", "观望": "🟡", "卖出": "🔴"}
+
+_NUM_RE = re.compile(r"-?\d+(?:\.\d+)?")
+_FORMAT_RE = re.compile(r"\n(?:输出Markdown列表|【输出结构】)")
+_PAIR_RE = re.compile(r'"(\w+)"\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?)')
+
+
+def is_structured(agent_key):
+    return agent_key in SCHEMAS
+
+
+def _hint(f):
+    if f.kind == "enum": return "|".join(f.choices)
+    return f"{f.label}{f.prefix and '(' + f.prefix + ')'}，{KIND_HINTS[f.kind]}" + (f"，{f.limit}字内" if f.kind == "text" else "")
+
+
+def json_schema(agent_key, dialect="openapi"):
+    """类型化 schema；dialect="openapi" 为 Gemini response_schema 支持的子集 (类型名大写、无 additionalProperties)"""
+    upper = dialect == "openapi"
+    prop = lambda f: ({"type": "STRING" if upper else "string", "enum": list(f.choices)} if f.kind == "enum"
+                      else {"type": "STRING" if upper else "string"} if f.kind == "text"
+                      else {"type": "NUMBER" if upper else "number"})
+    fields = SCHEMAS[agent_key]
+    schema = {"type": "OBJECT" if upper else "object", "properties": {f.key: dict(prop(f), description=_hint(f)) for f in fields},
+              "required": [f.key for f in fields if f.kind not in OPTIONAL_KINDS]}
+    if not upper: schema["additionalProperties"] = False
+    return schema
+
+
+def structured_prompt(agent_key, prompt):
+    """把系统提示词末尾的 Markdown 输出格式换成 JSON 输出说明 (OpenAI 兼容接口的 JSON 模式要求提示词中出现 json 与样例)"""
+    example = {f.key: _hint(f) if f.kind == "enum" else 0 if f.kind != "text" else "" for f in SCHEMAS[agent_key]}
+    lines = "\n".join(f"- {f.key}：{_hint(f)}" for f in SCHEMAS[agent_key])
+    return (_FORMAT_RE.split(prompt)[0].rstrip() + "\n输出格式：只输出一个 json 对象，不要 Markdown、代码块或其他文字。样例：\n"
+            + json.dumps(example, ensure_ascii=False) + f"\n字段说明：\n{lines}")
+
+
+def parse_json(text):
+    """模型回答 → dict；直接解析失败时做一次本地修复，仍失败抛出 ValueError"""
+    try: obj = json.loads(text)
+    except ValueError:
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end < start: raise ValueError("回答中没有 JSON 对象")
+        obj = json.loads(re.sub(r",\s*([}\]])", r"\1", text[start:end + 1]))
+    if not isinstance(obj, dict): raise ValueError("回答不是 JSON 对象")
+    return obj
+
+
+def _coerce(f, value):
+    """单个字段归一；无法归一抛出 ValueError"""
+    if value is None or value == "": return None
+    if f.kind == "enum":
+        s = str(value).strip()
+        if s in f.choices: return s
+        hits = [c for c in f.choices if c in s]
+        # 多个选项同时出现时取最长的 (如 "强多" 同时命中 "强"/"强多" 的场景)
+        if hits: return max(hits, key=len)
+        raise ValueError(f"{f.key} 须为 {'/'.join(f.choices)}")
+    if f.kind == "text":
+        s = re.sub(r"\s+", " ", str(value)).strip()
+        return s if len(s) <= f.limit else s[:f.limit - 1] + "…"
+    if isinstance(value, bool): raise ValueError(f"{f.key} 须为数字")
+    if isinstance(value, (int, float)): x = float(value)
+    else:
+        m = _NUM_RE.search(str(value))
+        if not m: raise ValueError(f"{f.key} 须为数字")
+        x = float(m.group())
+    if f.kind == "percent" and not 0 <= x <= 100: raise ValueError(f"{f.key} 须在 0-100 之间")
+    if f.kind == "number" and x <= 0: return None  # 0 视为未给出
+    return x
+
+
+def validate(agent_key, obj):
+    """dict → (归一后的字段, 错误列表)；未知字段丢弃"""
+    data, errors = {}, []
+    for f in SCHEMAS[agent_key]:
+        try: data[f.key] = _coerce(f, obj.get(f.key))
+        except ValueError as e:
+            data[f.key] = None
+            errors.append(str(e))
+            continue
+        if data[f.key] is None and f.kind not in OPTIONAL_KINDS: errors.append(f"缺少 {f.key}")
+    return data, errors
+
+
+def canonical(agent_key, text):
+    """模型回答 → 规范化 JSON 文本 (写入缓存)；不合格 (含空回答) 抛出 InvalidOutputError (说明错误，供重问)"""
+    if not isinstance(text, str) or not text.strip(): raise InvalidOutputError("输出为空")
+    try: obj = parse_json(text)
+    except ValueError as e: raise InvalidOutputError(f"输出不是合法 JSON: {e}") from e
+    data, errors = validate(agent_key, obj)
+    if errors: raise InvalidOutputError("；".join(errors))
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def _fmt(f, v):
+    if f.kind == "percent": return f"{v:g}%"
+    if f.kind == "number": return f"{f.prefix}{v:g}"
+    return str(v)
+
+
+def labeled_fields(agent_key, data):
+    """类型化结果 → {中文字段名: 取值文本} (与 Markdown 报告的字段名一致，供压缩与渲染)"""
+    groups = {}
+    for f in SCHEMAS[agent_key]:
+        v = data.get(f.key)
+        if v is not None: groups.setdefault(f.label, []).append(_fmt(f, v))
+    return {label: ("/" if any(f.prefix for f in SCHEMAS[agent_key] if f.label == label) else "-").join(dict.fromkeys(vals))
+            for label, vals in groups.items()}
+
+
+def render_markdown(agent_key, data):
+    """类型化结果 → 与自由文本模式相同版式的 Markdown (GM 为分节格式，其余为字段列表)"""
+    fields = labeled_fields(agent_key, data)
+    if agent_key != "general_manager": return "\n".join(f"- **{k}**：{v}" for k, v in fields.items())
+    action = fields.get("最终指令")
+    sections = [("### 📊 多空一致性", fields.get("多空一致性")), ("### 💡 持仓操作建议", fields.get("持仓操作建议")),
+                ("### 🧭 最终指令", action and f"【{GM_ICONS.get(action, '')} {action}】"), ("### 📌 建议仓位", fields.get("建议仓位") and f"【{fields['建议仓位']}】")]
+    out = [f"{head}\n{body}" for head, body in sections if body]
+    points = [f"- **{k}：** {fields[k]}" for k in ("买入区间", "卖出区间") if k in fields]
+    if points: out.append("### 📈 实战点位\n" + "\n".join(points))
+    if "止损红线" in fields: out.append(f"### 🛑 止损红线\n- **价格：** {fields['止损红线']}")
+    return "\n".join(out)
+
+
+def preview(agent_key, partial):
+    """流式输出中的半截 JSON → 已完整输出的字段渲染成 Markdown (逐字段出现在卡片上)"""
+    obj = {}
+    for key, raw in _PAIR_RE.findall(partial):
+        try: obj[key] = json.loads(raw)
+        except ValueError: continue
+    data = {}
+    for f in SCHEMAS[agent_key]:
+        try: data[f.key] = _coerce(f, obj.get(f.key))
+        except ValueError: data[f.key] = None
+    return render_markdown(agent_key, data)
+
+
+def from_canonical(agent_key, text):
+    """缓存 / 校验后的规范 JSON → (类型化字段, Markdown)"""
+    data = json.loads(text)
+    return data, render_markdown(agent_key, data)
@@ -0,0 +1,143 @@
+"""全市场初筛：批量拉取全部 A 股实时行情，向量化过滤与打分，只把前 N 只送进委员会 (模型调用量与 N 成正比，与全市场规模无关)。
+
+标的池来自离线代码索引 (symbols.py)，行情按 QUOTE_BATCH 分批并发请求 (约 5000 只 → 25 个请求)，
+整表经共享行情缓存，多个会话同时扫描只请求一次。过滤与排名全部在 QUOTE_DTYPE 数组上按列计算：
+成交额、换手率、涨跌幅、跳空 (今开相对昨收)、日内振幅、五档委比；可选的技术条件只对打分靠前的候选加载日K计算。
+"""
+import time
+
+import numpy as np
+
+from .indicators import compute_daily_batch
+
+DEFAULT_TOP = 10
+MIN_AMOUNT = 1e8  # 元；成交额过小的标的流动性不足
+RANK_WEIGHTS = {"amount": 1.0, "turnover": 1.0, "pct": 1.0, "imbalance": 0.5, "range": 0.5}
+FEATURES = ("pct", "gap", "range", "amount", "turnover", "imbalance")
+SHORTLIST_FACTOR = 5  # 有技术条件时，先按行情打分取 top × 此倍数再加载日K
+INDICATOR_LENGTH = 120
+# 技术条件：名称 → (说明, 在最新一根K线的指标上求值)
+RULES = {
+    "ma_bull": ("均线多头排列", lambda d: (d["ma5"] > d["ma10"]) & (d["ma10"] > d["ma20"])),
+    "above_ma20": ("站上20日线", lambda d: d["close"] > d["ma20"]),
+    "macd_bull": ("DIF 在 DEA 之上", lambda d: d["macd_dif"] > d["macd_dea"]),
+    "rsi_ok": ("RSI6 未超买 (<80)", lambda d: d["rsi6"] < 80),
+    "volume_surge": ("量比 > 1.5", lambda d: d["vol_ratio"] > 1.5),
+    "breakout20": ("创 20 日新高", lambda d: d["close"] >= d["high20"]),
+}
+
+
+def universe(kinds=("stock",)):
+    """离线索引中的标的代码；索引尚未生成时同步构建一次 (数秒)"""
+    from .symbols import get_symbol_index, refresh_snapshot
+    index = get_symbol_index() or refresh_snapshot()
+    return [e.symbol for e in index.entries if e.kind in kinds]
+
+
+def scan_quotes(kinds=("stock",)):
+    """全市场实时行情 (QUOTE_DTYPE 数组)，经共享行情缓存 (盘中约 2 秒内复用)"""
+    from .market_cache import get_market_cache
+    from .quotes import get_quotes
+    return get_market_cache().get("quote", "universe:" + ",".join(kinds), lambda: get_quotes(universe(kinds)))
+
+
+def price_limit(symbols, names):
+    """涨跌停幅度 (%)：科创板 / 创业板 20，ST 5，其余 10"""
+    symbols, names = np.asarray(symbols, dtype=str), np.asarray(names, dtype=str)
+    wide = np.char.startswith(symbols, "sh688") | np.char.startswith(symbols, "sz30")
+    st = np.char.find(np.char.upper(names), "ST") >= 0
+    return np.where(wide, 20.0, np.where(st, 5.0, 10.0))
+
+
+def quote_features(quotes):
+    """行情数组 → {特征: 向量}：涨跌幅 / 跳空 / 振幅 (%)、成交额 (元)、换手率 (%)、委比 (-1~1) 及 停牌 / 涨停 / 跌停 / ST 标记"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        yest = np.where(quotes["yestend"] > 0, quotes["yestend"], np.nan)
+        now = np.where(quotes["now"] > 0, quotes["now"], np.nan)
+        opened = np.where(quotes["open"] > 0, quotes["open"], np.nan)
+        bid, ask = np.nansum(quotes["bid_v"], axis=1), np.nansum(quotes["ask_v"], axis=1)
+        limit = price_limit(quotes["symbol"], quotes["name"])
+        return {
+            "pct": (now / yest - 1) * 100, "gap": (opened / yest - 1) * 100, "range": (quotes["high"] - quotes["low"]) / yest * 100,
+            "amount": quotes["amount"], "turnover": quotes["turnover"],
+            "imbalance": np.where(bid + ask > 0, (bid - ask) / (bid + ask), 0.0),
+            "suspended": ~(quotes["volume"] > 0) | np.isnan(now),
+            # 价格按分取整后与涨跌停价比较
+            "limit_up": now >= np.round(yest * (1 + limit / 100), 2) - 0.005,
+            "limit_down": now <= np.round(yest * (1 - limit / 100), 2) + 0.005,
+            "st": limit == 5.0,
+        }
+
+
+def pct_rank(values):
+    """截面分位 (0~1，NaN 记 0)"""
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64), nan=-np.inf)
+    if len(values) < 2: return np.ones(len(values))
+    return values.argsort(kind="stable").argsort() / (len(values) - 1)
+
+
+def score(features, mask, weights=None):
+    """通过过滤的标的按各特征的截面分位加权求和打分；未通过的为 -inf"""
+    weights = RANK_WEIGHTS if weights is None else weights
+    out = np.full(len(mask), -np.inf)
+    if mask.any(): out[mask] = sum(w * pct_rank(features[f][mask]) for f, w in weights.items() if w)
+    return out
+
+
+def apply_rules(symbols, rules):
+    """对候选加载日K并计算技术条件 → {条件: 布尔向量}；K线取不到的标的视为不满足"""
+    from .kline_store import BAR_DTYPE, load_bars_batch
+    bars = [b if b is not None else np.zeros(0, dtype=BAR_DTYPE) for b in load_bars_batch(list(symbols))]
+    if not bars: return {r: np.zeros(0, dtype=bool) for r in rules}
+    daily = compute_daily_batch(bars, INDICATOR_LENGTH)
+    last = {k: v[:, -1] for k, v in daily.items()}
+    has_bars = np.array([len(b) > 1 for b in bars])
+    with np.errstate(invalid="ignore"):
+        return {r: RULES[r][1](last) & has_bars for r in rules}
+
+
+def screen(top=DEFAULT_TOP, min_amount=MIN_AMOUNT, min_turnover=0.0, pct_range=(None, None), max_gap=None,
+           exclude_st=True, exclude_limit_up=True, rules=(), weights=None, kinds=("stock",), quotes=None):
+    """全市场初筛 → {candidates: DataFrame (按得分降序，至多 top 行), universe, passed, elapsed_ms}
+
+    pct_range 为涨跌幅 (%) 上下限，max_gap 为跳空幅度绝对值上限 (%)；rules 为 RULES 中的技术条件名 (全部满足才保留)。
+    涨停无法买入、ST 风险高，默认排除；停牌一律排除。quotes 可直接传入行情数组 (跳过拉取)。
+    """
+    import pandas as pd
+    unknown = set(rules) - set(RULES)
+    if unknown: raise ValueError(f"未知技术条件: {', '.join(sorted(unknown))} (可用: {', '.join(RULES)})")
+    t0 = time.perf_counter()
+    quotes = scan_quotes(kinds) if quotes is None else quotes
+    f = quote_features(quotes)
+    with np.errstate(invalid="ignore"):
+        mask = ~f["suspended"] & (np.nan_to_num(f["amount"]) >= min_amount) & (np.nan_to_num(f["turnover"]) >= min_turnover)
+        lo, hi = pct_range
+        if lo is not None: mask &= f["pct"] >= lo
+        if hi is not None: mask &= f["pct"] <= hi
+        if max_gap is not None: mask &= np.abs(f["gap"]) <= max_gap
+    if exclude_st: mask &= ~f["st"]
+    if exclude_limit_up: mask &= ~f["limit_up"]
+    passed = int(mask.sum())
+    s = score(f, mask, weights)
+    order = np.argsort(-s, kind="stable")[:passed]
+    flags = {}
+    if rules:
+        # 技术条件需要日K：只对行情打分靠前的一批计算
+        order = order[:max(top * SHORTLIST_FACTOR, top)]
+        flags = apply_rules(quotes["symbol"][order], rules)
+        keep = np.logical_and.reduce(list(flags.values()))
+        order, flags = order[keep], {r: v[keep] for r, v in flags.items()}
+    order = order[:top]
+    candidates = pd.DataFrame({"symbol": quotes["symbol"][order], "name": quotes["name"][order], "now": quotes["now"][order],
+                               **{k: f[k][order] for k in FEATURES}, "score": s[order]})
+    for r, v in flags.items(): candidates[r] = v[:top]
+    return {"candidates": candidates, "universe": len(quotes), "passed": passed, "elapsed_ms": (time.perf_counter() - t0) * 1000}
+
+
+def screen_text(result):
+    """命令行 / 日志用的候选摘要"""
+    c = result["candidates"]
+    head = f"全市场 {result['universe']} 只 → 过滤后 {result['passed']} 只 → 候选 {len(c)} 只 ({result['elapsed_ms']:.0f} ms)"
+    rows = [f"{i + 1:>2}. {r.symbol} {r.name} 现价 {r.now:.2f} 涨跌 {r.pct:+.2f}% 跳空 {r.gap:+.2f}% 振幅 {r.range:.2f}% "
+            f"成交 {r.amount / 1e8:.1f}亿 换手 {r.turnover:.2f}% 委比 {r.imbalance:+.2f} 得分 {r.score:.2f}" for i, r in enumerate(c.itertuples())]
+    return "\n".join([head] + rows)
@@ -0,0 +1,188 @@
+"""离线证券代码索引：代码 / 名称 / 全拼 / 拼音首字母前缀检索，不依赖第三方联想接口。
+
+快照从东方财富列表接口构建，保存为数据目录下的 symbols.json；过期后在后台线程刷新，
+刷新期间继续使用旧快照。拼音依赖可选的 pypinyin，未安装时只支持代码与名称检索。
+"""
+import concurrent.futures
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from .data import DataError, LIST_PAGE_SIZE, get_json
+from .paths import data_path
+
+# 沪深主板 / 创业板 / 科创板 + 沪深 ETF (北交所、港股的行情代码规则不同，暂不收录)
+SNAPSHOT_BOARDS = {
+    "stock": "m:0+t:6,m:0+t:80,m:1+t:2,m:1+t:23",
+    "etf": "b:MK0021,b:MK0022,b:MK0023,b:MK0024",
+}
+SNAPSHOT_MAX_AGE = 7 * 86400
+SNAPSHOT_VERSION = 1
+
+# 匹配类型越靠前排名越高
+MATCH_RANK = {"exact": 0, "code": 1, "initials": 2, "name": 3, "pinyin": 4, "contains": 5}
+
+SymbolEntry = namedtuple("SymbolEntry", "symbol code name market kind pinyin initials")
+
+
+def _pinyin(name):
+    """返回 (全拼, 首字母)；未安装 pypinyin 时返回空串"""
+    try:
+        from pypinyin import Style, lazy_pinyin
+    except ImportError:
+        return "", ""
+    full = lazy_pinyin(name, errors="ignore")
+    initials = lazy_pinyin(name, style=Style.FIRST_LETTER, errors="ignore")
+    return "".join(full).lower(), "".join(initials).lower()
+
+
+def _fetch_board(fs):
+    """分页拉取一个板块的 (代码, 名称, 市场)；首页拿到总数后其余页并发获取"""
+    def page(pn):
+        params = {"pn": pn, "pz": LIST_PAGE_SIZE, "po": "1", "np": "1", "fltt": "2", "invt": "2", "fid": "f12", "fs": fs, "fields": "f12,f13,f14"}
+        return (get_json("eastmoney_list", "/api/qt/clist/get", params=params) or {}).get("data") or {}
+
+    first = page(1)
+    pages = [first.get("diff") or []]
+    total = first.get("total", 0)
+    rest = range(2, -(-total // LIST_PAGE_SIZE) + 1)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="symbols") as pool:
+        pages += [(data.get("diff") or []) for data in pool.map(page, rest)]
+    return [(row["f12"], row["f14"], row["f13"]) for rows in pages for row in rows]
+
+
+def build_snapshot():
+    """从东方财富构建全市场快照 {"version", "built_at", "rows": [[symbol, code, name, market, kind, pinyin, initials], ...]}"""
+    rows, seen = [], set()
+    for kind, fs in SNAPSHOT_BOARDS.items():
+        for code, name, market in _fetch_board(fs):
+            symbol = f"{'sh' if market == 1 else 'sz'}{code}"
+            if symbol in seen or not name or name == "-": continue
+            seen.add(symbol)
+            rows.append([symbol, code, name, market, kind, *_pinyin(name)])
+    if not rows: raise DataError("eastmoney_list", "empty", "证券列表为空")
+    return {"version": SNAPSHOT_VERSION, "built_at": time.time(), "rows": rows}
+
+
+class SymbolIndex:
+    """按代码 / 名称 / 全拼 / 首字母分别建有序键表，前缀检索为 bisect + 顺序扫描"""
+
+    def __init__(self, rows, built_at=0.0):
+        self.built_at = built_at
+        self.entries = [SymbolEntry(*row) for row in rows]
+        self._by_symbol = {e.symbol: e for e in self.entries}
+        self._names = [e.name.lower() for e in self.entries]
+        self._code_pos = {}  # 纯数字代码 -> 条目序号 (沪深同号时保留先出现的股票)
+        for i, e in enumerate(self.entries): self._code_pos.setdefault(e.code, i)
+        self._keys = {}
+        for field in ("symbol", "code", "name", "pinyin", "initials"):
+            pairs = sorted((getattr(e, field).lower(), i) for i, e in enumerate(self.entries) if getattr(e, field))
+            self._keys[field] = ([k for k, _ in pairs], [i for _, i in pairs])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, symbol):
+        """按代码 (600276 / sh600276) 精确查找"""
+        symbol = symbol.strip().lower()
+        if symbol in self._by_symbol: return self._by_symbol[symbol]
+        i = self._code_pos.get(symbol)
+        return None if i is None else self.entries[i]
+
+    def _prefix(self, field, prefix, limit):
+        keys, ids = self._keys[field]
+        start = bisect_left(keys, prefix)
+        out = []
+        for k in range(start, min(start + limit, len(keys))):
+            if not keys[k].startswith(prefix): break
+            out.append(ids[k])
+        return out
+
+    def search(self, query, limit=10):
+        """返回按相关度排序的 SymbolEntry 列表"""
+        q = query.strip().lower()
+        if not q: return []
+        # 带市场前缀的代码只在该市场内按前缀匹配 (输入中的 "sh60" 也给候选)，不回退到纯数字代码 (sh000001 是上证指数，不是 sz000001)
+        if q[:2] in ("sh", "sz") and q[2:].isdigit():
+            ids = self._prefix("symbol", q, max(limit * 4, 50))
+            ranked = sorted(ids, key=lambda i: (self.entries[i].symbol != q, self.entries[i].kind != "stock", self.entries[i].symbol))
+            return [self.entries[i] for i in ranked[:limit]]
+        scan = max(limit * 4, 50)
+        best = {}  # 条目序号 -> (匹配类型排名, 命中键长度)
+
+        def hit(i, match, key_len):
+            score = (MATCH_RANK[match], key_len)
+            if i not in best or score < best[i]: best[i] = score
+
+        if q in self._code_pos: hit(self._code_pos[q], "exact", 0)
+        if q.isdigit():
+            for i in self._prefix("code", q, scan): hit(i, "code", len(self.entries[i].code))
+        else:
+            for i in self._prefix("name", q, scan): hit(i, "exact" if self.entries[i].name.lower() == q else "name", len(self.entries[i].name))
+            if q.isascii():
+                for i in self._prefix("initials", q, scan): hit(i, "initials", len(self.entries[i].initials))
+                for i in self._prefix("pinyin", q, scan): hit(i, "pinyin", len(self.entries[i].pinyin))
+            elif len(best) < limit:
+                # 中文名中间的片段 (如 "茅台")：全表扫描，约数千条仍在亚毫秒级
+                for i in [i for i, name in enumerate(self._names) if q in name]: hit(i, "contains", len(self._names[i]))
+        # 同等匹配时股票优先于 ETF，名称短者优先
+        ranked = sorted(best, key=lambda i: (best[i], self.entries[i].kind != "stock", self.entries[i].code))
+        return [self.entries[i] for i in ranked[:limit]]
+
+
+_index = None
+_index_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+
+def _snapshot_path():
+    return data_path("symbols.json")
+
+
+def refresh_snapshot():
+    """重建快照并原子替换磁盘文件与内存索引"""
+    global _index
+    snapshot = build_snapshot()
+    path = _snapshot_path()
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(snapshot, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(path)
+    index = SymbolIndex(snapshot["rows"], snapshot["built_at"])
+    with _index_lock: _index = index
+    return index
+
+
+def _refresh_in_background():
+    if not _refresh_lock.acquire(blocking=False): return  # 已有刷新在进行
+
+    def run():
+        try: refresh_snapshot()
+        except DataError: pass  # 下次访问再试，期间回退到旧快照或在线联想
+        finally: _refresh_lock.release()
+
+    threading.Thread(target=run, name="symbol-snapshot", daemon=True).start()
+
+
+def get_symbol_index(refresh=True):
+    """进程级索引，首次访问时读取快照；快照缺失或过期时后台刷新。尚无可用快照时返回 None"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            path = _snapshot_path()
+            if path.exists():
+                try:
+                    snapshot = json.loads(path.read_text(encoding="utf-8"))
+                    if snapshot.get("version") == SNAPSHOT_VERSION: _index = SymbolIndex(snapshot["rows"], snapshot["built_at"])
+                except (ValueError, KeyError, TypeError):
+                    pass
+        index = _index
+    if refresh and (index is None or time.time() - index.built_at > SNAPSHOT_MAX_AGE): _refresh_in_background()
+    return index
+
+
+def search_symbols(query, limit=10):
+    """离线联想候选；索引尚未就绪时返回空列表"""
+    index = get_symbol_index()
+    return index.search(query, limit) if index else []
@@ -0,0 +1,178 @@
+"""运行埋点：行情获取 / 智能体 / 每次模型调用的耗时、token 用量、重试与错误。
+
+每次委员会运行对应一个 Trace，各阶段用 span() 计时，模型返回的 usage 通过 note() 记到当前 span 上。
+当前 Trace / span 放在 contextvars 中：引擎循环里每个智能体是独立的 Task，线程池任务需 copy_context。
+所有 span 同时汇入进程级聚合 (p50/p95、token 合计)，运行结束时写入数据目录：
+    telemetry/spans.jsonl   每个 span 一行
+    telemetry/metrics.prom  Prometheus 文本格式的聚合指标 (可被 node_exporter textfile 采集)
+环境变量 ALPHACOUNCIL_TELEMETRY=0 关闭落盘 (内存中的时间线与聚合不受影响)。
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from .paths import data_path
+
+SAMPLE_WINDOW = 2048  # 每个指标保留最近 N 个耗时样本用于分位数
+QUANTILES = (0.5, 0.95)
+
+_current_trace = contextvars.ContextVar("alphacouncil_trace", default=None)
+_current_span = contextvars.ContextVar("alphacouncil_span", default=None)
+
+
+class Trace:
+    """一次运行的全部 span；线程安全"""
+
+    def __init__(self, label=""):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock: self.spans.append(span)
+
+    def snapshot(self):
+        with self._lock: return [dict(s) for s in self.spans]
+
+    def summary(self):
+        """{elapsed_ms, tokens_in, tokens_out, prompt_tokens, prompt_tokens_raw, ttft_ms, retries, errors}
+
+        tokens_in / tokens_out 来自模型 usage；prompt_tokens(_raw) 为各智能体提示词的本地估算 (压缩后 / 压缩前)；
+        ttft_ms 为 {智能体: 最后一次尝试的首字延迟} (仅流式调用有)。
+        """
+        spans = self.snapshot()
+        llm = [s for s in spans if s["kind"] == "llm"]
+        agents = [s for s in spans if s["kind"] == "agent"]
+        return {"elapsed_ms": round((time.perf_counter() - self.t0) * 1000, 1),
+                "tokens_in": sum(s.get("tokens_in") or 0 for s in llm),
+                "tokens_out": sum(s.get("tokens_out") or 0 for s in llm),
+                "prompt_tokens": sum(s.get("prompt_tokens") or 0 for s in agents),
+                "prompt_tokens_raw": sum(s.get("prompt_tokens_raw") or 0 for s in agents),
+                "ttft_ms": {s["agent"]: s["ttft_ms"] for s in sorted(llm, key=lambda s: s.get("attempt", 0)) if s.get("ttft_ms") and s.get("agent")},
+                "retries": sum(1 for s in llm if s.get("attempt", 0) > 0),
+                "errors": sum(1 for s in spans if s["status"] == "error")}
+
+    def finish(self):
+        """运行结束：写 JSONL 与 Prometheus 文本"""
+        if os.environ.get("ALPHACOUNCIL_TELEMETRY", "1") == "0": return
+        spans = self.snapshot()
+        try:
+            with open(data_path("telemetry", "spans.jsonl"), "a", encoding="utf-8") as f:
+                for s in spans: f.write(json.dumps({"run": self.run_id, "label": self.label, **s}, ensure_ascii=False) + "\n")
+            get_metrics().write_prometheus(data_path("telemetry", "metrics.prom"))
+        except OSError:
+            pass  # 埋点落盘失败不影响分析本身
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def use_trace(trace):
+    """在当前上下文 (线程或 Task) 中设定 Trace"""
+    token = _current_trace.set(trace)
+    try: yield trace
+    finally: _current_trace.reset(token)
+
+
+@contextmanager
+def span(kind, name, **attrs):
+    """计时一个阶段；异常会记为 status=error (被取消记为 cancelled，如对冲请求的落败方) 后继续抛出。
+    无论有无 Trace 都计入进程级聚合"""
+    trace = _current_trace.get()
+    t0 = time.perf_counter()
+    record = {"kind": kind, "name": name, "status": "ok", **attrs}
+    record["start_ms"] = round((t0 - trace.t0) * 1000, 1) if trace else 0.0
+    token = _current_span.set(record)
+    try:
+        yield record
+    except BaseException as e:
+        record["status"] = "cancelled" if type(e).__name__ == "CancelledError" else "error"
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        record["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        if trace: trace.add(record)
+        get_metrics().observe(record)
+
+
+def note(**attrs):
+    """给当前 span 补充字段 (如 tokens_in / tokens_out / ttft_ms / cache)；不在 span 内时忽略"""
+    record = _current_span.get()
+    if record is not None: record.update({k: v for k, v in attrs.items() if v is not None})
+
+
+class Metrics:
+    """进程级聚合：按 (kind, name, provider) 统计耗时与首字延迟样本、次数、错误与 token (被取消的 span 不计入)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, record):
+        if record["status"] == "cancelled": return
+        key = (record["kind"], record["name"], record.get("provider") or "")
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = {"samples": deque(maxlen=SAMPLE_WINDOW), "ttft": deque(maxlen=SAMPLE_WINDOW),
+                                         "count": 0, "errors": 0, "tokens_in": 0, "tokens_out": 0}
+            s["samples"].append(record["ms"])
+            if record.get("ttft_ms"): s["ttft"].append(record["ttft_ms"])
+            s["count"] += 1
+            if record["status"] != "ok": s["errors"] += 1
+            s["tokens_in"] += record.get("tokens_in") or 0
+            s["tokens_out"] += record.get("tokens_out") or 0
+
+    def quantile(self, kind, name, provider="", q=0.95, field="ms", min_samples=1):
+        """某指标最近样本的分位数 (毫秒)；field 为 "ms" (总耗时) 或 "ttft_ms" (首字)，样本不足返回 None"""
+        import numpy as np
+        with self._lock:
+            s = self._series.get((kind, name, provider))
+            samples = list(s["ttft" if field == "ttft_ms" else "samples"]) if s else []
+        return float(np.quantile(samples, q)) if len(samples) >= min_samples else None
+
+    def report(self):
+        """[{kind, name, provider, count, errors, p50_ms, p95_ms, tokens_in, tokens_out}, ...]"""
+        import numpy as np
+        with self._lock:
+            items = [(k, dict(s, samples=list(s["samples"]), ttft=None)) for k, s in self._series.items()]
+        rows = []
+        for (kind, name, provider), s in sorted(items):
+            p50, p95 = np.percentile(s["samples"], [q * 100 for q in QUANTILES]) if s["samples"] else (None, None)
+            rows.append({"kind": kind, "name": name, "provider": provider, "count": s["count"], "errors": s["errors"],
+                         "p50_ms": p50, "p95_ms": p95, "tokens_in": s["tokens_in"], "tokens_out": s["tokens_out"]})
+        return rows
+
+    def write_prometheus(self, path):
+        lines = ["# TYPE alphacouncil_span_latency_ms summary", "# TYPE alphacouncil_span_errors_total counter",
+                 "# TYPE alphacouncil_tokens_total counter"]
+        for row in self.report():
+            labels = f'kind="{row["kind"]}",name="{row["name"]}",provider="{row["provider"]}"'
+            for q, v in zip(QUANTILES, (row["p50_ms"], row["p95_ms"])):
+                if v is not None: lines.append(f'alphacouncil_span_latency_ms{{{labels},quantile="{q}"}} {v:.1f}')
+            lines.append(f"alphacouncil_span_latency_ms_count{{{labels}}} {row['count']}")
+            lines.append(f"alphacouncil_span_errors_total{{{labels}}} {row['errors']}")
+            if row["tokens_in"] or row["tokens_out"]:
+                lines.append(f'alphacouncil_tokens_total{{{labels},direction="in"}} {row["tokens_in"]}')
+                lines.append(f'alphacouncil_tokens_total{{{labels},direction="out"}} {row["tokens_out"]}')
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        tmp.replace(path)
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
@@ -0,0 +1 @@
+"""离线压测：本地替身行情源 / 模型接口 + 并发用户驱动，见 bench/run.py。"""
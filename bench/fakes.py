@@ -0,0 +1,234 @@
+"""本地替身服务：一个 HTTP/1.1 (keep-alive) 服务同时扮演行情源与三家模型接口。
+
+    /q=sh600276,sz000001                     腾讯实时行情 (GBK)
+    /api/qt/stock/kline/get                  东方财富日K
+    /api/qt/stock/trends2/get                东方财富分时
+    /api/qt/clist/get                        东方财富列表
+    /suggest/...                             新浪联想 (GBK)
+    /<provider>/chat/completions             OpenAI 兼容 (DeepSeek / Qwen)，支持 SSE 流式、usage 与 json_object
+    /v1beta/models/<m>:generateContent       Gemini REST (含 :streamGenerateContent?alt=sse 与 responseSchema)
+
+延迟按对数正态分布抽样 (中位数 + sigma)，模型接口另有首字延迟与逐 token 间隔；
+按 error_rate 随机返回 429 (带 Retry-After) 或 503。
+"""
+import json
+import math
+import re
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from . import payloads
+
+
+@dataclass
+class Latency:
+    """对数正态延迟：median 秒，sigma 为 ln 空间标准差"""
+    median: float = 0.0
+    sigma: float = 0.0
+
+    def sample(self, rng):
+        if self.median <= 0: return 0.0
+        return self.median * math.exp(rng.gauss(0, self.sigma)) if self.sigma else self.median
+
+
+@dataclass
+class FakeProfile:
+    data_latency: Latency = field(default_factory=lambda: Latency(0.03, 0.5))
+    llm_ttft: Latency = field(default_factory=lambda: Latency(0.4, 0.6))
+    llm_token_interval: float = 0.005
+    llm_tokens: int = 120
+    data_error_rate: float = 0.0
+    llm_error_rate: float = 0.0
+    retry_after: float = 1.0
+    seed: int = 7
+    fixtures: Path = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "AlphaCouncilFake/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def profile(self):
+        return self.server.profile
+
+    def _rng(self):
+        with self.server.rng_lock: return random.Random(self.server.rng.random())
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items(): self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _maybe_fail(self, rng, rate):
+        """按错误率注入 429 / 503；已响应返回 True"""
+        if rate <= 0 or rng.random() >= rate: return False
+        if rng.random() < 0.5:
+            self._send(429, b'{"error": {"message": "rate limited", "type": "rate_limit_error"}}', headers={"Retry-After": str(self.profile.retry_after)})
+        else:
+            self._send(503, b'{"error": {"message": "overloaded", "type": "server_error"}}')
+        self.server.count("errors")
+        return True
+
+    def _fixture(self, route):
+        fixtures = self.profile.fixtures
+        path = fixtures / f"{route}.txt" if fixtures else None
+        return path.read_bytes() if path and path.exists() else None
+
+    # --- 行情源 -------------------------------------------------------------
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        rng = self._rng()
+        self.server.count("data")
+        time.sleep(self.profile.data_latency.sample(rng))
+        if self._maybe_fail(rng, self.profile.data_error_rate): return
+        if url.path.startswith("/q="):
+            body = self._fixture("tencent") or payloads.tencent_quotes(url.path[3:].split(","))
+            return self._send(200, body, "text/html; charset=GBK")
+        if url.path == "/api/qt/stock/kline/get":
+            return self._send(200, self._fixture("kline") or payloads.klines(params.get("secid", "1.600000"), params.get("beg", "0")))
+        if url.path == "/api/qt/stock/trends2/get":
+            return self._send(200, self._fixture("trends") or payloads.trends(params.get("secid", "1.600000")))
+        if url.path == "/api/qt/clist/get":
+            return self._send(200, self._fixture("clist") or payloads.clist(int(params.get("pn", 1)), int(params.get("pz", 100)),
+                                                                         ascending=params.get("po") == "0"))
+        if url.path.startswith("/suggest/"):
+            key = url.path.split("key=")[-1].split("&")[0]
+            return self._send(200, self._fixture("sina") or payloads.sina_suggest(key), "text/html; charset=GBK")
+        self._send(404, b"{}")
+
+    # --- 模型接口 -----------------------------------------------------------
+    def do_POST(self):
+        url = urlsplit(self.path)
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        rng = self._rng()
+        self.server.count("llm")
+        time.sleep(self.profile.llm_ttft.sample(rng))
+        if self._maybe_fail(rng, self.profile.llm_error_rate): return
+        if url.path.endswith("/chat/completions"): return self._openai(request, rng)
+        if ":generateContent" in url.path or ":streamGenerateContent" in url.path:
+            return self._gemini(request, ":streamGenerateContent" in url.path)
+        self._send(404, b"{}")
+
+    def _tokens(self, system=""):
+        """按系统提示词里的 **字段名** 逐项作答 (与真实模型的输出格式一致)，共 llm_tokens 段"""
+        labels = re.findall(r"\*\*([^*\n:：]{1,16})[:：]?\*\*", system) or ["要点"]
+        per = max(1, self.profile.llm_tokens // len(labels))
+        tokens = []
+        for label in labels:
+            tokens.append(f"- **{label}**：")
+            tokens += [f"分析{i}，" for i in range(per - 1)] + ["。\n"]
+        return tokens
+
+    def _json_tokens(self, example):
+        """JSON 模式：按样例 / schema 的字段作答 (枚举取第一个选项，数字给 50，文本填充)，切成约 llm_tokens 段"""
+        texts = [k for k, v in example.items() if isinstance(v, str) and "|" not in v]
+        filler = max(1, (self.profile.llm_tokens - 2 * len(example)) // max(1, len(texts)))
+        answer = {k: v.split("|")[0] if isinstance(v, str) and "|" in v else "".join(f"分析{i}，" for i in range(filler)) if isinstance(v, str) else 50
+                  for k, v in example.items()}
+        text = json.dumps(answer, ensure_ascii=False)
+        step = max(1, len(text) // self.profile.llm_tokens)
+        return [text[i:i + step] for i in range(0, len(text), step)]
+
+    @staticmethod
+    def _prompt_example(system):
+        """从系统提示词的 "样例：" 行取出 JSON 样例"""
+        m = re.search(r"样例：\n(\{.*\})", system)
+        return json.loads(m.group(1)) if m else {"要点": ""}
+
+    def _stream(self, events):
+        """SSE，按 chunked 编码逐条写出 (保持 keep-alive)"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, event in enumerate(events):
+            if i: time.sleep(self.profile.llm_token_interval)
+            data = f"data: {event}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _openai(self, request, rng):
+        system = "".join(m.get("content", "") for m in request.get("messages", []) if m.get("role") == "system")
+        json_mode = (request.get("response_format") or {}).get("type") == "json_object"
+        tokens = self._json_tokens(self._prompt_example(system)) if json_mode else self._tokens(system)
+        prompt_tokens = sum(len(m.get("content", "")) for m in request.get("messages", [])) // 2
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+        base = {"id": f"chatcmpl-{rng.getrandbits(32):x}", "created": int(time.time()), "model": request.get("model", "fake")}
+        if not request.get("stream"):
+            time.sleep(self.profile.llm_token_interval * len(tokens))
+            body = dict(base, object="chat.completion", usage=usage,
+                        choices=[{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}])
+            return self._send(200, json.dumps(body, ensure_ascii=False).encode())
+        chunk = dict(base, object="chat.completion.chunk")
+        events = [json.dumps(dict(chunk, choices=[{"index": 0, "delta": {"content": t}, "finish_reason": None}]), ensure_ascii=False) for t in tokens]
+        events.append(json.dumps(dict(chunk, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])))
+        if (request.get("stream_options") or {}).get("include_usage"): events.append(json.dumps(dict(chunk, choices=[], usage=usage)))
+        self._stream(events + ["[DONE]"])
+
+    def _gemini(self, request, stream):
+        prompt = "".join(p.get("text", "") for c in request.get("contents", []) for p in c.get("parts", []))
+        config = request.get("generationConfig") or request.get("generation_config") or {}
+        schema = config.get("responseSchema") or config.get("response_schema")
+        if schema:
+            props = schema.get("properties", {})
+            tokens = self._json_tokens({k: "|".join(v["enum"]) if v.get("enum") else "" if str(v.get("type")).upper() == "STRING" else 0
+                                        for k, v in props.items()})
+        else:
+            tokens = self._tokens("".join(p.get("text", "") for p in (request.get("systemInstruction") or request.get("system_instruction") or {}).get("parts", [])))
+        usage = {"promptTokenCount": len(prompt) // 2, "candidatesTokenCount": len(tokens), "totalTokenCount": len(prompt) // 2 + len(tokens)}
+
+        def candidate(text, finish=None):
+            c = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+            if finish: c["finishReason"] = finish
+            return c
+
+        if not stream:
+            time.sleep(self.profile.llm_token_interval * len(tokens))
+            return self._send(200, json.dumps({"candidates": [candidate("".join(tokens), "STOP")], "usageMetadata": usage}, ensure_ascii=False).encode())
+        events = [json.dumps({"candidates": [candidate(t)]}, ensure_ascii=False) for t in tokens[:-1]]
+        events.append(json.dumps({"candidates": [candidate(tokens[-1], "STOP")], "usageMetadata": usage}, ensure_ascii=False))
+        self._stream(events)
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, profile=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.profile = profile or FakeProfile()
+        self.rng = random.Random(self.profile.seed)
+        self.rng_lock = threading.Lock()
+        self.counters = {"data": 0, "llm": 0, "errors": 0}
+        self._count_lock = threading.Lock()
+
+    def count(self, name):
+        with self._count_lock: self.counters[name] += 1
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-upstream", daemon=True).start()
+        return self
+
+    def env(self):
+        """让 alphacouncil 指向本服务的环境变量 (须在导入 alphacouncil 之前设置)"""
+        env = {f"ALPHACOUNCIL_{host}_URL": self.url for host in ("TENCENT", "EASTMONEY", "EASTMONEY_LIST", "SINA")}
+        env.update({"ALPHACOUNCIL_DEEPSEEK_BASE_URL": f"{self.url}/deepseek", "ALPHACOUNCIL_QWEN_BASE_URL": f"{self.url}/qwen",
+                    "ALPHACOUNCIL_GEMINI_BASE_URL": self.url})
+        return env
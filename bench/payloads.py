@@ -0,0 +1,94 @@
+"""替身服务的响应体：与上游接口逐字节同格式 (腾讯 / 新浪为 GBK 文本，东方财富为 JSON)。
+
+行情按代码做种子生成，同一代码每次得到相同的K线与分时，基准结果可复现。
+--fixtures 目录下存在 <路由名>.txt 时 (路由名见 ROUTES)，直接回放其中录制的原始响应体。
+"""
+import json
+import random
+import zlib
+from datetime import date, timedelta
+
+ROUTES = ("tencent", "kline", "trends", "clist", "sina")
+KLINE_DAYS = 1500
+
+
+def _rng(code):
+    return random.Random(zlib.crc32(code.encode()))
+
+
+def _name(code):
+    return f"测试{code[-4:]}"
+
+
+def _market_code(code):
+    code = code.lower()
+    if code[:2] in ("sh", "sz"): return code
+    return ("sh" if code.startswith(("5", "6")) else "sz") + code
+
+
+def tencent_quotes(codes):
+    """v_sh600276="1~名称~代码~现价~昨收~今开~成交量~...";  共 50 个字段"""
+    lines = []
+    for code in codes:
+        code = _market_code(code)
+        rng = _rng(code)
+        yestend = round(rng.uniform(5, 200), 2)
+        now = round(yestend * rng.uniform(0.95, 1.05), 2)
+        volume = rng.randint(10_000, 2_000_000)
+        fields = ["1", _name(code[2:]), code[2:], f"{now}", f"{yestend}", f"{round(yestend * rng.uniform(0.98, 1.02), 2)}",
+                  str(volume), str(volume // 2), str(volume - volume // 2)]
+        for i in range(5): fields += [f"{now - 0.01 * (i + 1):.2f}", str(rng.randint(1, 5000))]
+        for i in range(5): fields += [f"{now + 0.01 * (i + 1):.2f}", str(rng.randint(1, 5000))]
+        fields += ["", "20240105150003", f"{now - yestend:.2f}", f"{(now - yestend) / yestend * 100:.2f}",
+                   f"{max(now, yestend) * 1.01:.2f}", f"{min(now, yestend) * 0.99:.2f}", f"{now}/{volume}/{now * volume * 100:.0f}",
+                   str(volume), f"{now * volume / 100:.0f}", f"{rng.uniform(0.1, 5):.2f}"]
+        fields += ["0"] * (50 - len(fields))
+        lines.append(f'v_{code}="' + "~".join(fields) + '";\n')
+    return "".join(lines).encode("gbk")
+
+
+def klines(secid, beg="0"):
+    """东方财富日K：自 beg (YYYYMMDD) 起的工作日K线"""
+    rng = _rng(secid)
+    day, price, rows = date(2019, 1, 1), rng.uniform(5, 200), []
+    start = beg if beg and beg != "0" else "00000000"
+    while len(rows) < KLINE_DAYS:
+        day += timedelta(days=1)
+        if day.weekday() >= 5: continue
+        open_ = price
+        price = max(1.0, price * (1 + rng.gauss(0, 0.02)))
+        high, low = max(open_, price) * 1.01, min(open_, price) * 0.99
+        volume = rng.randint(10_000, 500_000)
+        if day.strftime("%Y%m%d") >= start:
+            rows.append(f"{day.isoformat()},{open_:.2f},{price:.2f},{high:.2f},{low:.2f},{volume},{volume * price * 100:.1f}")
+    return json.dumps({"rc": 0, "data": {"code": secid.split(".")[-1], "klines": rows}}).encode()
+
+
+def trends(secid):
+    """东方财富分时：241 个分钟点 "日期 HH:MM,价,量,均价" """
+    rng = _rng(secid)
+    price, amount, volume, rows = rng.uniform(5, 200), 0.0, 0, []
+    minutes = [(9, 30)] + [(9 + (30 + i) // 60, (30 + i) % 60) for i in range(1, 121)] + [(13 + i // 60, i % 60) for i in range(1, 121)]
+    for hh, mm in minutes:
+        price = max(1.0, price * (1 + rng.gauss(0, 0.002)))
+        vol = rng.randint(100, 20_000)
+        volume += vol
+        amount += vol * price * 100
+        rows.append(f"2024-01-05 {hh:02d}:{mm:02d},{price:.2f},{vol},{amount / volume / 100:.3f}")
+    return json.dumps({"rc": 0, "data": {"code": secid.split(".")[-1], "trends": rows}}).encode()
+
+
+def clist(page, page_size, total=5000, ascending=False):
+    """东方财富列表分页 (证券代码快照 / 指数成分股 / 板块排行)"""
+    start = (page - 1) * page_size
+    order = range(start, min(start + page_size, total))
+    if ascending: order = [total - 1 - i for i in order]
+    diff = [{"f12": f"{600000 + i:06d}", "f13": 1, "f14": _name(f"{600000 + i:06d}"),
+             "f3": round(5 - 10 * i / total, 2), "f62": round((total / 2 - i) * 1e6, 1)} for i in order]
+    return json.dumps({"rc": 0, "data": {"total": total, "diff": diff}}, ensure_ascii=False).encode()
+
+
+def sina_suggest(key):
+    code = key if key.isdigit() else "600276"
+    market = _market_code(code)
+    return f'var suggestdata_1="{key},11,{code},{market},{_name(code)},{market},{_name(code)},99,1";'.encode("gbk")
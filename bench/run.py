@@ -0,0 +1,185 @@
+"""离线压测：启动本地替身服务，模拟 N 个并发用户驱动数据层与完整的智能体委员会，报告吞吐、p50/p99 与内存峰值。
+
+    python -m bench --users 20 --runs 3
+    python -m bench --scenario data --users 50 --runs 20 --cold-cache
+    python -m bench --llm-error-rate 0.05 --json runs/after.json --baseline runs/before.json
+
+不访问任何外部服务：数据目录指向临时目录 (结束后删除)，响应缓存只用内存，埋点不落盘。
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+from .fakes import FakeProfile, FakeServer, Latency
+
+SCENARIOS = ("data", "committee")
+FAKE_KEYS = {"gemini": "fake-gemini", "deepseek": "fake-deepseek", "qwen": "fake-qwen"}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m bench", description="AlphaCouncil 离线压测 (本地替身服务)")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--users", type=int, default=10, help="并发模拟用户数")
+    parser.add_argument("--runs", type=int, default=3, help="每个用户的运行次数")
+    parser.add_argument("--symbols", type=int, default=20, help="标的池大小 (越小缓存命中越多)")
+    parser.add_argument("--mode", choices=("mixed", "deepseek"), default="deepseek",
+                        help="mixed 会把 Gemini 智能体指向 REST 替身，需 google-generativeai 支持 REST 异步调用")
+    parser.add_argument("--no-stream", action="store_true", help="智能体走非流式接口 (不统计首字延迟)")
+    parser.add_argument("--no-compact", action="store_true", help="关闭上下文压缩，下游智能体拿完整报告 (对比用)")
+    parser.add_argument("--no-structured", action="store_true", help="关闭结构化输出，智能体直接输出 Markdown (对比用)")
+    parser.add_argument("--cold-cache", action="store_true", help="每次数据请求前清空共享行情缓存")
+    g = parser.add_argument_group("替身服务")
+    g.add_argument("--data-latency", type=float, default=0.03, help="行情接口延迟中位数 (秒)")
+    g.add_argument("--llm-ttft", type=float, default=0.4, help="模型首字延迟中位数 (秒)")
+    g.add_argument("--sigma", type=float, default=0.5, help="对数正态延迟的 sigma")
+    g.add_argument("--token-interval", type=float, default=0.005, help="流式逐 token 间隔 (秒)")
+    g.add_argument("--tokens", type=int, default=120, help="每次回答的 token 数")
+    g.add_argument("--data-error-rate", type=float, default=0.0)
+    g.add_argument("--llm-error-rate", type=float, default=0.0)
+    g.add_argument("--fixtures", type=Path, help="录制的原始响应体目录 (<路由名>.txt)")
+    g.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--tracemalloc", action="store_true", help="统计 Python 堆内存峰值 (有额外开销)")
+    parser.add_argument("--json", type=Path, help="结果写入 JSON，供后续 --baseline 对比")
+    parser.add_argument("--baseline", type=Path, help="与之前的 JSON 结果对比")
+    return parser
+
+
+def percentile(values, q):
+    import numpy as np
+    return float(np.percentile(values, q)) if values else None
+
+
+def peak_rss_mb():
+    try: import resource
+    except ImportError: return None  # Windows
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def drive(users, runs, op):
+    """users 个线程各执行 runs 次 op(user, i)，返回 (每次耗时秒, 失败次数, 总墙钟秒)"""
+    latencies, failures, lock = [], [0], threading.Lock()
+    barrier = threading.Barrier(users)
+
+    def user(u):
+        barrier.wait()
+        for i in range(runs):
+            t0 = time.perf_counter()
+            try: ok = op(u, i)
+            except Exception: ok = False
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+                failures[0] += not ok
+    threads = [threading.Thread(target=user, args=(u,), name=f"bench-user-{u}") for u in range(users)]
+    t0 = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return latencies, failures[0], time.perf_counter() - t0
+
+
+def run_scenario(name, args, server, pool):
+    from alphacouncil.committee import MODES, analyze_symbol
+    from alphacouncil.data import DataError, fetch_market_bundle
+    from alphacouncil.market_cache import get_market_cache
+
+    rng = random.Random(args.seed)
+    picks = [[rng.choice(pool) for _ in range(args.runs)] for _ in range(args.users)]
+    mode = MODES[0] if args.mode == "mixed" else MODES[1]
+
+    def data_op(u, i):
+        if args.cold_cache: get_market_cache().invalidate()
+        bundle = fetch_market_bundle(picks[u][i])
+        return not bundle["errors"]
+
+    runs = []  # 每次委员会运行的埋点摘要
+
+    def committee_op(u, i):
+        if args.cold_cache: get_market_cache().invalidate()
+        try: result = analyze_symbol(picks[u][i], FAKE_KEYS, mode, force_refresh=True, stream=not args.no_stream, compact=not args.no_compact,
+                                    structured=not args.no_structured)
+        except (DataError, LookupError): return False
+        runs.append(result["telemetry"])
+        return not any(r.get("error") for r in result["agents"].values())
+
+    before = dict(server.counters)
+    if args.tracemalloc: tracemalloc.reset_peak()
+    latencies, failures, wall = drive(args.users, args.runs, data_op if name == "data" else committee_op)
+    ops = len(latencies)
+    return {"scenario": name, "ops": ops, "failures": failures, "wall_s": wall,
+            "throughput": ops / wall if wall else 0.0,
+            "p50_s": percentile(latencies, 50), "p99_s": percentile(latencies, 99), "max_s": max(latencies, default=None),
+            "upstream": {k: server.counters[k] - before[k] for k in before},
+            "heap_peak_mb": tracemalloc.get_traced_memory()[1] / 2 ** 20 if args.tracemalloc else None,
+            "rss_peak_mb": peak_rss_mb(), **token_stats(runs)}
+
+
+def token_stats(runs):
+    """委员会场景：每次运行的平均输入 tokens、提示词估算与 GM 首字延迟"""
+    if not runs: return {}
+    import numpy as np
+    gm_ttft = [r["ttft_ms"]["general_manager"] / 1000 for r in runs if "general_manager" in r["ttft_ms"]]
+    return {"tokens_in": float(np.mean([r["tokens_in"] for r in runs])), "prompt_tokens": float(np.mean([r["prompt_tokens"] for r in runs])),
+            "prompt_tokens_raw": float(np.mean([r["prompt_tokens_raw"] for r in runs])), "gm_ttft_p50_s": percentile(gm_ttft, 50)}
+
+
+def format_result(r, base=None):
+    def delta(key, lower_is_better=True):
+        if not base or base.get(key) in (None, 0) or r.get(key) is None: return ""
+        change = (r[key] - base[key]) / base[key] * 100
+        better = change < 0 if lower_is_better else change > 0
+        return f" ({change:+.1f}% {'↑好' if better else '↓差'})" if abs(change) >= 0.05 else " (持平)"
+
+    lines = [f"[{r['scenario']}] {r['ops']} 次 · 失败 {r['failures']} · 墙钟 {r['wall_s']:.2f}s",
+             f"  吞吐 {r['throughput']:.2f} 次/s{delta('throughput', False)}",
+             f"  p50 {r['p50_s'] * 1000:.0f} ms{delta('p50_s')} · p99 {r['p99_s'] * 1000:.0f} ms{delta('p99_s')} · max {r['max_s'] * 1000:.0f} ms",
+             f"  上游请求 行情 {r['upstream']['data']} / 模型 {r['upstream']['llm']} / 注入错误 {r['upstream']['errors']}"]
+    if r.get("tokens_in") is not None:
+        lines.append(f"  每次输入 tokens {r['tokens_in']:.0f}{delta('tokens_in')} · 提示词估算 {r['prompt_tokens']:.0f} (不压缩 {r['prompt_tokens_raw']:.0f})"
+                     + (f" · GM 首字 p50 {r['gm_ttft_p50_s'] * 1000:.0f} ms{delta('gm_ttft_p50_s')}" if r.get("gm_ttft_p50_s") is not None else ""))
+    mem = []
+    if r.get("rss_peak_mb") is not None: mem.append(f"RSS 峰值 {r['rss_peak_mb']:.0f} MB{delta('rss_peak_mb')}")
+    if r.get("heap_peak_mb") is not None: mem.append(f"Python 堆峰值 {r['heap_peak_mb']:.1f} MB{delta('heap_peak_mb')}")
+    if mem: lines.append("  " + " · ".join(mem))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    profile = FakeProfile(data_latency=Latency(args.data_latency, args.sigma), llm_ttft=Latency(args.llm_ttft, args.sigma),
+                          llm_token_interval=args.token_interval, llm_tokens=args.tokens, data_error_rate=args.data_error_rate,
+                          llm_error_rate=args.llm_error_rate, seed=args.seed, fixtures=args.fixtures)
+    server = FakeServer(profile).start()
+    home = tempfile.mkdtemp(prefix="alphacouncil-bench-")
+    # 必须在导入 alphacouncil 之前设置：接口地址、数据目录、缓存与埋点在导入时读取
+    os.environ.update(server.env())
+    os.environ.update({"ALPHACOUNCIL_HOME": home, "ALPHACOUNCIL_LLM_CACHE_DB": "", "ALPHACOUNCIL_TELEMETRY": "0"})
+    if args.tracemalloc: tracemalloc.start()
+
+    pool = [f"{600000 + i:06d}" for i in range(args.symbols)]
+    baseline = {}
+    if args.baseline:
+        baseline = {r["scenario"]: r for r in json.loads(args.baseline.read_text(encoding="utf-8"))["results"]}
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    print(f"替身服务 {server.url} · {args.users} 用户 × {args.runs} 次 · 标的池 {len(pool)} · 数据目录 {home}", file=sys.stderr)
+    results = []
+    for name in scenarios:
+        result = run_scenario(name, args, server, pool)
+        results.append(result)
+        print(format_result(result, baseline.get(name)))
+    if args.json:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps({"args": {k: str(v) for k, v in vars(args).items()}, "results": results}, ensure_ascii=False, indent=2), encoding="utf-8")
+    server.shutdown()
+    from alphacouncil.history import get_history
+    get_history().flush()
+    shutil.rmtree(home, ignore_errors=True)
+    return 1 if any(r["failures"] for r in results) else 0
@@ -1,11 +1,20 @@
+import time
+_script_started = time.perf_counter()
+import os
 import streamlit as st
-import requests
-import concurrent.futures
-import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from datetime import datetime
-import re
+from alphacouncil.committee import (AGENTS_CONFIG, MODES, agent_graph, build_agent_context, change_pct as calc_change_pct,
+                                    holding_text, make_agent_runner, resolve_provider, resolve_symbol)
+from alphacouncil.engine import run_committee
+from alphacouncil.llm import get_registry
+from alphacouncil.llm_cache import get_response_cache
+from alphacouncil.data import DataError, fetch_market_bundle
+from alphacouncil.decisions import record_decisions
+from alphacouncil.history import PAGE_SIZE, diff_runs, get_history, save_run
+from alphacouncil.market_cache import get_market_cache
+from alphacouncil.market_view import get_market_view
+from alphacouncil.schemas import STRUCTURED_ENABLED
+from alphacouncil.symbols import search_symbols
+from alphacouncil.telemetry import Trace, get_metrics, use_trace
 
 # ==========================================
 # 0. 页面配置与 UI 样式 (最终修复版)
@@ -18,371 +27,16 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# 注入 CSS：修复侧边栏输入框白底白字问题
-st.markdown("""
-<style>
-    /* --- 1. 全局深色背景 --- */
-    .stApp {
-        background-color: #0E1117;
-        background-image: 
-            radial-gradient(circle at 50% 0%, #1F2937 0%, #0E1117 60%),
-            linear-gradient(rgba(255, 255, 255, 0.02) 1px, transparent 1px),
-            linear-gradient(90deg, rgba(255, 255, 255, 0.02) 1px, transparent 1px);
-        background-size: 100% 100%, 40px 40px, 40px 40px;
-        color: #E2E8F0;
-    }
-
-    /* --- 2. 侧边栏深度优化 --- */
-    [data-testid="stSidebar"] {
-        background-color: #111827 !important;
-        border-right: 1px solid #374151;
-    }
-    
-    /* 强制侧边栏所有文字颜色为高亮灰白 */
-    [data-testid="stSidebar"] h1, [data-testid="stSidebar"] h2, [data-testid="stSidebar"] h3, 
-    [data-testid="stSidebar"] span, [data-testid="stSidebar"] label, [data-testid="stSidebar"] p,
-    [data-testid="stSidebar"] div, [data-testid="stSidebar"] .stMarkdown {
-        color: #E2E8F0 !important;
-    }
-    
-    /* 侧边栏说明文字 */
-    [data-testid="stSidebar"] .stCaption {
-        color: #94A3B8 !important;
-    }
+# 注入 CSS：修复侧边栏输入框白底白字问题 (样式表只读取一次，进程内复用)
+@st.cache_resource
+def load_css():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "style.css"), encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
 
-    /* --- [关键修复] 输入框样式强制覆盖 --- */
-    /* 针对所有文本输入框、密码框、数字框 */
-    [data-testid="stSidebar"] input {
-        background-color: #374151 !important; /* 强制深灰色背景 */
-        color: #FFFFFF !important;             /* 强制纯白文字 */
-        border: 1px solid #6B7280 !important;  /* 明显的边框 */
-        caret-color: #FFFFFF !important;       /* 光标颜色 */
-    }
-    
-    /* 修复 Chrome/Edge 浏览器记住密码后自动变白的问题 */
-    [data-testid="stSidebar"] input:-webkit-autofill,
-    [data-testid="stSidebar"] input:-webkit-autofill:hover, 
-    [data-testid="stSidebar"] input:-webkit-autofill:focus, 
-    [data-testid="stSidebar"] input:-webkit-autofill:active {
-        -webkit-box-shadow: 0 0 0 30px #374151 inset !important;
-        -webkit-text-fill-color: #FFFFFF !important;
-    }
-
-    /* --- 3. 主界面卡片 (高对比度) --- */
-    .agent-card {
-        background: rgba(31, 41, 55, 0.85);
-        backdrop-filter: blur(12px);
-        border: 1px solid rgba(255, 255, 255, 0.1);
-        border-radius: 12px;
-        padding: 20px;
-        margin-bottom: 16px;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.2);
-        height: 360px;
-        overflow-y: auto;
-        display: flex; flex-direction: column;
-        transition: transform 0.2s, border-color 0.2s;
-    }
-    .agent-card:hover {
-        transform: translateY(-2px);
-        border-color: #38BDF8;
-        box-shadow: 0 10px 20px rgba(56, 189, 248, 0.1);
-    }
-    
-    .agent-card::-webkit-scrollbar { width: 6px; }
-    .agent-card::-webkit-scrollbar-thumb { background: #4B5563; border-radius: 3px; }
-    .agent-card::-webkit-scrollbar-track { background: transparent; }
-
-    /* 卡片头部布局 */
-    .card-header { 
-        display: flex; align-items: center; justify-content: space-between;
-        margin-bottom: 15px; padding-bottom: 12px; 
-        border-bottom: 1px solid rgba(255, 255, 255, 0.1);
-    }
-    .agent-info { display: flex; align-items: center; gap: 12px; }
-    .avatar {
-        width: 46px; height: 46px;
-        border-radius: 50%;
-        object-fit: cover;
-        border: 2px solid #374151;
-    }
-    .agent-name { font-weight: 700; color: #F8FAFC; font-size: 1.05em; }
-    .agent-role { font-size: 0.8em; color: #94A3B8; font-weight: 500; }
-    
-    /* AI 标签 */
-    .model-badge { 
-        font-size: 0.75em; padding: 4px 8px; border-radius: 6px; 
-        font-family: 'Consolas', monospace; font-weight: bold;
-        letter-spacing: 0.5px;
-    }
-    .badge-gemini { background: rgba(37, 99, 235, 0.2); color: #60A5FA; border: 1px solid rgba(37, 99, 235, 0.5); }
-    .badge-deepseek { background: rgba(5, 150, 105, 0.2); color: #34D399; border: 1px solid rgba(5, 150, 105, 0.5); }
-    .badge-qwen { background: rgba(217, 119, 6, 0.2); color: #FBBF24; border: 1px solid rgba(217, 119, 6, 0.5); }
-    
-    /* 卡片正文 */
-    .card-content { 
-        font-size: 15px; line-height: 1.65; color: #E2E8F0; 
-        white-space: pre-wrap;
-    }
-    
-    /* 按钮样式 */
-    .stButton>button { 
-        background: linear-gradient(135deg, #0284c7, #0ea5e9);
-        color: white; border: none; 
-        font-weight: 700; border-radius: 8px; height: 50px; font-size: 16px;
-        box-shadow: 0 4px 15px rgba(2, 132, 199, 0.4);
-        transition: all 0.3s ease;
-    }
-    .stButton>button:hover { 
-        transform: scale(1.02); 
-        background: linear-gradient(135deg, #0369a1, #0284c7);
-        box-shadow: 0 6px 20px rgba(2, 132, 199, 0.6);
-    }
-    
-    /* 主界面大输入框 */
-    .stTextInput>div>div>input {
-        background-color: #1F2937;
-        color: #F8FAFC;
-        border: 1px solid #4B5563;
-        border-radius: 8px;
-        height: 50px;
-        font-size: 18px;
-        text-align: center;
-        letter-spacing: 1px;
-    }
-
-    /* --- 作者署名 --- */
-    .author-container {
-        text-align: center;
-        margin-top: -20px;
-        margin-bottom: 35px;
-        position: relative;
-        z-index: 10;
-    }
-    .author-tag {
-        display: inline-flex; align-items: center; gap: 8px;
-        background: rgba(15, 23, 42, 0.6);
-        border: 1px solid rgba(148, 163, 184, 0.2);
-        padding: 6px 20px; 
-        border-radius: 50px;
-        color: #94A3B8; 
-        font-size: 13px; 
-        font-weight: 600;
-        backdrop-filter: blur(4px);
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(load_css(), unsafe_allow_html=True)
 
 # ==========================================
-# 1. 核心配置 (Agents)
-# ==========================================
-AGENTS_CONFIG = {
-    "macro_analyst": {
-        "name": "宏观政策分析师", 
-        "role": "Macro Analyst",
-        "avatar": "https://randomuser.me/api/portraits/men/32.jpg",
-        "provider": "Gemini", 
-        "prompt": "你是资深A股宏观政策分析师。输出风格：客观、前瞻。\n任务：结合当前A股环境判断宏观水位。\n输出Markdown列表(200字内)：\n- **宏观评级**：[宽松/中性/紧缩]\n- **核心结论**：(一句话狠话)\n- **政策风口**：(简述)"
-    },
-    "industry_expert": {
-        "name": "行业轮动专家", 
-        "role": "Industry Expert",
-        "avatar": "https://randomuser.me/api/portraits/women/44.jpg",
-        "provider": "Gemini",
-        "prompt": "你是A股行业轮动专家。输出风格：突出资金偏好。\n任务：分析当前最强主线。\n输出Markdown列表(150字内)：\n- **最强主线**：(前三名)\n- **轮动预判**：(资金下一步去哪)"
-    },
-    "funds_analyst": {
-        "name": "资金流向分析师", 
-        "role": "Funds Analyst",
-        "avatar": "https://randomuser.me/api/portraits/men/85.jpg",
-        "provider": "Gemini",
-        "prompt": "你是资金流向专家。输出风格：看穿对手盘。\n任务：分析五档盘口挂单，判断主力意图。\n输出Markdown列表(200字内)：\n- **资金意图**：[吸筹/吸盘/出货/观望]\n- **盘口密码**：(重点解读买一卖一及下方五档托压单)\n- **短线合力**：[强/弱]"
-    },
-    "technical_analyst": {
-        "name": "技术分析专家", 
-        "role": "Technical Analyst",
-        "avatar": "https://randomuser.me/api/portraits/men/22.jpg",
-        "provider": "DeepSeek",
-        "prompt": "你是机构技术分析专家。输出风格：点位优先。\n任务：基于开盘/现价/五档盘口，判断趋势。\n输出Markdown列表(200字内)：\n- **技术形态**：[多头/空头/震荡]\n- **买卖区间**：买入[价格]/卖出[价格]/止损[价格]\n- **胜率预估**：[数字]%"
-    },
-    "fundamental_analyst": {
-        "name": "基本面估值分析师", 
-        "role": "Value Analyst",
-        "avatar": "https://randomuser.me/api/portraits/women/68.jpg",
-        "provider": "DeepSeek",
-        "prompt": "你是价值投资专家。\n任务：判断估值水位。\n输出Markdown列表(150字内)：\n- **估值水位**：[低估/合理/泡沫]\n- **核心逻辑**：(一句话)"
-    },
-    "manager_fundamental": {
-        "name": "基本面研究总监", 
-        "role": "Research Director",
-        "avatar": "https://randomuser.me/api/portraits/men/50.jpg",
-        "provider": "DeepSeek",
-        "prompt": "你是基本面总监。任务：整合报告，做出裁决。\n输出Markdown列表(200字内)：\n- **基本面总评**：[S/A/B/C/D]级\n- **核心矛盾**：(最大利好或利空)\n- **中期趋势**：[看涨/看平/看跌]"
-    },
-    "manager_momentum": {
-        "name": "市场动能总监", 
-        "role": "Momentum Director",
-        "avatar": "https://randomuser.me/api/portraits/men/46.jpg",
-        "provider": "DeepSeek",
-        "prompt": "你是动能总监。任务：整合技术和资金面。\n输出Markdown列表(200字内)：\n- **动能状态**：[爆发/跟随/衰竭/死水]\n- **爆发概率**：[数字]%\n- **关键信号**：(最缺什么或最强什么)"
-    },
-    "risk_system": {
-        "name": "系统性风险总监", 
-        "role": "Risk Director",
-        "avatar": "https://randomuser.me/api/portraits/men/90.jpg",
-        "provider": "Qwen", 
-        "prompt": "你是系统风险总监。风格：偏执理性。\n任务：找出所有可能崩盘的原因。\n输出Markdown列表(200字内)：\n- **崩盘风险**：[低/中/高]\n- **最大回撤预警**：(最坏情况)"
-    },
-    "risk_portfolio": {
-        "name": "组合风险总监", 
-        "role": "Portfolio Risk",
-        "avatar": "https://randomuser.me/api/portraits/women/33.jpg",
-        "provider": "DeepSeek",
-        "prompt": "你是风控精算师。\n任务：给出具体风控指标。\n输出Markdown列表(200字内)：\n- **建议仓位**：[数字]%\n- **止损间距**：[数字]%\n- **流动性预警**：(成交量建议)"
-    },
-    "general_manager": {
-        "name": "投资决策总经理 (GM)", 
-        "role": "General Manager",
-        "avatar": "https://randomuser.me/api/portraits/men/1.jpg",
-        "provider": "DeepSeek",
-        "prompt": """你是拥有唯一决策权的GM。风格：狼性、激进但克制。
-综合前9位专家报告。
-
-**核心任务：** 根据用户的【持仓成本】和【当前浮动盈亏】，给出具体的操作建议。
-- 如果用户亏损：分析是否应该补仓摊低成本（T+0），还是割肉止损？
-- 如果用户盈利：分析是否应该止盈离场，还是继续持有？
-
-【输出结构】
-### 📊 多空一致性
-(强多/偏多/中性/偏空/强空)
-### 💡 持仓操作建议 (必填)
-(针对用户的持仓成本，给出如“在61.0附近补仓做T”、“现价止盈”等具体建议)
-### 🧭 最终指令
-【🟢 买入 / 🟡 观望 / 🔴 卖出】
-### 📌 建议仓位
-【0-100%】
-### 📈 实战点位
-- **买入区间：** [价格]
-- **卖出区间：** [价格]
-### 🛑 止损红线
-- **价格：** [单一数字]
-"""
-    }
-}
-
-# ==========================================
-# 2. 数据服务
-# ==========================================
-
-def search_stock_realtime(keyword):
-    """实时搜索"""
-    url = f"http://suggest3.sinajs.cn/suggest/type=&key={keyword}&name=suggestdata_{int(datetime.now().timestamp())}"
-    try:
-        res = requests.get(url, headers={'Referer': 'https://finance.sina.com.cn/'})
-        content = res.content.decode('gbk', 'ignore')
-        if '=""' in content: return None, None
-        data_str = content.split('="')[1].split('";')[0]
-        parts = data_str.split(',')
-        if len(parts) > 5: return parts[5], parts[4]
-        return None, None
-    except: return None, None
-
-def get_realtime_data_tencent(symbol):
-    """腾讯财经接口 - 获取完整五档数据"""
-    code = symbol.lower()
-    if not (code.startswith('sh') or code.startswith('sz')):
-        if code.startswith('6'): code = f"sh{code}"
-        elif code.startswith('0') or code.startswith('3'): code = f"sz{code}"
-    
-    url = f"http://qt.gtimg.cn/q={code}"
-    try:
-        res = requests.get(url, timeout=5)
-        content = res.content.decode('gbk', 'ignore')
-        if 'v_pv_none' in content or len(content) < 20: return None, "无数据"
-        data = content.split('="')[1].split('";')[0].split('~')
-        if len(data) < 30: return None, "数据异常"
-        
-        return {
-            'name': data[1], 'code': data[2], 'now': float(data[3]),
-            'yestend': float(data[4]), 'open': float(data[5]),
-            'volume': float(data[6]), 
-            'sell1_p': data[19], 'sell1_v': data[20],
-            'sell2_p': data[21], 'sell2_v': data[22],
-            'sell3_p': data[23], 'sell3_v': data[24],
-            'sell4_p': data[25], 'sell4_v': data[26],
-            'sell5_p': data[27], 'sell5_v': data[28],
-            'buy1_p': data[9],   'buy1_v': data[10],
-            'buy2_p': data[11],  'buy2_v': data[12],
-            'buy3_p': data[13],  'buy3_v': data[14],
-            'buy4_p': data[15],  'buy4_v': data[16],
-            'buy5_p': data[17],  'buy5_v': data[18],
-            'high': float(data[33]), 'low': float(data[34]),
-            'amount': float(data[37]) * 10000,
-        }, None
-    except Exception as e: return None, str(e)
-
-def get_kline_data_eastmoney(symbol):
-    try:
-        clean_code = re.sub(r"[^0-9]", "", symbol)
-        market = "1" if symbol.startswith("sh") or clean_code.startswith("6") else "0"
-        secid = f"{market}.{clean_code}"
-        url = "http://push2his.eastmoney.com/api/qt/stock/kline/get"
-        params = {"secid": secid, "fields1": "f1,f2,f3,f4,f5,f6", "fields2": "f51,f52,f53,f54,f55,f57", "klt": "101", "fqt": "1", "end": "20500101", "lmt": "120"}
-        res = requests.get(url, params=params, timeout=5)
-        data = res.json()
-        if data and data.get("data") and data["data"].get("klines"):
-            klines = data["data"]["klines"]
-            parsed = [{"Date": k.split(',')[0], "Open": float(k.split(',')[1]), "Close": float(k.split(',')[2]), "High": float(k.split(',')[3]), "Low": float(k.split(',')[4]), "Volume": float(k.split(',')[5])} for k in klines]
-            return pd.DataFrame(parsed)
-        return None
-    except: return None
-
-def get_min_data_eastmoney(symbol):
-    try:
-        clean_code = re.sub(r"[^0-9]", "", symbol)
-        market = "1" if symbol.startswith("sh") or clean_code.startswith("6") else "0"
-        secid = f"{market}.{clean_code}"
-        url = "http://push2his.eastmoney.com/api/qt/stock/trends2/get"
-        params = {"secid": secid, "fields1": "f1,f2,f3,f4,f5,f6,f7,f8", "fields2": "f51,f53,f58"}
-        res = requests.get(url, params=params, timeout=5)
-        data = res.json()
-        if data and data.get("data") and data["data"].get("trends"):
-            trends = data["data"]["trends"]
-            parsed = []
-            for t in trends:
-                s = t.split(',')
-                parsed.append({"Time": s[0].split(' ')[1] if ' ' in s[0] else s[0], "Price": float(s[1]), "Vol": float(s[2])})
-            return pd.DataFrame(parsed)
-        return None
-    except: return None
-
-def call_ai_api(prompt, system_prompt, provider, api_keys, gemini_model_name="gemini-2.5-flash"):
-    try:
-        if provider == "Gemini":
-            if not api_keys.get('gemini'): return "⚠️ 缺 Gemini Key"
-            import google.generativeai as genai
-            genai.configure(api_key=api_keys['gemini'])
-            try:
-                model = genai.GenerativeModel(gemini_model_name)
-                response = model.generate_content(f"【系统指令】\n{system_prompt}\n\n【用户任务】\n{prompt}")
-                return response.text
-            except Exception as e:
-                return f"Gemini Error: {str(e)}"
-        elif provider == "DeepSeek":
-            if not api_keys.get('deepseek'): return "⚠️ 缺 DeepSeek Key"
-            from openai import OpenAI
-            client = OpenAI(api_key=api_keys['deepseek'], base_url="https://api.deepseek.com")
-            resp = client.chat.completions.create(model="deepseek-chat", messages=[{'role': 'system', 'content': system_prompt}, {'role': 'user', 'content': prompt}])
-            return resp.choices[0].message.content
-        elif provider == "Qwen":
-            if not api_keys.get('qwen'): return "⚠️ 缺 Qwen Key"
-            from openai import OpenAI
-            client = OpenAI(api_key=api_keys['qwen'], base_url="https://dashscope.aliyuncs.com/compatible-mode/v1")
-            resp = client.chat.completions.create(model="qwen-plus", messages=[{'role': 'system', 'content': system_prompt}, {'role': 'user', 'content': prompt}])
-            return resp.choices[0].message.content
-    except Exception as e: return f"[{provider} Error] {str(e)}"
-
-# ==========================================
-# 3. 主界面逻辑
+# 1. 主界面逻辑
 # ==========================================
 
 # 1. 标题区（大标题 + 作者署名）
@@ -396,75 +50,377 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# 2. 侧边栏
-with st.sidebar:
+# 2. 侧边栏 (fragment：切换选项只重跑侧边栏本身，不重跑整页；取值统一经 st.session_state)
+@st.fragment
+def render_sidebar():
     st.header("⚙️ 系统控制")
-    
-    # 优先读取 Secrets
-    secret_gemini = st.secrets.get("GEMINI_API_KEY", "")
-    secret_deepseek = st.secrets.get("DEEPSEEK_API_KEY", "")
-    secret_qwen = st.secrets.get("QWEN_API_KEY", "")
 
     with st.expander("🔑 API Key 设置", expanded=True):
         st.caption("优先使用云端 Secrets，此处留空即可。")
-        user_gemini = st.text_input("Gemini Key", type="password")
-        user_deepseek = st.text_input("DeepSeek Key", type="password")
-        user_qwen = st.text_input("Qwen Key", type="password")
-
-        gemini_key = user_gemini if user_gemini else secret_gemini
-        deepseek_key = user_deepseek if user_deepseek else secret_deepseek
-        qwen_key = user_qwen if user_qwen else secret_qwen
-        
-        if gemini_key: st.success("✅ Gemini Ready")
-        if deepseek_key: st.success("✅ DeepSeek Ready")
-        if qwen_key: st.success("✅ Qwen Ready")
+        st.text_input("Gemini Key", type="password", key="user_gemini")
+        st.text_input("DeepSeek Key", type="password", key="user_deepseek")
+        st.text_input("Qwen Key", type="password", key="user_qwen")
+
+        keys = api_keys()
+        if keys['gemini']: st.success("✅ Gemini Ready")
+        if keys['deepseek']: st.success("✅ DeepSeek Ready")
+        if keys['qwen']: st.success("✅ Qwen Ready")
     
     st.markdown("---")
     st.subheader("🧠 模型调度")
-    gemini_model = st.radio("Gemini 版本:", ["gemini-2.5-flash", "gemini-2.5-pro", "gemini-pro"], index=0)
-    mode = st.radio("分析策略:", ["混合模式 (推荐)", "全 DeepSeek"], index=0)
+    st.radio("Gemini 版本:", ["gemini-2.5-flash", "gemini-2.5-pro", "gemini-pro"], index=0, key="gemini_model")
+    st.radio("分析策略:", MODES, index=0, key="mode")
+    st.toggle("⚡ 流式输出 (边生成边显示)", value=True, key="stream_mode")
+    st.toggle("🗜️ 压缩上下文 (下游只传所需字段)", value=True, key="compact_context")
+    st.toggle("🛡️ 对冲请求 (主模型过慢时并发请求备选)", value=True, key="hedge_requests")
+    st.toggle("🧾 结构化输出 (JSON 模式 + 校验)", value=STRUCTURED_ENABLED, key="structured_output")
+    st.checkbox("🔄 强制刷新 (本次忽略缓存)", value=False, key="force_refresh")
+    st.toggle("📡 盘中分时实时刷新", value=False, key="live_intraday", help="交易时段内分时图每隔几秒增量更新，下一次分析起生效")
+    cache_stats = get_response_cache().stats()
+    st.caption(f"⚡ 响应缓存：{cache_stats['entries']} 条 · 命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']}")
+    market_stats = get_market_cache().stats()
+    kinds = [f"{name} {market_stats[kind]['hits']}/{market_stats[kind]['misses']}/{market_stats[kind]['coalesced']}"
+             for kind, name in (("quote", "行情"), ("minute", "分时"), ("bars", "日K")) if kind in market_stats]
+    if kinds: st.caption("📡 行情共享缓存 (命中/未命中/合并)：" + " · ".join(kinds))
+    view = get_market_view().status()
+    if view["slot"]: st.caption(f"🌐 市场层观点 (宏观/行业，全站共享)：时段 {view['slot']} · 已生成 {view['agents']} 份")
     
     st.markdown("---")
     st.subheader("💼 持仓信息")
-    has_pos = st.checkbox("我持有此股票", value=True)
-    if has_pos:
-        cost_price = st.number_input("持仓成本", value=62.08, step=0.1, format="%.2f")
-        hold_vol = st.number_input("持仓数量", value=1200, step=100)
-    else:
-        cost_price = 0.0
-        hold_vol = 0
+    if st.checkbox("我持有此股票", value=True, key="has_pos"):
+        st.number_input("持仓成本", value=62.08, step=0.1, format="%.2f", key="cost_price")
+        st.number_input("持仓数量", value=1200, step=100, key="hold_vol")
+    uploaded = st.file_uploader("📂 组合持仓 CSV (代码,成本,数量)", type="csv", key="portfolio_csv",
+                                help="载入后组合风控与 GM 会结合整个组合给出建议；分析组合内的标的时自动使用其持仓成本")
+    if uploaded is None:
+        for k in ("holdings", "portfolio", "portfolio_file"): st.session_state.pop(k, None)
+    elif st.session_state.get("portfolio_file") != (uploaded.name, uploaded.size):
+        from alphacouncil.portfolio import load_holdings
+        try:
+            st.session_state.holdings = load_holdings(uploaded)
+            st.session_state.portfolio_file = (uploaded.name, uploaded.size)
+            st.session_state.pop("portfolio", None)
+        except ValueError as e: st.error(str(e))
+    if "holdings" in st.session_state: st.caption(f"💼 组合已载入 {len(st.session_state.holdings)} 只持仓")
+
+def api_keys():
+    """侧边栏输入优先，其次读取 Secrets"""
+    return {
+        'gemini': st.session_state.get("user_gemini") or st.secrets.get("GEMINI_API_KEY", ""),
+        'deepseek': st.session_state.get("user_deepseek") or st.secrets.get("DEEPSEEK_API_KEY", ""),
+        'qwen': st.session_state.get("user_qwen") or st.secrets.get("QWEN_API_KEY", ""),
+    }
+
+with st.sidebar:
+    render_sidebar()
 
 if 'analysis_results' not in st.session_state: st.session_state.analysis_results = {}
 if 'market_context' not in st.session_state: st.session_state.market_context = None
 
-# 3. 搜索区
+# 3. 卡片渲染 (运行前先占位，流式输出时原地刷新)
+BOARD_SECTIONS = [
+    ("🔍 第一阶段：多维分析 (Gemini/DeepSeek)", list(AGENTS_CONFIG.keys())[:5], 5),
+    ("🧠 第二阶段：策略博弈 (DeepSeek)", ["manager_fundamental", "manager_momentum"], 2),
+    ("🛡️ 第三阶段：风控委员会 (Qwen/DeepSeek)", ["risk_system", "risk_portfolio"], 2),
+]
+STREAM_REFRESH_SEC = 0.15  # 流式刷新节流，避免每个 token 都重绘
+
+def card_html(key, result_obj):
+    cfg = AGENTS_CONFIG[key]
+    content = result_obj["text"] if result_obj else "等待指令..."
+    if result_obj and result_obj.get("streaming"): content += " ▌"
+    provider = result_obj["provider"] if result_obj else "OFFLINE"
+    if provider == "Gemini": provider = st.session_state.gemini_model.split("-")[0]
+    
+    # 标签颜色类
+    badge_class = "badge-gemini"
+    if "DeepSeek" in provider: badge_class = "badge-deepseek"
+    if "Qwen" in provider: badge_class = "badge-qwen"
+    cache_badge = '<span class="model-badge badge-cache">⚡缓存</span>' if result_obj and result_obj.get("cached") else ""
+    if result_obj and result_obj.get("failover"): provider = f"↪ {provider}"  # 主模型失败或过慢，由备选作答
+
+    return f"""
+    <div class="agent-card">
+        <div class="card-header">
+            <div class="agent-info">
+                <img src="{cfg['avatar']}" class="avatar">
+                <div>
+                    <div class="agent-name">{cfg['name']}</div>
+                    <div class="agent-role">{cfg['role']}</div>
+                </div>
+            </div>
+            <span>{cache_badge}<span class="model-badge {badge_class}">{provider}</span></span>
+        </div>
+        <div class="card-content{' card-error' if result_obj and result_obj.get('error') else ''}">{content}</div>
+    </div>
+    """
+
+def render_gm(placeholder, gm_res):
+    if not gm_res: return
+    content = gm_res['text'] + (" ▌" if gm_res.get("streaming") else "")
+    with placeholder.container():
+        st.markdown("---")
+        st.subheader("🏆 最终决议")
+        st.markdown(f"""
+        <div style="background: linear-gradient(135deg, #1e1e24 0%, #2d1b2e 100%); border: 1px solid #FF3B30; border-radius: 18px; padding: 30px; box-shadow: 0 0 30px rgba(255, 59, 48, 0.2);">
+            <div style="display:flex; justify-content:space-between; align-items:center; margin-bottom:20px; border-bottom:1px solid rgba(255, 255, 255, 0.1); padding-bottom:15px;">
+                <div style="display:flex; align-items:center; gap:15px;">
+                    <img src="{AGENTS_CONFIG['general_manager']['avatar']}" style="width:60px; height:60px; border-radius:50%; border:2px solid #FF3B30;">
+                    <div>
+                        <span style="font-size:1.5em; font-weight:bold; color:#FFFFFF;">👑 投资决策总经理</span>
+                        <div style="color:#A0A0A0; font-size:0.9em;">General Manager</div>
+                    </div>
+                </div>
+                <span>{'<span class="model-badge badge-cache">⚡缓存</span>' if gm_res.get('cached') else ''}<span class="model-badge badge-{gm_res['provider'].lower()}">{'↪ ' if gm_res.get('failover') else ''}{gm_res['provider']}</span></span>
+            </div>
+            <div style="font-size:1.1em; line-height:1.8; color:#E0E0E0; white-space: pre-wrap;">{content}</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+def paint_agent(placeholders, key, result_obj):
+    if key == "general_manager": render_gm(placeholders[key], result_obj)
+    else: placeholders[key].markdown(card_html(key, result_obj), unsafe_allow_html=True)
+
+def render_board():
+    """按当前结果渲染全部卡片，返回 {agent_key: 占位符} 供流式刷新"""
+    placeholders = {}
+    for title, agent_keys, cols in BOARD_SECTIONS:
+        st.subheader(title)
+        columns = st.columns(cols)
+        for i, key in enumerate(agent_keys):
+            with columns[i % cols]:
+                placeholders[key] = st.empty()
+    placeholders["general_manager"] = st.empty()
+    for key, placeholder in placeholders.items():
+        paint_agent(placeholders, key, st.session_state.analysis_results.get(key))
+    return placeholders
+
+# 4. 图表绘制 (构建逻辑在 alphacouncil.charts，按数据版本缓存；plotly 仅在真正画图时才导入)
+LIVE_REFRESH_SEC = 3
+KLINE_CHART_BARS = 500  # 约两年日K；更长的历史由 charts.kline_figure 按桶聚合到 MAX_CANDLES 根
+
+@st.fragment(run_every=LIVE_REFRESH_SEC)
+def live_minute_chart(symbol, yestend):
+    """实时分时：定时只重跑本 fragment；序列版本未变时复用上次的图"""
+    from alphacouncil.charts import cached_figure, minute_figure
+    from alphacouncil.intraday import poll_live
+    series, version = poll_live(symbol)
+    if not len(series): st.info("分时数据暂不可用"); return
+    fig = cached_figure(("live_minute", symbol, version, yestend), lambda: minute_figure(series["time"], series["price"], series["volume"], yestend))
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"📡 实时分时 · 最新 {series['time'][-1]} · 每 {LIVE_REFRESH_SEC}s 增量刷新")
+
+def draw_charts(symbol, bundle):
+    from alphacouncil.charts import cached_figure, data_version, kline_figure, minute_figure
+    from alphacouncil.market_clock import is_trading
+    stock_data, bars, min_df = bundle["quote"], bundle["bars"], bundle["minute"]
+    tab1, tab2 = st.tabs(["📉 分时图 (实时)", "📊 K线图 (日线)"])
+
+    with tab1: 
+        if st.session_state.get("live_intraday") and is_trading():
+            live_minute_chart(symbol, stock_data['yestend'])
+        elif min_df is not None and not min_df.empty:
+            price, vol = min_df['Price'].values, min_df['Vol'].values
+            fig = cached_figure(("minute", symbol, data_version(price, vol), stock_data['yestend']),
+                                lambda: minute_figure(min_df['Time'].values, price, vol, stock_data['yestend']))
+            st.plotly_chart(fig, use_container_width=True)
+        else: st.info(f"分时数据暂不可用 {bundle['errors'].get('minute', '')}")
+
+    with tab2:
+        if bars is not None:
+            recent = bars[-KLINE_CHART_BARS:]
+            fig = cached_figure(("kline", symbol, data_version(recent["date"], recent["close"])),
+                                lambda: kline_figure(recent["date"].astype(str), recent["open"], recent["high"], recent["low"], recent["close"], recent["volume"]))
+            st.plotly_chart(fig, use_container_width=True)
+        else: st.info(f"K线数据暂不可用 {bundle['errors'].get('kline', '')}")
+
+# 4b. 运行时间线 (埋点)
+def render_timeline(trace):
+    from alphacouncil.charts import waterfall_figure
+    summary = trace.summary()
+    saved = summary['prompt_tokens_raw'] - summary['prompt_tokens']
+    with st.expander(f"⏱️ 运行时间线 · 总耗时 {summary['elapsed_ms'] / 1000:.1f}s · tokens 输入 {summary['tokens_in']} / 输出 {summary['tokens_out']}"
+                     + (f" · 压缩节省约 {saved} tokens ({saved / summary['prompt_tokens_raw'] * 100:.0f}%)" if saved > 0 else "")
+                     + (f" · 重试 {summary['retries']}" if summary['retries'] else "")):
+        st.plotly_chart(waterfall_figure(trace.snapshot(), {k: v['name'] for k, v in AGENTS_CONFIG.items()}), use_container_width=True)
+        # 进程级聚合 (跨会话累计)：各 provider / 智能体的 p50、p95 与 token 消耗
+        rows = [r for r in get_metrics().report() if r["kind"] in ("llm", "agent", "fetch")]
+        st.dataframe([{"类型": r["kind"], "名称": AGENTS_CONFIG.get(r["name"], {}).get("name", r["name"]), "模型": r["provider"],
+                       "次数": r["count"], "错误": r["errors"], "p50 ms": round(r["p50_ms"] or 0), "p95 ms": round(r["p95_ms"] or 0),
+                       "输入 tokens": r["tokens_in"], "输出 tokens": r["tokens_out"]} for r in rows], use_container_width=True, hide_index=True)
+
+# 4c. 组合总览 (组合模式)
+PORTFOLIO_MAX_AGE = 30  # 秒；分析时组合快照超过此时长就重新刷新行情
+
+def current_portfolio(max_age=PORTFOLIO_MAX_AGE):
+    """会话中的组合快照 (过期则批量刷新)；未载入持仓返回 None"""
+    if "holdings" not in st.session_state: return None
+    cached = st.session_state.get("portfolio")
+    if cached and time.time() - cached[0] < max_age: return cached[1]
+    from alphacouncil.portfolio import build_portfolio
+    try: report = build_portfolio(st.session_state.holdings)
+    except DataError as e:
+        st.warning(f"组合行情刷新失败: {e}")
+        return cached[1] if cached else None
+    st.session_state.portfolio = (time.time(), report)
+    return report
+
+@st.fragment
+def render_portfolio():
+    if "holdings" not in st.session_state: return
+    with st.expander("💼 组合总览", expanded=False):
+        refresh = st.button("🔄 刷新组合", key="refresh_portfolio")
+        report = current_portfolio(0 if refresh else PORTFOLIO_MAX_AGE)
+        if not report: return
+        t, risk = report["totals"], report["risk"]
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("总市值", f"¥{t['market_value'] / 1e4:,.1f}万", f"今日 {t['day_pnl'] / 1e4:+,.1f}万 ({t['day_pct']:+.2f}%)")
+        c2.metric("浮动盈亏", f"¥{t['pnl'] / 1e4:+,.1f}万", f"{t['pnl_pct']:+.1f}%")
+        c3.metric("集中度", f"HHI {t['hhi']:.3f}", f"有效持仓 {t['effective_n']:.0f} 只", delta_color="off")
+        if risk: c4.metric("组合风险", f"波动 {risk['port_vol'] * 100:.1f}%", f"β {risk['port_beta']:.2f} · 回撤 {risk['max_drawdown'] * 100:.1f}%", delta_color="off")
+        cols = {"symbol": "代码", "name": "名称", "volume": "数量", "cost": "成本", "price": "现价", "market_value": "市值", "weight": "权重",
+                "pnl": "浮盈", "pnl_pct": "浮盈%", "day_pct": "今日%", "vol": "年化波动", "beta": "β", "corr_port": "与组合相关"}
+        pos = report["positions"]
+        st.dataframe(pos[[c for c in cols if c in pos]].rename(columns=cols).sort_values("权重", ascending=False),
+                     use_container_width=True, hide_index=True)
+        st.caption(f"⏱️ 组合刷新 {report['elapsed_ms']:.0f} ms" + (f" · 行情缺失: {', '.join(t['missing_quotes'])}" if t['missing_quotes'] else ""))
+
+# 4d. 决策回测
+@st.fragment
+def render_backtest():
+    from alphacouncil.decisions import get_decision_store
+    total = get_decision_store().count()
+    if not total: return
+    with st.expander(f"📒 决策回测 (已记录 {total} 条)", expanded=False):
+        horizon = st.slider("持有期 (交易日)", 1, 60, 10, key="backtest_horizon")
+        if not st.button("▶️ 回放全部决策", key="run_backtest"): return
+        from alphacouncil.backtest import run_backtest
+        t0 = time.perf_counter()
+        trades, summary = run_backtest(horizon)
+        if trades.empty:
+            st.info("暂无可回放的决策：持有期尚未走完，或本地没有对应标的的日K")
+            return
+        cols = {"agent": "智能体", "provider": "模型", "model": "版本", "n": "决策数", "hit_rate": "命中率", "avg_ret": "平均收益",
+                "pnl": "加权盈亏", "max_drawdown": "最大回撤", "stop_rate": "止损率", "target_rate": "止盈率"}
+        summary = summary.assign(agent=summary["agent"].map(lambda k: AGENTS_CONFIG.get(k, {}).get("name", k)))
+        st.dataframe(summary.rename(columns=cols), use_container_width=True, hide_index=True)
+        st.caption(f"⏱️ {len(trades)} 条决策回放 {(time.perf_counter() - t0) * 1000:.0f} ms · 次日开盘入场，止损优先于止盈，仅用日K")
+
+# 4e. 全市场初筛：只把得分靠前的标的交给委员会
+def pick_candidate(symbol):
+    """回调：把候选填入搜索框并直接启动分析 (须在搜索框实例化前修改其状态)"""
+    st.session_state.symbol_input, st.session_state.auto_start = symbol, True
+
+@st.fragment
+def render_screener():
+    from alphacouncil.screener import RULES, screen
+    # 片段内的按钮只重跑片段：选中候选后整页重跑，由搜索区接手启动分析
+    if st.session_state.get("auto_start"): st.rerun()
+    with st.expander("🔎 全市场初筛", expanded=False):
+        c1, c2, c3 = st.columns(3)
+        top = c1.number_input("候选数", 1, 50, 10, key="screen_top")
+        min_amount = c2.number_input("最低成交额 (亿)", 0.0, 100.0, 1.0, step=0.5, key="screen_amount")
+        rules = c3.multiselect("技术条件", list(RULES), format_func=lambda r: RULES[r][0], key="screen_rules")
+        if st.button("🔎 扫描全市场", key="run_screen"):
+            try: st.session_state.screen_result = screen(int(top), min_amount * 1e8, rules=rules)
+            except DataError as e: st.warning(f"全市场行情获取失败: {e}")
+        result = st.session_state.get("screen_result")
+        if not result: return
+        c = result["candidates"]
+        cols = {"symbol": "代码", "name": "名称", "now": "现价", "pct": "涨跌%", "gap": "跳空%", "range": "振幅%", "amount": "成交额",
+                "turnover": "换手%", "imbalance": "委比", "score": "得分"}
+        st.dataframe(c.rename(columns={**cols, **{r: RULES[r][0] for r in RULES}}), use_container_width=True, hide_index=True)
+        st.caption(f"⏱️ 全市场 {result['universe']} 只 → 过滤后 {result['passed']} 只 → 候选 {len(c)} 只 · {result['elapsed_ms']:.0f} ms")
+        for row in c.itertuples():
+            st.button(f"🚀 {row.name} ({row.symbol.upper()})", key=f"screen_pick_{row.symbol}", on_click=pick_candidate, args=(row.symbol,))
+
+# 4f. 运行历史：打开页面即展示该标的最近一次结果，可翻页浏览与对比
+def show_run(run):
+    """把历史运行载入看板 (不重跑委员会)"""
+    st.session_state.analysis_results = run["agents"]
+    st.session_state.market_context = run["quote"]
+    st.session_state.shown_symbol, st.session_state.shown_run = run["symbol"], run
+
+def restore_latest(symbol):
+    """切换到新标的时载入其最近一次运行；同一标的只载入一次，避免覆盖刚跑完或手动载入的结果"""
+    if not symbol or st.session_state.get("shown_symbol") == symbol: return
+    st.session_state.shown_symbol, st.session_state.shown_run = symbol, None
+    st.session_state.analysis_results = {}
+    run = get_history().latest(symbol)
+    if run: show_run(run)
+
+def run_label(r):
+    return f"{time.strftime('%m-%d %H:%M', time.localtime(r['started_at']))} · {r['name']} ({r['symbol'].upper()}) · ¥{r['price']:.2f} {r['change_pct']:+.2f}%"
+
+@st.fragment
+def render_history():
+    history = get_history()
+    if not history.path: return
+    with st.expander("📜 运行历史", expanded=False):
+        c1, c2, c3 = st.columns([2, 1, 1])
+        symbol = c1.text_input("标的代码 (留空为全部)", key="history_symbol").strip().lower() or None
+        provider = c2.selectbox("模型", ["全部", "DeepSeek", "Qwen", "Gemini"], key="history_provider")
+        page = c3.number_input("页码", 1, 10000, 1, key="history_page") - 1
+        rows, total = history.list_runs(symbol, None if provider == "全部" else provider, page=int(page))
+        st.caption(f"共 {total} 次运行 · 第 {int(page) + 1}/{max(1, -(-total // PAGE_SIZE))} 页")
+        if not rows: return
+        st.dataframe([{"时间": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r["started_at"])), "标的": f"{r['name']} ({r['symbol'].upper()})",
+                       "价格": r["price"], "涨跌%": round(r["change_pct"], 2), "耗时 s": round((r["elapsed_ms"] or 0) / 1000, 1), "模式": r["mode"]}
+                      for r in rows], use_container_width=True, hide_index=True)
+        labels = {r["run_id"]: run_label(r) for r in rows}
+        picked = st.selectbox("选择运行", list(labels), format_func=labels.get, key="history_pick")
+        other = st.selectbox("与之对比", [None] + [k for k in labels if k != picked], format_func=lambda k: "—" if k is None else labels[k], key="history_other")
+        b1, b2 = st.columns(2)
+        if b1.button("📥 载入到看板", key="history_load", use_container_width=True):
+            show_run(history.load_run(picked))
+            st.rerun()
+        if other and b2.button("🔀 对比两次运行", key="history_diff", use_container_width=True):
+            old, new = sorted((history.load_run(other), history.load_run(picked)), key=lambda r: r["started_at"])
+            diffs = diff_runs(old, new)
+            if not diffs: st.info("两次运行各智能体的输出完全相同")
+            for key, lines in diffs.items():
+                st.markdown(f"**{AGENTS_CONFIG.get(key, {}).get('name', key)}**")
+                st.code("\n".join(lines), language="diff")
+
+# 5. 搜索区
 col1, col2, col3 = st.columns([1, 2, 1])
 with col2:
-    user_input = st.text_input("输入股票", value="600276", placeholder="代码 / 名称 / 拼音", label_visibility="collapsed")
-    start_btn = st.button("🚀 启动分析委员会", use_container_width=True)
+    if "symbol_input" not in st.session_state: st.session_state.symbol_input = "600276"
+    user_input = st.text_input("输入股票", key="symbol_input", placeholder="代码 / 名称 / 拼音", label_visibility="collapsed")
+    # 离线索引给出候选列表，由用户确认标的，而不是默认取第一个
+    candidates = search_symbols(user_input, limit=10)
+    picked = st.selectbox("候选标的", candidates, format_func=lambda e: f"{e.name}  {e.symbol.upper()}" + ("  ETF" if e.kind == "etf" else ""),
+                          label_visibility="collapsed") if len(candidates) > 1 else None
+    start_btn = st.button("🚀 启动分析委员会", use_container_width=True) or st.session_state.pop("auto_start", False)
+render_portfolio()
+render_screener()
+render_backtest()
+render_history()
 
 if start_btn:
-    api_key_set = {'gemini': gemini_key, 'deepseek': deepseek_key, 'qwen': qwen_key}
+    api_key_set = api_keys()
+    mode, gemini_model = st.session_state.mode, st.session_state.gemini_model
+    has_pos = st.session_state.has_pos
+    cost_price, hold_vol = st.session_state.get("cost_price", 0.0), st.session_state.get("hold_vol", 0)
     
     with st.status("🔍 正在搜索股票...", expanded=True) as status:
-        search_code = user_input.strip()
-        if re.match(r'^\d{6}$', search_code): real_symbol, stock_name = search_code, "查询中..."
-        else: real_symbol, stock_name = search_stock_realtime(search_code)
-        
-        if not real_symbol:
-            if re.match(r'^[a-zA-Z]{2}\d{6}$', search_code): real_symbol, stock_name = search_code, "直接代码"
-            else: status.update(label="❌ 未找到股票", state="error"); st.error("未找到股票"); st.stop()
+        if picked: real_symbol, stock_name = picked.symbol, picked.name
+        else:
+            try: real_symbol, stock_name = resolve_symbol(user_input)
+            except DataError as e: real_symbol, stock_name = None, None; st.warning(f"搜索服务异常: {e}")
+        if not real_symbol: status.update(label="❌ 未找到股票", state="error"); st.error("未找到股票"); st.stop()
             
         status.update(label=f"锁定标的: {stock_name} ({real_symbol})", state="running")
-        stock_data, err = get_realtime_data_tencent(real_symbol)
-        if err: status.update(label="❌ 数据获取失败", state="error"); st.error(f"Error: {err}"); st.stop()
-        
-        kline_df = get_kline_data_eastmoney(real_symbol)
-        min_df = get_min_data_eastmoney(real_symbol)
+        # 五档 / 日K / 分时 三个请求并发获取；本次运行的各阶段耗时记入 trace
+        trace = Trace(label=real_symbol)
+        with use_trace(trace):
+            bundle = fetch_market_bundle(real_symbol)
+        stock_data, kline_df, min_df = bundle["quote"], bundle["kline"], bundle["minute"]
+        if stock_data is None: status.update(label="❌ 数据获取失败", state="error"); st.error(f"Error: {bundle['errors']['quote']}"); st.stop()
         
         # 头部行情数据
         change_amt = stock_data['now'] - stock_data['yestend']
-        change_pct = (change_amt / stock_data['yestend'] * 100) if stock_data['yestend'] else 0
+        change_pct = calc_change_pct(stock_data)
         color_val = "#FF3B30" if change_amt > 0 else "#00F0F0" # 同花顺红绿风格
         
         st.session_state.market_context = stock_data
@@ -475,199 +431,62 @@ if start_btn:
         k3.metric("最高", f"¥{stock_data['high']:.2f}")
         k4.metric("最低", f"¥{stock_data['low']:.2f}")
         
-        # --- 图表绘制 (模仿同花顺深色风格) ---
-        tab1, tab2 = st.tabs(["📉 分时图 (实时)", "📊 K线图 (日线)"])
-        
-        chart_layout_common = dict(
-            plot_bgcolor='#111111', paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='#94A3B8'),
-            xaxis=dict(showgrid=True, gridcolor='#333333', zeroline=False),
-            yaxis=dict(showgrid=True, gridcolor='#333333', zeroline=False),
-            margin=dict(l=0, r=0, t=10, b=0),
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-        )
-
-        with tab1: 
-            if min_df is not None and not min_df.empty:
-                yestend = stock_data['yestend']
-                max_diff = max(abs(min_df['Price'].max() - yestend), abs(min_df['Price'].min() - yestend))
-                if max_diff == 0: max_diff = yestend * 0.01
-                y_range = [yestend - max_diff * 1.1, yestend + max_diff * 1.1]
-
-                fig_min = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.03, row_heights=[0.7, 0.3])
-                # 分时线 (亮黄色)
-                fig_min.add_trace(go.Scatter(x=min_df['Time'], y=min_df['Price'], mode='lines', name='价格', line=dict(color='#FFFF00', width=1.5), fill='tozeroy', fillcolor='rgba(255, 255, 0, 0.1)'), row=1, col=1)
-                fig_min.add_hline(y=yestend, line_dash="dash", line_color="#FF3B30", line_width=1, row=1, col=1)
-                
-                # 成交量 (红涨绿跌)
-                colors = ['#FF3B30' if row['Price'] >= (min_df.iloc[i-1]['Price'] if i>0 else yestend) else '#00F0F0' for i, row in min_df.iterrows()]
-                fig_min.add_trace(go.Bar(x=min_df['Time'], y=min_df['Vol'], name='成交量', marker_color=colors), row=2, col=1)
-
-                fig_min.update_layout(height=420, **chart_layout_common)
-                fig_min.update_yaxes(range=y_range, tickformat=".2f", row=1, col=1)
-                fig_min.update_yaxes(showticklabels=False, row=2, col=1)
-                fig_min.update_xaxes(showticklabels=False, row=1, col=1)
-                st.plotly_chart(fig_min, use_container_width=True)
-            else: st.info("分时数据暂不可用")
-            
-        with tab2:
-            if kline_df is not None:
-                fig_k = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.03, row_heights=[0.7, 0.3])
-                # K线 (红涨绿跌)
-                fig_k.add_trace(go.Candlestick(
-                    x=kline_df['Date'], open=kline_df['Open'], high=kline_df['High'], low=kline_df['Low'], close=kline_df['Close'],
-                    increasing_line_color='#FF3B30', decreasing_line_color='#00F0F0',
-                    increasing_fillcolor='#FF3B30', decreasing_fillcolor='#00F0F0'
-                ), row=1, col=1)
-                
-                # 成交量
-                colors_k = ['#FF3B30' if row['Close'] >= row['Open'] else '#00F0F0' for i, row in kline_df.iterrows()]
-                fig_k.add_trace(go.Bar(x=kline_df['Date'], y=kline_df['Volume'], marker_color=colors_k), row=2, col=1)
-                
-                fig_k.update_layout(height=420, xaxis_rangeslider_visible=False, showlegend=False, **chart_layout_common)
-                fig_k.update_xaxes(showticklabels=False, row=1, col=1)
-                fig_k.update_yaxes(showticklabels=False, row=2, col=1)
-                st.plotly_chart(fig_k, use_container_width=True)
-            else: st.info("K线数据暂不可用")
-
-        # Context Prep
-        holding_info = "用户无持仓。"
-        if has_pos and cost_price > 0 and hold_vol > 0:
-            profit = (stock_data['now'] - cost_price) * hold_vol
-            profit_pct = (stock_data['now'] - cost_price) / cost_price * 100
-            holding_info = f"用户持仓: 成本 {cost_price}，股数 {hold_vol}，盈亏 {profit:.2f} ({profit_pct:.2f}%)"
-        
-        # --- 拼接完整的五档盘口数据 (Fix for Funds Analyst) ---
-        bid_ask_str = (
-            f"卖5:{stock_data['sell5_p']}({stock_data['sell5_v']}) "
-            f"卖4:{stock_data['sell4_p']}({stock_data['sell4_v']}) "
-            f"卖3:{stock_data['sell3_p']}({stock_data['sell3_v']}) "
-            f"卖2:{stock_data['sell2_p']}({stock_data['sell2_v']}) "
-            f"卖1:{stock_data['sell1_p']}({stock_data['sell1_v']})\n"
-            f"----------------------\n"
-            f"买1:{stock_data['buy1_p']}({stock_data['buy1_v']}) "
-            f"买2:{stock_data['buy2_p']}({stock_data['buy2_v']}) "
-            f"买3:{stock_data['buy3_p']}({stock_data['buy3_v']}) "
-            f"买4:{stock_data['buy4_p']}({stock_data['buy4_v']}) "
-            f"买5:{stock_data['buy5_p']}({stock_data['buy5_v']})"
-        )
-
-        market_context = f"""
-        [标的] {stock_data['name']}({real_symbol})
-        [行情] 现价:{stock_data['now']} 涨跌:{change_pct:.2f}%
-        [五档盘口]
-        {bid_ask_str}
-        [持仓] {holding_info}
-        """
+        draw_charts(real_symbol, bundle)
+
+        # Context Prep：组合中持有该标的时以组合持仓为准
+        portfolio = current_portfolio()
+        if portfolio:
+            from alphacouncil.portfolio import holding_for
+            held = holding_for(portfolio, real_symbol)
+            if held: has_pos, (cost_price, hold_vol) = True, held
+        holding_info = holding_text(stock_data, cost_price, hold_vol) if has_pos else "用户无持仓。"
+        agent_context = build_agent_context(real_symbol, bundle, holding_info, portfolio)
         status.update(label="✅ 数据准备就绪，开始分析", state="complete")
 
-    # AI Execution
-    def run_agent(agent_key):
-        cfg = AGENTS_CONFIG[agent_key]
-        target_provider = cfg["provider"] if "混合" in mode else "DeepSeek"
-        res = call_ai_api(market_context, cfg["prompt"], target_provider, api_key_set, gemini_model)
-        return agent_key, res, target_provider
+    # AI Execution：按依赖图调度，任一智能体的依赖完成即启动
+    run_agent = make_agent_runner(agent_context, api_key_set, mode, gemini_model, st.session_state.force_refresh, stream=st.session_state.stream_mode, trace=trace,
+                                  compact=st.session_state.compact_context, hedge=st.session_state.hedge_requests,
+                                  structured=st.session_state.structured_output)
 
     st.session_state.analysis_results = {}
-    with st.spinner("🚀 AI 委员会正在分析 (Gemini/DeepSeek 并行中)..."):
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = [executor.submit(run_agent, key) for key in list(AGENTS_CONFIG.keys())[:5]]
-            for f in concurrent.futures.as_completed(futures):
-                k, r, p = f.result()
-                st.session_state.analysis_results[k] = {"text": r, "provider": p}
-                
-    stage1_text = "\n".join([f"{AGENTS_CONFIG[k]['name']}: {v['text']}" for k, v in st.session_state.analysis_results.items()])
-    
-    with st.spinner("🔄 总监正在整合策略..."):
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = []
-            for k in ["manager_fundamental", "manager_momentum"]:
-                cfg = AGENTS_CONFIG[k]
-                target_provider = cfg["provider"] if "混合" in mode else "DeepSeek"
-                futures.append(executor.submit(call_ai_api, f"行情:{market_context}\n报告:{stage1_text}", cfg["prompt"], target_provider, api_key_set, gemini_model))
-            res = [f.result() for f in futures]
-            st.session_state.analysis_results["manager_fundamental"] = {"text": res[0], "provider": "DeepSeek"}
-            st.session_state.analysis_results["manager_momentum"] = {"text": res[1], "provider": "DeepSeek"}
-
-    stage2_text = stage1_text + "\n" + res[0] + "\n" + res[1]
-    
-    with st.spinner("🛡️ 风控系统正在计算 (Qwen 介入)..."):
-         with concurrent.futures.ThreadPoolExecutor() as executor:
-             futures = []
-             for k in ["risk_system", "risk_portfolio"]:
-                cfg = AGENTS_CONFIG[k]
-                # 逻辑修正：Risk System 强制用 Qwen
-                target_provider = cfg["provider"] if "混合" in mode else "DeepSeek"
-                if k == "risk_system" and "混合" in mode: target_provider = "Qwen"
-                
-                futures.append(executor.submit(call_ai_api, f"市场:{stage2_text}", cfg["prompt"], target_provider, api_key_set, gemini_model))
-             res = [f.result() for f in futures]
-             st.session_state.analysis_results["risk_system"] = {"text": res[0], "provider": "Qwen" if "混合" in mode else "DeepSeek"}
-             st.session_state.analysis_results["risk_portfolio"] = {"text": res[1], "provider": "DeepSeek"}
-
-    final_text = stage2_text + "\n" + res[0] + "\n" + res[1]
-    with st.spinner("👑 总经理最终决策..."):
-        k = "general_manager"
-        cfg = AGENTS_CONFIG[k]
-        target_provider = cfg["provider"] if "混合" in mode else "DeepSeek"
-        res = call_ai_api(f"所有报告:\n{final_text}", cfg["prompt"], target_provider, api_key_set, gemini_model)
-        st.session_state.analysis_results[k] = {"text": res, "provider": target_provider}
+    run_status = st.status("🚀 AI 委员会正在分析 (异步引擎按依赖并行调度)...", expanded=False)
+    placeholders = render_board()
+    last_paint = {}
+    for event, k, r in run_committee(agent_graph(), run_agent):
+        if event == "progress":
+            # 部分文本：节流后直接画到该智能体的卡片上
+            if time.monotonic() - last_paint.get(k, 0) < STREAM_REFRESH_SEC: continue
+            last_paint[k] = time.monotonic()
+            r = {"text": r, "provider": resolve_provider(k, mode), "streaming": True}
+        else:
+            st.session_state.analysis_results[k] = r
+            run_status.update(label=f"{'❌' if r.get('error') else '✅'} {AGENTS_CONFIG[k]['name']} 完成 ({len(st.session_state.analysis_results)}/{len(AGENTS_CONFIG)})")
+        paint_agent(placeholders, k, r)
+    run_status.update(label="✅ 委员会全部完成", state="complete")
+    trace.finish()
+    # 结构化决策入库 (GM / 技术分析 / 组合风控)，刷新页面后仍可回测
+    record_decisions(trace.run_id, real_symbol, stock_data, st.session_state.analysis_results)
+    # 整次运行交给后台线程写入历史，不增加页面延迟
+    save_run(trace, real_symbol, stock_data, st.session_state.analysis_results, agent_context, mode, {k: str(e) for k, e in bundle["errors"].items()})
+    st.session_state.shown_symbol, st.session_state.shown_run = real_symbol, None
+    render_timeline(trace)
     
     st.success("分析完成！")
 
-# 4. 渲染卡片
-def render_section(title, agent_keys, cols=1):
-    st.subheader(title)
-    columns = st.columns(cols)
-    for i, key in enumerate(agent_keys):
-        cfg = AGENTS_CONFIG[key]
-        result_obj = st.session_state.analysis_results.get(key)
-        content = result_obj["text"] if result_obj else "等待指令..."
-        provider = result_obj["provider"] if result_obj else "OFFLINE"
-        if provider == "Gemini": provider = gemini_model.split("-")[0]
-        
-        # 标签颜色类
-        badge_class = "badge-gemini"
-        if "DeepSeek" in provider: badge_class = "badge-deepseek"
-        if "Qwen" in provider: badge_class = "badge-qwen"
-
-        with columns[i % cols]:
-            st.markdown(f"""
-            <div class="agent-card">
-                <div class="card-header">
-                    <div class="agent-info">
-                        <img src="{cfg['avatar']}" class="avatar">
-                        <div>
-                            <div class="agent-name">{cfg['name']}</div>
-                            <div class="agent-role">{cfg['role']}</div>
-                        </div>
-                    </div>
-                    <span class="model-badge {badge_class}">{provider}</span>
-                </div>
-                <div class="card-content">{content}</div>
-            </div>
-            """, unsafe_allow_html=True)
-
-render_section("🔍 第一阶段：多维分析 (Gemini/DeepSeek)", list(AGENTS_CONFIG.keys())[:5], cols=5)
-render_section("🧠 第二阶段：策略博弈 (DeepSeek)", ["manager_fundamental", "manager_momentum"], cols=2)
-render_section("🛡️ 第三阶段：风控委员会 (Qwen/DeepSeek)", ["risk_system", "risk_portfolio"], cols=2)
-
-gm_res = st.session_state.analysis_results.get("general_manager")
-if gm_res:
-    st.markdown("---")
-    st.subheader("🏆 最终决议")
-    st.markdown(f"""
-    <div style="background: linear-gradient(135deg, #1e1e24 0%, #2d1b2e 100%); border: 1px solid #FF3B30; border-radius: 18px; padding: 30px; box-shadow: 0 0 30px rgba(255, 59, 48, 0.2);">
-        <div style="display:flex; justify-content:space-between; align-items:center; margin-bottom:20px; border-bottom:1px solid rgba(255, 255, 255, 0.1); padding-bottom:15px;">
-            <div style="display:flex; align-items:center; gap:15px;">
-                <img src="{AGENTS_CONFIG['general_manager']['avatar']}" style="width:60px; height:60px; border-radius:50%; border:2px solid #FF3B30;">
-                <div>
-                    <span style="font-size:1.5em; font-weight:bold; color:#FFFFFF;">👑 投资决策总经理</span>
-                    <div style="color:#A0A0A0; font-size:0.9em;">General Manager</div>
-                </div>
-            </div>
-            <span class="model-badge badge-deepseek">DeepSeek V3</span>
-        </div>
-        <div style="font-size:1.1em; line-height:1.8; color:#E0E0E0; white-space: pre-wrap;">{gm_res['text']}</div>
-    </div>
-    """, unsafe_allow_html=True)
\ No newline at end of file
+    # 客户端复用统计 (进程级，跨会话累计)
+    reuse_notes = []
+    for p, r in get_registry().savings_report().items():
+        note = f"{p}: 新建 {r['builds']} 次 / 复用 {r['reuses']} 次"
+        if r["saving_ms"] is not None: note += f"，复用每次约节省 {r['saving_ms']:.0f}ms (冷 {r['cold_ms']:.0f}ms → 热 {r['warm_ms']:.0f}ms)"
+        reuse_notes.append(note)
+    if reuse_notes: st.caption("🔌 连接复用 · " + " ｜ ".join(reuse_notes))
+
+if not start_btn:
+    restore_latest(picked.symbol if picked else (candidates[0].symbol if candidates else None))
+    shown = st.session_state.get("shown_run")
+    if shown:
+        st.caption(f"📜 历史结果：{run_label(shown)} · 耗时 {(shown['elapsed_ms'] or 0) / 1000:.1f}s (点击启动分析重新运行)")
+    render_board()
+
+# 页脚：本次脚本整页运行耗时 (侧边栏 fragment 的局部重跑不计入)
+st.caption(f"⏱️ 本次整页渲染 {(time.perf_counter() - _script_started) * 1000:.0f} ms")